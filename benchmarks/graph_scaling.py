@@ -0,0 +1,203 @@
+"""
+graph_scaling.py
+Throughput / peak-memory benchmark on synthetic graphs of growing size.
+
+Scenarios come from riskportalai.synthetic (seeded layered DAGs, 0..50
+edges per parameter, mixed distributions and formula depths).  For each
+size it times:
+  • validate_scenario_enhanced
+  • topological_sort
+  • SafeEvaluator over every formula, ``--iterations`` lanes each
+  • simulate_graph, cold (plan cache cleared, so plan build is included),
+    with the per-stage split from metadata["timings"]
+Wall time is the median of ``--repeat`` runs; peak memory comes from one
+extra run under tracemalloc.  The F-3 SLA (1,000 nodes x 10k iterations
+in under 2 s) is checked whenever that size is part of the run.
+
+    python benchmarks/graph_scaling.py [--sizes 10,100,1000,5000] [--json]
+    python benchmarks/graph_scaling.py --output out.json --baseline benchmarks/baseline.json
+
+With ``--baseline`` the exit status is 1 if any case is slower than the
+baseline by more than ``--tolerance`` (or the SLA fails), so it can gate
+CI; ``--save-baseline`` writes the current results as the new baseline.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import pathlib
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from riskportalai.expression_eval import SafeEvaluator  # noqa: E402
+from riskportalai.graph_plan import clear_plan_cache  # noqa: E402
+from riskportalai.graph_simulate import simulate_graph  # noqa: E402
+from riskportalai.graph_utils import topological_sort  # noqa: E402
+from riskportalai.main import validate_scenario_enhanced  # noqa: E402
+from riskportalai.synthetic import synthetic_scenario  # noqa: E402
+
+SIZES = (10, 100, 1000, 5000)
+NOISE_FLOOR = 0.001  # seconds; smaller slowdowns never count as regressions
+SLA = {"case": "simulate_graph", "nodes": 1000, "iterations": 10_000, "seconds": 2.0}
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": statistics.median(times), "seconds_min": min(times),
+            "peak_memory_mb": peak / 2**20}
+
+
+def evaluate_all(scenario: Dict[str, Any], lanes: int, seed: int) -> Callable[[], None]:
+    """SafeEvaluator over every formula in dependency order, on ``lanes``-wide arrays."""
+    nodes = {n["id"]: n for n in scenario["nodes"]}
+    rng = np.random.default_rng(seed)
+    params = {nid: rng.uniform(1, 1000, lanes) for nid, n in nodes.items() if n["type"] == "parameter"}
+    order = topological_sort(nodes)
+
+    def run() -> None:
+        values = dict(params)
+        evaluator = SafeEvaluator(values)
+        with np.errstate(all="ignore"):
+            for nid in order:
+                values[nid] = evaluator.evaluate(nodes[nid]["formula"])
+    return run
+
+
+def simulate_cold(scenario: Dict[str, Any], iterations: int, seed: int,
+                  stages: List[Dict[str, float]]) -> Callable[[], None]:
+    def run() -> None:
+        clear_plan_cache()
+        result = simulate_graph(scenario, iterations=iterations, seed=seed, sample_encoding="none")
+        stages.append(result["metadata"]["timings"])
+    return run
+
+
+def run(sizes: List[int], iterations: int, repeat: int, max_edges: int, seed: int) -> Dict[str, Any]:
+    cases = []
+    for n in sizes:
+        scenario = synthetic_scenario(n, seed=seed, max_edges=max_edges)
+        nodes = {node["id"]: node for node in scenario["nodes"]}
+        formulas = sum(1 for node in scenario["nodes"] if "formula" in node)
+        shape = {"nodes": n, "edges": len(scenario["edges"]), "formulas": formulas}
+        stages: List[Dict[str, float]] = []
+        benches = [
+            ("validate_scenario_enhanced", lambda: validate_scenario_enhanced(scenario), n, "nodes"),
+            ("topological_sort", lambda: topological_sort(nodes), n, "nodes"),
+            ("safe_evaluator", evaluate_all(scenario, iterations, seed), formulas * iterations,
+             "formula_lanes"),
+            ("simulate_graph", simulate_cold(scenario, iterations, seed, stages), iterations,
+             "iterations"),
+        ]
+        for name, fn, work, unit in benches:
+            stats = measure(fn, repeat)
+            case = {"case": name, **shape, "iterations": iterations, **stats,
+                    "throughput": work / stats["seconds"] if stats["seconds"] else None,
+                    "throughput_unit": f"{unit}/s"}
+            if name == "simulate_graph":
+                case["stages"] = {k: statistics.median(s[k] for s in stages[:repeat])
+                                  for k in stages[0]}
+            cases.append(case)
+            print(f"{name:<28}{n:>6} nodes {stats['seconds']:>10.4f} s "
+                  f"{stats['peak_memory_mb']:>9.1f} MB", file=sys.stderr)
+
+    return {"environment": {"python": platform.python_version(), "numpy": np.__version__,
+                            "machine": platform.machine(), "processor": platform.processor()},
+            "config": {"sizes": sizes, "iterations": iterations, "repeat": repeat,
+                       "max_edges": max_edges, "seed": seed},
+            "cases": cases,
+            "sla": check_sla(cases)}
+
+
+def check_sla(cases: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    case = next((c for c in cases if c["case"] == SLA["case"] and c["nodes"] == SLA["nodes"]
+                 and c["iterations"] == SLA["iterations"]), None)
+    if case is None:
+        return None
+    return {**SLA, "measured": case["seconds"], "passed": case["seconds"] < SLA["seconds"]}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Per-case ratio current / baseline (median seconds); regressed if above
+    1 + tolerance and slower by more than NOISE_FLOOR.
+    """
+    key = lambda c: (c["case"], c["nodes"], c["iterations"])
+    base = {key(c): c for c in baseline.get("cases", [])}
+    rows = []
+    for c in current["cases"]:
+        b = base.get(key(c))
+        if b is None or not b["seconds"]:
+            continue
+        ratio = c["seconds"] / b["seconds"]
+        rows.append({"case": c["case"], "nodes": c["nodes"], "iterations": c["iterations"],
+                     "baseline_seconds": b["seconds"], "seconds": c["seconds"],
+                     "ratio": ratio,
+                     "regressed": ratio > 1 + tolerance and c["seconds"] - b["seconds"] > NOISE_FLOOR})
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                    help="comma-separated node counts")
+    ap.add_argument("--iterations", type=int, default=10_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--max-edges", type=int, default=50, help="edges per parameter: U{0..max}")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true", help="emit machine-readable output")
+    ap.add_argument("--output", type=pathlib.Path, help="also write the JSON results here")
+    ap.add_argument("--baseline", type=pathlib.Path, help="compare against this results file")
+    ap.add_argument("--tolerance", type=float, default=0.25,
+                    help="allowed slowdown vs the baseline (0.25 = 25%%)")
+    ap.add_argument("--save-baseline", type=pathlib.Path, help="write results as the new baseline")
+    args = ap.parse_args()
+
+    out = run([int(s) for s in args.sizes.split(",")], args.iterations, args.repeat,
+              args.max_edges, args.seed)
+    if args.baseline is not None:
+        out["comparison"] = compare(out, json.loads(args.baseline.read_text()), args.tolerance)
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            path.write_text(json.dumps(out, indent=2) + "\n")
+
+    if args.json:
+        print(json.dumps(out, indent=2))
+    else:
+        print(f"{'case':<28}{'nodes':>6}{'edges':>8}{'seconds':>11}{'peak MB':>10}  throughput")
+        for c in out["cases"]:
+            print(f"{c['case']:<28}{c['nodes']:>6}{c['edges']:>8}{c['seconds']:>11.4f}"
+                  f"{c['peak_memory_mb']:>10.1f}  {c['throughput']:.3g} {c['throughput_unit']}")
+        if out["sla"] is not None:
+            s = out["sla"]
+            print(f"\nF-3 SLA: {s['nodes']} nodes x {s['iterations']} iterations in "
+                  f"{s['measured']:.3f} s (target < {s['seconds']} s): "
+                  f"{'PASS' if s['passed'] else 'FAIL'}")
+        for row in out.get("comparison", []):
+            flag = "  REGRESSED" if row["regressed"] else ""
+            print(f"{row['case']:<28}{row['nodes']:>6}  x{row['ratio']:.2f} vs baseline{flag}")
+
+    failed = (out["sla"] is not None and not out["sla"]["passed"]) or \
+        any(r["regressed"] for r in out.get("comparison", []))
+    if args.baseline is not None and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+sampling_convergence.py
+Iterations each sampling strategy needs for a given percentile error.
+
+For the Mr Whimsy scenario a 1M-iteration pseudo-random run is the
+reference.  Each strategy is then replicated over independent seeds at
+growing iteration counts and the RMS relative error of P5/P50/P95 is
+reported, plus the smallest count that reaches ``--target``.
+
+    python benchmarks/sampling_convergence.py [--target 0.005] [--json]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import pathlib
+import sys
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from riskportalai.graph_simulate import simulate_graph  # noqa: E402
+
+SCENARIO = pathlib.Path(__file__).resolve().parent.parent / "tests" / "mr_whimsy_full.json"
+RESULT = "total_revenue"
+SIZES = (256, 512, 1024, 2048, 4096, 8192, 16384)
+STRATEGIES = ("random", "lhs", "sobol")
+KEYS = ("p5", "p50", "p95")
+
+
+def run(target: float, replicates: int) -> dict:
+    scenario = json.loads(SCENARIO.read_text())
+    ref = simulate_graph(scenario, iterations=1_000_000, seed=0,
+                         sample_encoding="none")["results"][RESULT]
+
+    table = {}
+    for strategy in STRATEGIES:
+        rows = {}
+        for n in SIZES:
+            errs = {k: [] for k in KEYS}
+            for rep in range(replicates):
+                res = simulate_graph(scenario, iterations=n, seed=1000 + rep,
+                                     sampling=strategy, sample_encoding="none")["results"][RESULT]
+                for k in KEYS:
+                    errs[k].append((res[k] - ref[k]) / ref[k])
+            rows[n] = {k: float(np.sqrt(np.mean(np.square(v)))) for k, v in errs.items()}
+        needed = {k: next((n for n in SIZES if rows[n][k] <= target), None) for k in KEYS}
+        table[strategy] = {"rms_relative_error": rows, "iterations_for_target": needed}
+    return {"target": target, "replicates": replicates, "reference": ref, "strategies": table}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--target", type=float, default=0.005)
+    ap.add_argument("--replicates", type=int, default=30)
+    ap.add_argument("--json", action="store_true", help="emit machine-readable output")
+    args = ap.parse_args()
+
+    out = run(args.target, args.replicates)
+    if args.json:
+        print(json.dumps(out, indent=2))
+        return
+    print(f"RMS relative error of {RESULT} percentiles ({args.replicates} replicates)")
+    print("strategy  " + "".join(f"{n:>10}" for n in SIZES))
+    for strategy, data in out["strategies"].items():
+        for k in KEYS:
+            cells = "".join(f"{data['rms_relative_error'][n][k]:>10.4f}" for n in SIZES)
+            print(f"{strategy:<6}{k:>4}{cells}")
+    print(f"\niterations needed for RMS error <= {args.target:g}")
+    for strategy, data in out["strategies"].items():
+        print(f"  {strategy:<7}", data["iterations_for_target"])
+
+
+if __name__ == "__main__":
+    main()
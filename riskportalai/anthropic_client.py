@@ -1,15 +1,51 @@
 """
 anthropic_client.py
 Async helper to call Anthropic Claude with tool-calling.
+• one shared httpx.AsyncClient per process (connection pool, keep-alive,
+  HTTP/2 when the optional ``h2`` package is installed), opened and closed
+  by the FastAPI lifespan and created lazily otherwise
+• retries 408/409/429/5xx/529 and transport errors with full-jitter
+  exponential backoff; a server ``Retry-After`` takes precedence
+• at most ``max_concurrency`` requests in flight, the rest wait their turn
+• per-attempt latency and status reported to an ``on_attempt`` hook and
+  aggregated in ``stats()``
+• stream_claude: the same call with ``"stream": true``, yielding decoded
+  server-sent events as they arrive
+• system prompt and tool schema carry ``cache_control`` markers for
+  provider-side prompt caching; identical requests can be answered from
+  the opt-in response cache (see response_cache.py)
+The endpoint URL can be pointed at a local mock server via
+RISKPORTAL_ANTHROPIC_URL; tests inject an ``httpx.MockTransport``.
 """
 
 from __future__ import annotations
-import os, json, httpx
-from typing import List, Dict, Any
+import asyncio, os, json, httpx, logging, random, time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .chat_stream import MessageAssembler
+from .metrics import observe_claude_attempt
+from .response_cache import get_response_cache, prompt_cache_stats, response_key
+
+log = logging.getLogger(__name__)
 
 _MODEL = "claude-sonnet-4-20250514"
 _API_URL = "https://api.anthropic.com/v1/messages"
 
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+DEFAULT_BACKOFF_BASE = 0.5     # seconds; attempt k waits U(0, base * 2**k)
+DEFAULT_BACKOFF_MAX = 8.0      # cap for computed backoff
+MAX_RETRY_AFTER = 60.0         # never sleep longer than this on a server hint
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+try:  # HTTP/2 needs the optional h2 package
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
 # tool schema: run_simulation - SIMPLE ORIGINAL FORMAT
 _TOOL_SCHEMA = {
     "name": "build_simulation_model",
@@ -29,21 +65,248 @@ SYSTEM_PROMPT = open(
     os.path.join(os.path.dirname(__file__), "prompt_graph.md"),
     encoding="utf-8").read()
 
-async def call_claude(history: List[Dict[str, str]]) -> Dict[str, Any]:
-    """Return Claude JSON or raise RuntimeError with detailed error."""
+
+class ClaudeError(RuntimeError):
+    """Final failure after retries; ``attempts`` holds every attempt's record."""
+
+    def __init__(self, message: str, status: int | None = None,
+                 attempts: List[Dict[str, Any]] | None = None):
+        super().__init__(message)
+        self.status = status
+        self.attempts = attempts or []
+
+
+# ---------- pooled client ----------
+class ClaudeClient:
+    """Shared, retrying Messages API client bound to one event loop."""
+
+    def __init__(self,
+                 url: str = _API_URL,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+                 backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX,
+                 transport: httpx.AsyncBaseTransport | None = None,
+                 on_attempt: Callable[[Dict[str, Any]], None] | None = None,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        self.url = url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_attempt = on_attempt
+        self._sleep = sleep
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.http2 = _HTTP2 and transport is None
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            timeout=timeout,
+            transport=transport,
+            limits=httpx.Limits(max_connections=max_concurrency,
+                                max_keepalive_connections=max_concurrency,
+                                keepalive_expiry=60.0))
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stats = {"requests": 0, "attempts": 0, "retries": 0, "failures": 0,
+                       "latency_ms_total": 0.0, "latency_ms_max": 0.0}
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        s = dict(self._stats)
+        s["latency_ms_mean"] = s["latency_ms_total"] / s["attempts"] if s["attempts"] else 0.0
+        s["http2"] = self.http2
+        return s
+
+    async def post(self, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        """POST ``payload``, retrying transient failures; returns the JSON body."""
+        self._stats["requests"] += 1
+        attempts: List[Dict[str, Any]] = []
+        async with self._sem:
+            for attempt in range(self.max_retries + 1):
+                started = time.perf_counter()
+                record: Dict[str, Any] = {"attempt": attempt, "status": None}
+                try:
+                    resp = await self._client.post(self.url, headers=headers, json=payload)
+                    record["status"] = resp.status_code
+                except httpx.TransportError as exc:
+                    resp, record["error"] = None, f"{type(exc).__name__}: {exc}"
+                self._record(record, started, attempts)
+
+                if resp is not None and resp.is_success:
+                    return resp.json()
+                if not await self._backoff(attempt, resp):
+                    break
+        raise self._failure(resp, record, attempts)
+
+    async def stream(self, payload: Dict[str, Any],
+                     headers: Dict[str, str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        POST with ``"stream": true`` and yield the server-sent events as
+        dicts while they arrive.  Retries like ``post`` until a successful
+        response starts; once events have been yielded, a failure is raised
+        instead of replayed.  Attempt latency is time to response headers.
+        """
+        self._stats["requests"] += 1
+        attempts: List[Dict[str, Any]] = []
+        payload = {**payload, "stream": True}
+        async with self._sem:
+            for attempt in range(self.max_retries + 1):
+                started = time.perf_counter()
+                record: Dict[str, Any] = {"attempt": attempt, "status": None}
+                resp = None
+                try:
+                    async with self._client.stream("POST", self.url, headers=headers,
+                                                   json=payload) as resp:
+                        record["status"] = resp.status_code
+                        self._record(record, started, attempts)
+                        if resp.is_success:
+                            async for event in iter_sse(resp.aiter_lines()):
+                                if event.get("type") == "error":
+                                    err = event.get("error") or {}
+                                    self._stats["failures"] += 1
+                                    raise ClaudeError(f"Anthropic stream error: {err.get('message', err)}",
+                                                      attempts=attempts)
+                                yield event
+                            return
+                        await resp.aread()
+                except httpx.TransportError as exc:
+                    if record["status"] is not None:  # failed mid-stream: don't replay
+                        self._stats["failures"] += 1
+                        raise ClaudeError(f"Stream interrupted: {exc}", attempts=attempts) from exc
+                    record["error"] = f"{type(exc).__name__}: {exc}"
+                    self._record(record, started, attempts)
+                if not await self._backoff(attempt, resp):
+                    break
+        raise self._failure(resp, record, attempts)
+
+    async def _backoff(self, attempt: int, resp: httpx.Response | None) -> bool:
+        """Sleep before the next attempt; False when the failure is final."""
+        retryable = resp is None or resp.status_code in RETRY_STATUSES
+        if not retryable or attempt == self.max_retries:
+            return False
+        self._stats["retries"] += 1
+        await self._sleep(self._delay(attempt, resp))
+        return True
+
+    def _failure(self, resp: httpx.Response | None, record: Dict[str, Any],
+                 attempts: List[Dict[str, Any]]) -> ClaudeError:
+        self._stats["failures"] += 1
+        if resp is None:
+            return ClaudeError(f"Network error calling Anthropic: {record['error']}",
+                               attempts=attempts)
+        return ClaudeError(f"Anthropic API error {resp.status_code}: {resp.text}",
+                           status=resp.status_code, attempts=attempts)
+
+    def _record(self, record: Dict[str, Any], started: float,
+                attempts: List[Dict[str, Any]]) -> None:
+        record["latency_ms"] = (time.perf_counter() - started) * 1000.0
+        attempts.append(record)
+        self._stats["attempts"] += 1
+        self._stats["latency_ms_total"] += record["latency_ms"]
+        self._stats["latency_ms_max"] = max(self._stats["latency_ms_max"], record["latency_ms"])
+        if self.on_attempt is not None:
+            self.on_attempt(record)
+
+    def _delay(self, attempt: int, resp: httpx.Response | None) -> float:
+        hinted = retry_after_seconds(resp.headers) if resp is not None else None
+        if hinted is not None:
+            return min(hinted, MAX_RETRY_AFTER)
+        return random.uniform(0.0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+async def iter_sse(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Decode a text/event-stream into the JSON payload of each event."""
+    data: List[str] = []
+    async for line in lines:
+        if line.startswith("data:"):
+            data.append(line[5:].lstrip())
+        elif not line.strip() and data:
+            yield json.loads("\n".join(data))
+            data = []
+    if data:
+        yield json.loads("\n".join(data))
+
+
+def retry_after_seconds(headers: httpx.Headers) -> Optional[float]:
+    """Seconds from ``retry-after-ms`` / ``Retry-After`` (delta or HTTP date)."""
+    ms = headers.get("retry-after-ms")
+    if ms is not None:
+        try:
+            return max(float(ms) / 1000.0, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------- process-wide client ----------
+_client: ClaudeClient | None = None
+
+
+def client_from_env() -> ClaudeClient:
+    return ClaudeClient(
+        url=os.getenv("RISKPORTAL_ANTHROPIC_URL", _API_URL),
+        max_retries=int(os.getenv("RISKPORTAL_ANTHROPIC_RETRIES", DEFAULT_MAX_RETRIES)),
+        max_concurrency=int(os.getenv("RISKPORTAL_ANTHROPIC_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+        on_attempt=observe_claude_attempt,
+    )
+
+
+def get_claude_client() -> ClaudeClient:
+    """
+    Shared client, created lazily if the app lifespan hasn't opened one.
+    httpx connections belong to the loop that opened them, so a call from a
+    different event loop (e.g. TestClient without lifespan) gets a fresh client.
+    """
+    global _client
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.closed or _client._loop not in (None, loop):
+        _client = client_from_env()
+    _client._loop = loop
+    return _client
+
+
+async def start_claude_client() -> ClaudeClient:
+    return get_claude_client()
+
+
+async def close_claude_client() -> None:
+    global _client
+    if _client is not None:
+        if not _client.closed:
+            await _client.aclose()
+        _client = None
+
+
+def _request(history: List[Dict[str, str]]) -> tuple:
+    """(payload, headers) of a Messages API call for ``history``."""
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not api_key:
         raise RuntimeError("API key missing")
 
-    # DEBUG: Log the API key being used (first 10 chars only)
-    print(f"DEBUG: Using API key starting with: {api_key[:10]}...")
-
+    # cache_control marks the static prefix (tools, then system prompt) for
+    # provider-side prompt caching; only the history differs between turns
     payload = {
         "model": _MODEL,
         "max_tokens": 1500,
-        "system": SYSTEM_PROMPT,
+        "system": [{"type": "text", "text": SYSTEM_PROMPT,
+                    "cache_control": {"type": "ephemeral"}}],
         "messages": history,
-        "tools": [_TOOL_SCHEMA]
+        "tools": [{**_TOOL_SCHEMA, "cache_control": {"type": "ephemeral"}}]
     }
 
     # No beta header - tools may be stable now
@@ -52,20 +315,74 @@ async def call_claude(history: List[Dict[str, str]]) -> Dict[str, Any]:
         "x-api-key": api_key,
         "anthropic-version": "2023-06-01"
     }
+    return payload, headers
+
 
+async def call_claude(history: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Return Claude JSON or raise RuntimeError (ClaudeError) with detailed error."""
+    payload, headers = _request(history)
+    cache, key = get_response_cache(), response_key(payload)
+    if cache is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post(_API_URL, headers=headers, json=payload)
+        response = await get_claude_client().post(payload, headers)
+    except ClaudeError as e:
+        log.warning("Claude request failed: %s", e, extra={"attempts": e.attempts})
+        raise
+    prompt_cache_stats.record(response.get("usage"))
+    if cache is not None:
+        cache.put(key, response)
+    return response
+
+
+async def stream_claude(history: List[Dict[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming call_claude: yields Anthropic stream events as they arrive.
+    A response-cache hit is replayed as an equivalent event sequence; a
+    completed stream is stored in the same shape call_claude would cache.
+    """
+    payload, headers = _request(history)
+    cache, key = get_response_cache(), response_key(payload)
+    if cache is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            for event in replay_events(hit):
+                yield event
+            return
 
-            # Better error handling - don't mask the real error
-            if not resp.is_success:
-                error_text = resp.text
-                print(f"DETAILED ERROR: Status {resp.status_code}: {error_text}")
-                raise RuntimeError(f"Anthropic API error {resp.status_code}: {error_text}")
+    assembler, usage = MessageAssembler(), {}
+    async for event in get_claude_client().stream(payload, headers):
+        if event.get("type") == "message_start":
+            usage.update(event.get("message", {}).get("usage") or {})
+        elif event.get("type") == "message_delta":
+            usage.update(event.get("usage") or {})
+        assembler.feed(event)
+        yield event
+    prompt_cache_stats.record(usage)
+    if cache is not None:
+        try:
+            content = assembler.content()
+        except ValueError:
+            return  # truncated tool call: nothing worth replaying
+        cache.put(key, {"content": content, "stop_reason": assembler.stop_reason, "usage": usage})
 
-            return resp.json()
 
-    except httpx.RequestError as e:
-        raise RuntimeError(f"Network error calling Anthropic: {str(e)}")
-    except Exception as e:
-        raise RuntimeError(f"Unexpected error calling Anthropic: {str(e)}")
+def replay_events(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Stream events that rebuild a complete (cached) response."""
+    events: List[Dict[str, Any]] = [{"type": "message_start", "message": {"content": []}}]
+    for i, block in enumerate(response.get("content", [])):
+        if block.get("type") == "tool_use":
+            events.append({"type": "content_block_start", "index": i,
+                           "content_block": {**block, "input": {}}})
+            delta = {"type": "input_json_delta", "partial_json": json.dumps(block.get("input", {}))}
+        else:
+            events.append({"type": "content_block_start", "index": i,
+                           "content_block": {**block, "text": ""}})
+            delta = {"type": "text_delta", "text": block.get("text", "")}
+        events.append({"type": "content_block_delta", "index": i, "delta": delta})
+        events.append({"type": "content_block_stop", "index": i})
+    events.append({"type": "message_delta", "delta": {"stop_reason": response.get("stop_reason")}})
+    events.append({"type": "message_stop"})
+    return events
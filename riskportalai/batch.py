@@ -0,0 +1,252 @@
+"""
+batch.py
+Multi-scenario comparison with common random numbers (CRN).
+• every variant runs from the same SeedSequence, so identically named
+  parameters / edges see identical random streams
+• identical (key, distribution) draws are sampled once and shared
+• compiled plans come from the plan cache (shared formulas compile once)
+• per-scenario statistics + paired-difference statistics vs a baseline
+• block-wise variant for long jobs: batch_block runs every variant over
+  one block into mergeable estimators (streaming summaries + paired
+  differences), merge_batch_blocks combines blocks in order
+"""
+
+from __future__ import annotations
+import math
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .graph_plan import get_plan
+from .graph_simulate import VectorEngine, _summarise, merge_shards, pilot_ranges, shard_plan
+from .distributions import SAMPLING_STRATEGIES
+from .metrics import timed
+from .streaming_stats import (DEFAULT_HIST_BINS, QuantileSketch, RunningMoments,
+                              StreamingSummary)
+
+
+def simulate_batch(scenarios: Sequence[Dict[str, Any]],
+                   iterations: int = 10000,
+                   seed: int | None = None,
+                   baseline: str | None = None,
+                   sampling: str = "random",
+                   **sample_opts: Any) -> Dict[str, Any]:
+    """
+    ``scenarios`` is a list of ``{"name": str, "scenario": graph}``.
+    ``baseline`` names the reference variant (default: the first one).
+    """
+    names, baseline = check_batch(scenarios, baseline, sampling)
+    seq = shard_plan(iterations, seed, 1)[0][1]  # one seed for every variant
+    memo: Dict[Any, np.ndarray] = {}
+    lanes: Dict[str, Dict[str, np.ndarray]] = {}
+    valid: Dict[str, np.ndarray] = {}
+    out: Dict[str, Any] = {}
+    plans_cached = 0
+
+    for item in scenarios:
+        name = item["name"]
+        timings: Dict[str, float] = {}
+        with timed(timings, "plan"):
+            plan, cached = get_plan(item["scenario"])
+        plans_cached += cached
+        engine = VectorEngine(plan, seq, sampling, memo, timings=timings)
+        values, ok = engine.step(iterations)
+        lanes[name] = {nid: values[nid] for nid in plan.result_ids}
+        valid[name] = ok
+        samples = {nid: arr[ok] for nid, arr in lanes[name].items()}
+        out[name] = _summarise(samples, int(iterations - ok.sum()), {
+            "iterations": iterations, "seed": seed, "sampling": sampling,
+            "plan_cached": cached, "optimizer": plan.optimization,
+            "discard_reasons": engine.discards, "timings": timings,
+        }, **sample_opts)
+
+    for name in names:
+        out[name]["differences"] = (
+            {} if name == baseline else
+            _paired(lanes[name], valid[name], lanes[baseline], valid[baseline]))
+
+    return {
+        "scenarios": out,
+        "metadata": _batch_metadata(iterations, seed, sampling, baseline, names, plans_cached),
+    }
+
+
+def check_batch(scenarios: Sequence[Dict[str, Any]], baseline: str | None,
+                sampling: str) -> Tuple[List[str], str]:
+    """(names, baseline) of a well-formed batch; ValueError otherwise."""
+    if not scenarios:
+        raise ValueError("Batch needs at least one scenario")
+    if sampling not in SAMPLING_STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy: {sampling}")
+    names = [s["name"] for s in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError("Scenario names must be unique")
+    baseline = baseline or names[0]
+    if baseline not in names:
+        raise ValueError(f"Unknown baseline scenario '{baseline}'")
+    return names, baseline
+
+
+def _batch_metadata(iterations: int, seed: int | None, sampling: str, baseline: str,
+                    names: List[str], plans_cached: int) -> Dict[str, Any]:
+    return {
+        "iterations": iterations,
+        "seed": seed,
+        "sampling": sampling,
+        "baseline": baseline,
+        "scenario_count": len(names),
+        "plans_cached": plans_cached,
+        "common_random_numbers": sampling != "sobol",
+    }
+
+
+def _paired(variant: Dict[str, np.ndarray], v_ok: np.ndarray,
+            base: Dict[str, np.ndarray], b_ok: np.ndarray) -> Dict[str, Any]:
+    """Lane-by-lane differences variant - baseline for shared result nodes."""
+    both = v_ok & b_ok
+    n = int(both.sum())
+    diffs: Dict[str, Any] = {}
+    for nid in variant:
+        if nid not in base or n == 0:
+            continue
+        v, b = variant[nid][both], base[nid][both]
+        d = v - b
+        var_d = float(d.var(ddof=1)) if n > 1 else 0.0
+        var_indep = float(v.var(ddof=1) + b.var(ddof=1)) if n > 1 else 0.0
+        p5, p50, p95 = np.percentile(d, [5, 50, 95])
+        diffs[nid] = {
+            "mean": float(d.mean()),
+            "stderr": float(np.sqrt(var_d / n)),
+            "p5": float(p5), "p50": float(p50), "p95": float(p95),
+            "prob_increase": float((d > 0).mean()),
+            "paired_iterations": n,
+            # how many times more iterations independent runs would need
+            # for the same standard error of the mean difference
+            "crn_variance_ratio": float(var_indep / var_d) if var_d > 0 else None,
+        }
+    return diffs
+
+
+# ---------- block-wise batches ----------
+class PairedDifference:
+    """Mergeable paired-difference statistics (variant - baseline) of one result node."""
+
+    __slots__ = ("diff", "variant", "base", "sketch", "increases")
+
+    def __init__(self):
+        self.diff = RunningMoments()
+        self.variant = RunningMoments()
+        self.base = RunningMoments()
+        self.sketch = QuantileSketch()
+        self.increases = 0
+
+    def update(self, v: np.ndarray, b: np.ndarray) -> None:
+        d = v - b
+        self.diff.update(d)
+        self.variant.update(v)
+        self.base.update(b)
+        self.sketch.update(d)
+        self.increases += int((d > 0).sum())
+
+    def merge(self, other: "PairedDifference") -> None:
+        for name in ("diff", "variant", "base", "sketch"):
+            getattr(self, name).merge(getattr(other, name))
+        self.increases += other.increases
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same fields as the in-memory paired statistics (quantiles from the sketch)."""
+        n = self.diff.n
+        var_d = self.diff.variance
+        var_indep = self.variant.variance + self.base.variance
+        p5, p50, p95 = self.sketch.quantiles((0.05, 0.50, 0.95))
+        return {
+            "mean": self.diff.mean,
+            "stderr": math.sqrt(var_d / n) if n else 0.0,
+            "p5": p5, "p50": p50, "p95": p95,
+            "prob_increase": self.increases / n if n else 0.0,
+            "paired_iterations": n,
+            "crn_variance_ratio": var_indep / var_d if var_d > 0 else None,
+        }
+
+
+def batch_pilot_ranges(scenarios: Sequence[Dict[str, Any]],
+                       seq: np.random.SeedSequence,
+                       sampling: str = "random") -> Dict[str, Dict[str, Tuple[float, float]]]:
+    """Histogram ranges per variant, shared by all blocks so their histograms merge."""
+    return {s["name"]: pilot_ranges(s["scenario"], seq, sampling=sampling) for s in scenarios}
+
+
+def batch_block(scenarios: Sequence[Dict[str, Any]],
+                iterations: int,
+                seq: np.random.SeedSequence,
+                baseline: str | None = None,
+                sampling: str = "random",
+                hist_ranges: Dict[str, Dict[str, Tuple[float, float]]] | None = None,
+                hist_bins: int = DEFAULT_HIST_BINS) -> Dict[str, Dict[str, Any]]:
+    """
+    Run every variant over one block; returns per-variant parts in the
+    shape of run_shard's chunked output plus mergeable ``differences``.
+    """
+    names, baseline = check_batch(scenarios, baseline, sampling)
+    hist_ranges = hist_ranges or {}
+    memo: Dict[Any, np.ndarray] = {}
+    parts: Dict[str, Dict[str, Any]] = {}
+    base: Tuple[Dict[str, np.ndarray], np.ndarray] | None = None
+    # the baseline first, so every variant is paired in the same pass
+    for item in sorted(scenarios, key=lambda s: s["name"] != baseline):
+        name = item["name"]
+        timings: Dict[str, float] = {}
+        with timed(timings, "plan"):
+            plan, cached = get_plan(item["scenario"])
+        engine = VectorEngine(plan, seq, sampling, memo, timings=timings)
+        values, ok = engine.step(iterations)
+        ranges = hist_ranges.get(name, {})
+        summaries = {nid: StreamingSummary(ranges.get(nid, (0.0, 1.0)), hist_bins)
+                     for nid in plan.result_ids}
+        diffs: Dict[str, PairedDifference] = {}
+        with timed(timings, "stats"):
+            for nid, summ in summaries.items():
+                summ.update(values[nid][ok])
+            if name == baseline:
+                base = ({nid: values[nid] for nid in plan.result_ids}, ok)
+            else:
+                both = ok & base[1]
+                for nid in plan.result_ids:
+                    if nid in base[0]:
+                        diffs[nid] = PairedDifference()
+                        diffs[nid].update(values[nid][both], base[0][nid][both])
+        parts[name] = {"plan_cached": cached, "optimizer": plan.optimization,
+                       "timings": timings, "summaries": summaries,
+                       "discarded": int(iterations - ok.sum()),
+                       "discard_reasons": engine.discards, "sampling": sampling,
+                       "differences": diffs}
+    return {name: parts[name] for name in names}
+
+
+def merge_batch_blocks(blocks: Sequence[Dict[str, Dict[str, Any]]],
+                       seed: int | None = None,
+                       baseline: str | None = None) -> Dict[str, Any]:
+    """
+    Merge batch_block outputs (in block order) into a simulate_batch-shaped
+    result with streaming statistics.  Merges into the first block's
+    estimators, like merge_shards.
+    """
+    names = list(blocks[0])
+    baseline = baseline or names[0]
+    out: Dict[str, Any] = {}
+    plans_cached = 0
+    for name in names:
+        parts = [b[name] for b in blocks]
+        diffs = parts[0]["differences"]
+        for p in parts[1:]:
+            for nid, d in p["differences"].items():
+                diffs[nid].merge(d)
+        out[name] = merge_shards(parts, seed=seed)
+        out[name]["differences"] = {nid: d.to_dict() for nid, d in diffs.items()
+                                    if d.diff.n}
+        plans_cached += out[name]["metadata"]["plan_cached"]
+    iterations = out[names[0]]["metadata"]["iterations"]
+    metadata = _batch_metadata(iterations, seed, blocks[0][names[0]]["sampling"], baseline,
+                               names, plans_cached)
+    metadata.update(chunked=True, blocks=len(blocks))
+    return {"scenarios": out, "metadata": metadata}
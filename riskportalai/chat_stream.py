@@ -0,0 +1,70 @@
+"""
+chat_stream.py
+Server-sent events for /chat/stream.
+• MessageAssembler: rebuilds Claude's final message from the Anthropic
+  stream (text deltas appended, tool input accumulated from partial JSON
+  deltas and parsed once its block closes) and says what to forward
+• sse_event: one ``event:`` / ``data:`` frame for the browser
+Browser events: text {delta} as soon as Claude writes it, tool_start
+{name}, tool_progress {name, bytes}, then final (the same body /chat
+returns) or error {detail}.
+"""
+
+from __future__ import annotations
+import json
+from typing import Any, Dict, List, Tuple
+
+BrowserEvent = Tuple[str, Dict[str, Any]]
+
+
+class MessageAssembler:
+    """Feed Anthropic stream events in order; read ``content()`` at the end."""
+
+    def __init__(self):
+        self._blocks: Dict[int, Dict[str, Any]] = {}
+        self._partial: Dict[int, List[str]] = {}   # tool_use index -> JSON fragments
+        self._sizes: Dict[int, int] = {}
+        self.stop_reason: str | None = None
+
+    def feed(self, event: Dict[str, Any]) -> BrowserEvent | None:
+        kind = event.get("type")
+        if kind == "content_block_start":
+            i, block = event["index"], dict(event["content_block"])
+            self._blocks[i] = block
+            if block.get("type") == "tool_use":
+                self._partial[i], self._sizes[i] = [], 0
+                return "tool_start", {"name": block.get("name")}
+            block.setdefault("text", "")
+            return None
+        if kind == "content_block_delta":
+            i, delta = event["index"], event["delta"]
+            if delta.get("type") == "text_delta":
+                self._blocks[i]["text"] += delta["text"]
+                return "text", {"delta": delta["text"]}
+            if delta.get("type") == "input_json_delta":
+                self._partial[i].append(delta["partial_json"])
+                self._sizes[i] += len(delta["partial_json"])
+                return "tool_progress", {"name": self._blocks[i].get("name"), "bytes": self._sizes[i]}
+            return None
+        if kind == "content_block_stop":
+            i = event["index"]
+            if i in self._partial:
+                raw = "".join(self._partial.pop(i))
+                try:
+                    self._blocks[i]["input"] = json.loads(raw) if raw else {}
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"Malformed tool input from Claude: {exc}") from exc
+            return None
+        if kind == "message_delta":
+            self.stop_reason = event.get("delta", {}).get("stop_reason", self.stop_reason)
+        return None
+
+    def content(self) -> List[Dict[str, Any]]:
+        """Content blocks in index order, shaped like a non-streaming response."""
+        if self._partial:  # e.g. max_tokens hit inside the tool call
+            raise ValueError("Claude's tool input was cut off before it was complete")
+        return [self._blocks[i] for i in sorted(self._blocks)]
+
+
+def sse_event(name: str, data: Dict[str, Any]) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
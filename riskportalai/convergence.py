@@ -0,0 +1,74 @@
+"""
+convergence.py
+Confidence-interval widths used by adaptive runs.
+• mean: normal-approximation 95 % CI
+• P5 / P50 / P95: distribution-free order-statistic 95 % CI
+Widths are reported as relative half-widths (half-width / |estimate|).
+streaming_halfwidths computes the same widths from mergeable running
+moments + a quantile sketch, so adaptive runs can check convergence after
+every block without revisiting earlier samples.
+"""
+
+from __future__ import annotations
+import math
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .streaming_stats import QuantileSketch, RunningMoments
+
+Z_95 = 1.959964
+TRACKED_QUANTILES = {"p5": 0.05, "p50": 0.50, "p95": 0.95}
+_EPS = 1e-12
+
+
+def relative_halfwidths(arr: np.ndarray) -> Dict[str, float]:
+    """Relative 95 % CI half-width for mean, P5, P50 and P95 of ``arr``."""
+    n = len(arr)
+    if n < 2:
+        return {k: math.inf for k in ("mean", *TRACKED_QUANTILES)}
+
+    out: Dict[str, float] = {}
+    mean = float(arr.mean())
+    out["mean"] = Z_95 * float(arr.std(ddof=1)) / math.sqrt(n) / max(abs(mean), _EPS)
+
+    bounds = _rank_bounds(n)
+    kth = sorted({k for b in bounds.values() for k in b})
+    part = np.partition(arr, kth)
+    for key, (lo, mid, hi) in bounds.items():
+        half = (part[hi] - part[lo]) / 2.0
+        out[key] = float(half / max(abs(part[mid]), _EPS))
+    return out
+
+
+def streaming_halfwidths(moments: RunningMoments, sketch: QuantileSketch) -> Dict[str, float]:
+    """
+    relative_halfwidths from streaming estimators.  Quantile ranks are read
+    off the sketch and its error bound is added to each half-width, so
+    bucketing can never make an interval look narrower than it is.
+    """
+    n = moments.n
+    if n < 2:
+        return {k: math.inf for k in ("mean", *TRACKED_QUANTILES)}
+
+    out: Dict[str, float] = {}
+    out["mean"] = Z_95 * moments.std / math.sqrt(n) / max(abs(moments.mean), _EPS)
+    bounds = _rank_bounds(n)
+    values = iter(sketch.quantiles([r / (n - 1) for ranks in bounds.values() for r in ranks]))
+    for key in bounds:
+        lo, mid, hi = next(values), next(values), next(values)
+        half = (hi - lo) / 2.0 + sketch.relative_accuracy * max(abs(lo), abs(hi))
+        out[key] = float(half / max(abs(mid), _EPS))
+    return out
+
+
+def _rank_bounds(n: int) -> Dict[str, Tuple[int, int, int]]:
+    """Ranks (lo, mid, hi) bracketing each quantile: n*q ± z*sqrt(n*q*(1-q))."""
+    bounds = {}
+    for key, q in TRACKED_QUANTILES.items():
+        spread = Z_95 * math.sqrt(n * q * (1 - q))
+        lo = min(max(int(math.floor(n * q - spread)), 0), n - 1)
+        hi = min(max(int(math.ceil(n * q + spread)), 0), n - 1)
+        mid = min(max(int(round(n * q)), 0), n - 1)
+        bounds[key] = (lo, mid, hi)
+    return bounds
@@ -0,0 +1,101 @@
+"""
+copula.py
+Correlated parameter sampling through a Gaussian copula.
+• scenario["correlations"]: pairwise coefficients of the underlying normals,
+  e.g. {"between": ["daily_sales", "unit_price"], "coefficient": -0.6};
+  unlisted pairs are independent
+• the correlation matrix must be positive semi-definite; it is factorised
+  once per plan (Cholesky) and reused for every block
+• each block: uniforms of all correlated parameters as one (k, n) matrix
+  -> standard normals -> one matmul with the factor -> normal CDF ->
+  every marginal's own inverse CDF (see distributions.ppf_rows)
+Marginals keep their declared distributions exactly; only the dependence
+between them changes.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .distributions import _U_EPS
+
+_PSD_TOL = 1e-10   # eigenvalues above -tol count as >= 0 (rounding)
+_JITTER = 1e-10    # ridge added when a PSD matrix is singular (|rho| = 1)
+
+
+@dataclass(frozen=True, eq=False)
+class Copula:
+    """One Gaussian copula over ``ids`` (parameter ids, matrix order)."""
+    ids: Tuple[str, ...]
+    matrix: np.ndarray        # (k, k) correlation matrix
+    factor: np.ndarray        # (k, k) lower-triangular, factor @ factor.T ~= matrix
+
+    def __eq__(self, other: object) -> bool:
+        return (isinstance(other, Copula) and self.ids == other.ids
+                and np.array_equal(self.matrix, other.matrix))
+
+    def correlate(self, u: np.ndarray) -> np.ndarray:
+        """Map a (k, n) block of independent uniforms to correlated ones."""
+        from scipy.special import ndtr, ndtri  # lazy, like the other inverse CDFs
+        z = ndtri(np.clip(u, _U_EPS, 1 - _U_EPS))
+        return ndtr(self.factor @ z)
+
+
+def correlation_errors(scenario: Dict[str, Any]) -> List[str]:
+    """Human-readable problems with ``scenario["correlations"]`` (empty if valid)."""
+    try:
+        build_copula(scenario)
+    except ValueError as exc:
+        return [str(exc)]
+    return []
+
+
+def build_copula(scenario: Dict[str, Any]) -> Copula | None:
+    """Validate the correlations block and factorise it; None when absent."""
+    pairs = scenario.get("correlations") or []
+    if not pairs:
+        return None
+    if not isinstance(pairs, list) or not all(isinstance(c, dict) for c in pairs):
+        raise ValueError("'correlations' must be a list of {between, coefficient} objects")
+    params = {n.get("id") for n in scenario.get("nodes", []) if n.get("type") == "parameter"}
+
+    ids: List[str] = []
+    coeffs: Dict[Tuple[str, str], float] = {}
+    for i, c in enumerate(pairs):
+        between, rho = c.get("between"), c.get("coefficient")
+        if not isinstance(between, Sequence) or isinstance(between, str) or len(between) != 2:
+            raise ValueError(f"Correlation #{i} needs 'between': [node_a, node_b]")
+        a, b = between
+        for nid in (a, b):
+            if nid not in params:
+                raise ValueError(f"Correlation #{i} references '{nid}', which is not a parameter node")
+        if a == b:
+            raise ValueError(f"Correlation #{i} correlates '{a}' with itself")
+        if isinstance(rho, bool) or not isinstance(rho, (int, float)) or not -1 <= rho <= 1:
+            raise ValueError(f"Correlation #{i} coefficient must be a number in [-1, 1]")
+        pair = (a, b) if a < b else (b, a)
+        if pair in coeffs:
+            raise ValueError(f"Correlation between '{a}' and '{b}' is listed twice")
+        coeffs[pair] = float(rho)
+        ids.extend(nid for nid in (a, b) if nid not in ids)
+
+    # matrix order follows the scenario's node order, not the pair order
+    order = {n.get("id"): i for i, n in enumerate(scenario["nodes"])}
+    ids.sort(key=order.__getitem__)
+    pos = {nid: i for i, nid in enumerate(ids)}
+    matrix = np.eye(len(ids))
+    for (a, b), rho in coeffs.items():
+        matrix[pos[a], pos[b]] = matrix[pos[b], pos[a]] = rho
+
+    lowest = float(np.linalg.eigvalsh(matrix)[0])
+    if lowest < -_PSD_TOL:
+        raise ValueError("Correlation matrix is not positive semi-definite "
+                         f"(smallest eigenvalue {lowest:.4g}); the coefficients are inconsistent")
+    try:
+        factor = np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        # singular but PSD (e.g. a coefficient of ±1): a tiny ridge makes it factorisable
+        factor = np.linalg.cholesky(matrix + _JITTER * np.eye(len(ids)))
+    return Copula(ids=tuple(ids), matrix=matrix, factor=factor)
@@ -0,0 +1,420 @@
+"""
+distributions.py
+Distribution sampling for graph nodes and edges.
+• families: constant, normal, uniform, triangular, discrete, lognormal,
+  bernoulli, beta, poisson, pert (a beta rescaled to [min, max])
+• sample_distribution: direct pseudo-random draws (rng.normal, ...);
+  sample_rows draws a (k, n) block, one call per family
+• ppf_distribution: inverse CDF of every supported family, driven by
+  uniforms in (0, 1); ppf_rows maps a (k, n) block row-wise, one NumPy
+  expression per distribution family
+• BlockSampler: per-key draws for one engine under a sampling strategy
+  – "random": pseudo-random, one persistent stream per key
+  – "lhs":    Latin hypercube (per-key stratified uniforms) + inverse CDF
+  – "sobol":  scrambled Sobol' sequence (one dimension per key) + inverse CDF
+  a target's edges share streams (edge_rows): one for firing, one per
+  impact family (lhs: one in all), each drawn as a single block;
+  Sobol' keeps one dimension per edge key
+"""
+
+from __future__ import annotations
+import json
+import warnings
+import zlib
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+import numpy as np
+
+SAMPLING_STRATEGIES = ("random", "lhs", "sobol")
+_U_EPS = 1e-12  # keep uniforms off 0/1 so unbounded inverse CDFs stay finite
+
+
+# ---------- per-node random streams ----------
+def node_stream(seq: np.random.SeedSequence, key: str) -> np.random.Generator:
+    """
+    Independent generator for one node / edge, derived from the shard's
+    SeedSequence and a stable hash of ``key``.  Draws therefore do not depend
+    on how many other nodes exist or in which order they are visited.
+    """
+    child = np.random.SeedSequence(seq.entropy,
+                                   spawn_key=seq.spawn_key + (zlib.crc32(key.encode("utf-8")),))
+    return np.random.default_rng(child)
+
+
+# --- Distribution sampling --------------------------------
+def sample_distribution(dist: Dict[str, Any],
+                        size: int,
+                        rng: np.random.Generator) -> np.ndarray:
+    dtype = float
+    d_type = dist["type"].lower()
+    p = dist["parameters"]
+
+    if d_type == "constant":
+        return np.full(size, p["value"], dtype=dtype)
+    if d_type == "normal":
+        return rng.normal(p["mean"], p["stddev"], size=size)
+    if d_type == "uniform":
+        return rng.uniform(p["lower"], p["upper"], size=size)
+    if d_type == "triangular":
+        return rng.triangular(p["min"], p["mode"], p["max"], size=size)
+    if d_type == "discrete":
+        vals = np.array(p["values"])
+        idx = rng.integers(0, len(vals), size=size)
+        return vals[idx].astype(dtype)
+    if d_type == "lognormal":
+        return rng.lognormal(p["mean"], p["sigma"], size=size)
+    if d_type == "bernoulli":
+        return (rng.random(size) < p["p"]).astype(dtype)
+    if d_type == "beta":
+        return rng.beta(p["alpha"], p["beta"], size=size)
+    if d_type == "poisson":
+        return rng.poisson(p["lambda"], size=size).astype(dtype)
+    if d_type == "pert":
+        lo, hi = p["min"], p["max"]
+        if hi == lo:
+            return np.full(size, lo, dtype=dtype)
+        a, b = _pert_shape(p)
+        return lo + (hi - lo) * rng.beta(a, b, size=size)
+    raise ValueError(f"Unsupported distribution: {d_type}")
+
+
+def sample_rows(dists: Sequence[Dict[str, Any]], size: int,
+                streams: Callable[[str], np.random.Generator]) -> np.ndarray:
+    """
+    (len(dists), size) block; row i draws ``dists[i]``.  Rows of one family
+    come from a single call on that family's stream (``streams(family)``),
+    except that rows sharing a parameter set are drawn together with scalar
+    parameters on ``streams(family:<parameters>)``.  Draws are lane-major,
+    so consecutive blocks continue the same sequence as one larger block.
+    """
+    calls: Dict[str, list] = {}
+    for d_type, rows in _group_by(dists, lambda d: d["type"].lower()).items():
+        sets = _group_by([dists[i] for i in rows], lambda d: _dist_key(d["parameters"]))
+        rest = []
+        for key, members in sets.items():
+            if len(members) > 1:
+                calls[f"{d_type}:{key}"] = [rows[m] for m in members]
+            else:
+                rest.append(rows[members[0]])
+        if rest:
+            calls[d_type] = rest
+    out = None
+    for stream, rows in calls.items():
+        block = _sample_family(dists[rows[0]]["type"].lower(),
+                               [dists[i]["parameters"] for i in rows], size, streams(stream))
+        if len(rows) == len(dists):
+            return np.require(block, float, "CW")  # one call covers the whole block
+        if out is None:
+            out = np.empty((len(dists), size))
+        out[rows] = block
+    return out
+
+
+def _group_by(items: Sequence[Any], key: Callable[[Any], str]) -> Dict[str, list]:
+    groups: Dict[str, list] = {}
+    for i, item in enumerate(items):
+        groups.setdefault(key(item), []).append(i)
+    return groups
+
+
+def _sample_family(d_type: str, params: Sequence[Dict[str, Any]], size: int,
+                   rng: np.random.Generator) -> np.ndarray:
+    """
+    (len(params), size) draws, row i following ``params[i]``.  Variates are
+    generated lane-major and laid out row-major once (``_lanes``) before any
+    arithmetic: NumPy's loops over a transposed block run an order of
+    magnitude slower.  Location-scale families shift / scale standard draws.
+    """
+    m = len(params)
+    if all(p == params[0] for p in params):
+        params = params[:1]  # shared parameters: plain scalar operands
+    col = lambda name: (params[0][name] if len(params) == 1
+                        else np.array([[p[name]] for p in params], dtype=float))
+    draw = lambda f, *args: _lanes(f(*args, size=(size, m)))
+
+    if d_type == "constant":
+        return np.broadcast_to(col("value"), (m, size))
+    if d_type == "normal":
+        return col("mean") + col("stddev") * draw(rng.standard_normal)
+    if d_type == "uniform":
+        lo = col("lower")
+        return lo + (col("upper") - lo) * draw(rng.random)
+    if d_type == "triangular":
+        # Stein & Keblis (2009): min(u, v) and max(u, v) weighted by the
+        # distances of the mode from either end
+        uv = _lanes(rng.random((size, 2 * m)))
+        lo, mode, hi = col("min"), col("mode"), col("max")
+        u, v = uv[:m], uv[m:]
+        out = np.minimum(u, v)
+        np.maximum(u, v, out=v)
+        out *= hi - mode
+        v *= mode - lo
+        out += v
+        out += lo
+        return out
+    if d_type == "discrete":
+        counts = np.array([len(p["values"]) for p in params])
+        idx = (draw(rng.random) * counts[:, None]).astype(np.int64)
+        np.minimum(idx, counts[:, None] - 1, out=idx)
+        if len(params) > 1:
+            idx += (np.cumsum(counts) - counts)[:, None]  # offsets into the flat table
+        return np.concatenate([np.asarray(p["values"], dtype=float) for p in params])[idx]
+    if d_type == "lognormal":
+        return np.exp(col("mean") + col("sigma") * draw(rng.standard_normal))
+    if d_type == "bernoulli":
+        return draw(rng.random) < col("p")
+    if d_type == "beta":
+        return draw(rng.beta, _row(col("alpha")), _row(col("beta")))
+    if d_type == "poisson":
+        return draw(rng.poisson, _row(col("lambda")))
+    if d_type == "pert":
+        lo, hi = col("min"), col("max")
+        # degenerate rows (min == max) draw beta(1, 1) and scale it by 0
+        a, b = np.array([_pert_shape(p) if p["max"] != p["min"] else (1.0, 1.0)
+                         for p in params]).T
+        return lo + (hi - lo) * draw(rng.beta, _row(a), _row(b))
+    raise ValueError(f"Unsupported distribution: {d_type}")
+
+
+def _lanes(draws: np.ndarray) -> np.ndarray:
+    """Lane-major (size, m) draws as a C-ordered (m, size) block."""
+    return np.ascontiguousarray(draws.T)
+
+
+def _row(values: Any) -> Any:
+    """A (k, 1) parameter column as a (k,) row for lane-major draws; scalars pass through."""
+    return np.ravel(values) if np.ndim(values) else values
+
+
+def _pert_shape(p: Dict[str, Any]) -> tuple:
+    """Beta shape parameters of a (modified) PERT on [min, max]."""
+    lo, mode, hi = p["min"], p["mode"], p["max"]
+    lam = p.get("lambda", 4.0)
+    return 1 + lam * (mode - lo) / (hi - lo), 1 + lam * (hi - mode) / (hi - lo)
+
+
+# --- Inverse CDFs -----------------------------------------
+def ppf_distribution(dist: Dict[str, Any], u: np.ndarray) -> np.ndarray:
+    """Map uniforms ``u`` in (0, 1) through the distribution's inverse CDF."""
+    d_type = dist["type"].lower()
+    p = dist["parameters"]
+    u = np.asarray(u, dtype=float)
+
+    if d_type == "constant":
+        return np.full(u.shape, p["value"], dtype=float)
+    if d_type == "normal":
+        return p["mean"] + p["stddev"] * _ndtri(u)
+    if d_type == "uniform":
+        return p["lower"] + (p["upper"] - p["lower"]) * u
+    if d_type == "triangular":
+        a, c, b = p["min"], p["mode"], p["max"]
+        if np.ndim(b) == 0 and b == a:
+            return np.full(u.shape, a, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            split = (c - a) / (b - a)
+            left = a + np.sqrt(u * (b - a) * (c - a))
+            right = b - np.sqrt((1 - u) * (b - a) * (b - c))
+            out = np.where(u < split, left, right)
+        return out if np.ndim(b) == 0 else np.where(b == a, a, out)
+    if d_type == "discrete":
+        vals = np.array(p["values"], dtype=float)
+        idx = np.minimum((u * len(vals)).astype(np.int64), len(vals) - 1)
+        return vals[idx]
+    if d_type == "lognormal":
+        return np.exp(p["mean"] + p["sigma"] * _ndtri(u))
+    if d_type == "bernoulli":
+        return (u < p["p"]).astype(float)
+    if d_type == "beta":
+        return _betaincinv(p["alpha"], p["beta"], u)
+    if d_type == "poisson":
+        from scipy.stats import poisson  # lazy, like _ndtri
+        return poisson.ppf(u, p["lambda"]).astype(float)
+    if d_type == "pert":
+        lo, hi = p["min"], p["max"]
+        if hi == lo:
+            return np.full(u.shape, lo, dtype=float)
+        return lo + (hi - lo) * _betaincinv(*_pert_shape(p), u)
+    raise ValueError(f"Unsupported distribution: {d_type}")
+
+
+_STACK_MAX_LANES = 1024  # ppf_rows: broadcast over parameter columns up to this row length
+
+# families whose inverse CDF broadcasts over (k, 1) parameter columns
+_ROW_PARAMS = {
+    "constant": ("value",),
+    "normal": ("mean", "stddev"),
+    "uniform": ("lower", "upper"),
+    "triangular": ("min", "mode", "max"),
+    "lognormal": ("mean", "sigma"),
+    "bernoulli": ("p",),
+}
+
+
+def ppf_rows(dists: Sequence[Dict[str, Any]], u: np.ndarray) -> np.ndarray:
+    """
+    Row i of the result is ``ppf_distribution(dists[i], u[i])``.  For short
+    rows, rows of one family share a single expression over (k, 1) parameter
+    columns; past ``_STACK_MAX_LANES`` NumPy's scalar-operand loops beat the
+    broadcast ones, so long rows are mapped one by one.
+    """
+    out = np.empty(u.shape, dtype=float)
+    by_type: Dict[str, list] = {}
+    for i, d in enumerate(dists):
+        by_type.setdefault(d["type"].lower(), []).append(i)
+    for d_type, rows in by_type.items():
+        if d_type in _ROW_PARAMS and len(rows) > 1 and u.shape[1] <= _STACK_MAX_LANES:
+            block = u if len(rows) == len(dists) else u[rows]
+            out[rows] = ppf_distribution(_stacked(d_type, dists, rows), block)
+        else:
+            for i in rows:
+                out[i] = ppf_distribution(dists[i], u[i])
+    return out
+
+
+def _stacked(d_type: str, dists: Sequence[Dict[str, Any]], rows: list) -> Dict[str, Any]:
+    """One distribution spec whose parameters are (len(rows), 1) columns."""
+    return {"type": d_type, "parameters": {
+        name: np.array([[dists[i]["parameters"][name]] for i in rows], dtype=float)
+        for name in _ROW_PARAMS[d_type]}}
+
+
+def _ndtri(u: np.ndarray) -> np.ndarray:
+    from scipy.special import ndtri  # lazy: only the lhs / sobol paths need SciPy
+    return ndtri(np.clip(u, _U_EPS, 1 - _U_EPS))
+
+
+def _betaincinv(a: float, b: float, u: np.ndarray) -> np.ndarray:
+    from scipy.special import betaincinv
+    return betaincinv(a, b, u)
+
+
+# --- Strategy-driven block sampler ------------------------
+class BlockSampler:
+    """
+    Supplies uniforms / samples for a fixed set of keys (one per parameter,
+    edge firing and edge impact), block by block.  Streams and the Sobol'
+    engine persist across blocks.
+
+    ``memo`` may be shared between samplers built from the same SeedSequence
+    (e.g. the variants of a batch): identical (key, distribution) draws at the
+    same block are then computed once and reused - common random numbers
+    without the repeated sampling cost.  A memo hit does not advance the
+    sampler's own stream, so only share a memo across single-block runs.
+    Ignored for "sobol", whose dimension layout depends on the full key set.
+    """
+
+    def __init__(self, strategy: str, seq: np.random.SeedSequence, keys: Sequence[str],
+                 memo: Dict[Any, np.ndarray] | None = None):
+        if strategy not in SAMPLING_STRATEGIES:
+            raise ValueError(f"Unknown sampling strategy: {strategy}")
+        self.strategy = strategy
+        self._seq = seq
+        self.streams: Dict[str, np.random.Generator] = {}
+        self._sobol = None
+        self._block: Dict[str, np.ndarray] = {}
+        self._block_no = -1
+        self._memo = memo if strategy != "sobol" else None
+        if strategy == "sobol":
+            from scipy.stats import qmc
+            self._dims = {k: i for i, k in enumerate(keys)}
+            if len(keys) > qmc.Sobol.MAXDIM:
+                raise ValueError(f"Sobol sampling supports at most {qmc.Sobol.MAXDIM} "
+                                 f"random dimensions, scenario needs {len(keys)}")
+            self._sobol = qmc.Sobol(max(len(keys), 1), scramble=True,
+                                    seed=node_stream(seq, "sobol"))
+
+    def _rng(self, key: str) -> np.random.Generator:
+        rng = self.streams.get(key)
+        if rng is None:
+            rng = self.streams[key] = node_stream(self._seq, key)
+        return rng
+
+    def start_block(self, n: int) -> None:
+        self.n = n
+        self._block_no += 1
+        if self._sobol is not None:
+            with warnings.catch_warnings():
+                # balance is best at powers of two; other sizes are still valid
+                warnings.simplefilter("ignore", UserWarning)
+                self._block = {"__matrix__": self._sobol.random(n)}
+
+    def uniform(self, key: str) -> np.ndarray:
+        if self._sobol is not None:
+            return self._block["__matrix__"][:, self._dims[key]]
+        return self._memoised(("u", key), lambda: self._draw_uniform(key))
+
+    def uniform_rows(self, keys: Sequence[str]) -> np.ndarray:
+        """(len(keys), n) block of uniforms, one row per key."""
+        if self._sobol is not None:
+            return self._block["__matrix__"][:, [self._dims[k] for k in keys]].T
+        out = np.empty((len(keys), self.n))
+        for i, key in enumerate(keys):
+            if self._memo is None:
+                self._draw_uniform(key, out[i])  # straight into the row, no copy
+            else:
+                out[i] = self.uniform(key)
+        return out
+
+    def edge_rows(self, group: str, fire_keys: Sequence[str], impact_keys: Sequence[str],
+                  dists: Sequence[Dict[str, Any]],
+                  probability: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (fired, impact), both (k, n), for one target's edges; impacts are 0
+        where an edge did not fire.  Sobol' reads every key's own dimension;
+        "random" draws from the target's streams ``group:fire`` /
+        ``group:<family>[:<parameters>]`` (see sample_rows); "lhs"
+        stratifies uniforms from the single stream ``group``.
+        """
+        if self._sobol is not None:
+            u = self.uniform_rows(fire_keys)
+            return _fire(u <= probability, ppf_rows(dists, self.uniform_rows(impact_keys)))
+        tag = ("g", group, _dist_key(dists), probability.tobytes())
+        return self._memoised(tag, lambda: self._draw_rows(group, dists, probability))
+
+    def _draw_rows(self, group: str, dists: Sequence[Dict[str, Any]],
+                   probability: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        n, k = self.n, len(dists)
+        if self.strategy == "random":
+            u = _lanes(self._rng(group + ":fire").random((n, k)))  # lane-major, like the impacts
+            return _fire(u <= probability, sample_rows(dists, n, lambda stream: self._rng(f"{group}:{stream}")))
+        # lhs: each row is a random permutation of the n strata plus jitter
+        rng = self._rng(group)
+        strata = np.tile(np.arange(n, dtype=float), (2 * k, 1))
+        rng.permuted(strata, axis=1, out=strata)
+        u = (strata + rng.random((2 * k, n))) / n
+        return _fire(u[:k] <= probability, ppf_rows(dists, u[k:]))
+
+    def _draw_uniform(self, key: str, out: np.ndarray | None = None) -> np.ndarray:
+        n, rng = self.n, self._rng(key)
+        if self.strategy == "random":
+            return rng.random(n, out=out)
+        return np.divide(rng.permutation(n) + rng.random(n), n, out=out)
+
+    def sample(self, key: str, dist: Dict[str, Any]) -> np.ndarray:
+        if self.strategy == "random":
+            draw = lambda: sample_distribution(dist, self.n, self._rng(key)).astype(float, copy=False)
+            if self._memo is None:
+                return draw()  # skip building the memo key
+            return self._memoised(("s", key, _dist_key(dist)), draw)
+        return ppf_distribution(dist, self.uniform(key))
+
+    def _memoised(self, tag: tuple, draw) -> np.ndarray:
+        if self._memo is None:
+            return draw()
+        full = (self._block_no, self.n) + tag
+        arr = self._memo.get(full)
+        if arr is None:
+            arr = self._memo[full] = draw()
+        return arr
+
+
+def _fire(fired: np.ndarray, impact: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Zero the impacts where an edge did not fire (in place)."""
+    np.multiply(impact, fired, out=impact)
+    if not np.isfinite(impact).all():
+        np.copyto(impact, 0.0, where=~fired)  # inf * 0 is NaN: unfired lanes must hold 0
+    return fired, impact
+
+
+def _dist_key(dist: Any) -> str:
+    return json.dumps(dist, sort_keys=True, separators=(",", ":"))
@@ -1,12 +1,17 @@
 """
 expression_eval.py
 Safe evaluation of arithmetic + comparison expressions for graph nodes.
+• formulas compile once to closure trees (LRU cached by formula text)
+• array mode: domain errors become a per-lane validity mask plus a reason
+  per failed lane (division by zero, log domain, overflow, NaN) instead of
+  an exception for the whole batch
 """
 
 from __future__ import annotations
 import ast
 import operator
-from typing import Any, Dict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Mapping, Tuple
 
 import numpy as np
 
@@ -50,10 +55,234 @@ class ExpressionEvaluationError(Exception):
     """Raised for unsafe or invalid expression."""
 
 
+class CompiledExpression:
+    """
+    A formula validated against the whitelist once and turned into a tree of
+    closures.  Calling it with a variables mapping evaluates the formula
+    without touching ``ast`` again.
+    """
+
+    __slots__ = ("formula", "_fn")
+
+    def __init__(self, formula: str, fn: Callable[[Mapping[str, Any]], Any]):
+        self.formula = formula
+        self._fn = fn
+
+    def __call__(self, variables: Mapping[str, Any]) -> Any:
+        try:
+            return self._fn(variables)
+        except ExpressionEvaluationError:
+            raise
+        except Exception as exc:  # pragma: no cover
+            raise ExpressionEvaluationError(str(exc)) from exc
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression({self.formula!r})"
+
+
+# --------------------------------------------------------------------------- #
+# Compilation (AST -> closures) with a bounded LRU cache
+# --------------------------------------------------------------------------- #
+COMPILE_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(expr: str) -> CompiledExpression:
+    """Parse + validate ``expr`` once; cached by formula text."""
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as exc:
+        raise ExpressionEvaluationError(str(exc)) from exc
+    return CompiledExpression(expr, _compile_node(tree.body))
+
+
+def compile_cache_info() -> Dict[str, int]:
+    """Hit / miss counters of the formula cache."""
+    info = compile_expression.cache_info()
+    return {"hits": info.hits, "misses": info.misses,
+            "size": info.currsize, "maxsize": info.maxsize}
+
+
+def clear_compile_cache() -> None:
+    compile_expression.cache_clear()
+
+
+def _compile_node(node: ast.AST) -> Callable[[Mapping[str, Any]], Any]:
+    # literals
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda v: value
+
+    # variables
+    if isinstance(node, ast.Name):
+        name = node.id
+
+        def _load(v):
+            try:
+                return v[name]
+            except KeyError:
+                raise ExpressionEvaluationError(f"Unknown variable '{name}'") from None
+        return _load
+
+    # binary operators
+    if isinstance(node, ast.BinOp):
+        op = _SAFE_BIN_OPS.get(type(node.op))
+        if op is None:
+            raise ExpressionEvaluationError("Operator not allowed")
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda v: op(left(v), right(v))
+
+    # unary operators
+    if isinstance(node, ast.UnaryOp):
+        op = _SAFE_UNARY_OPS.get(type(node.op))
+        if op is None:
+            raise ExpressionEvaluationError("Unary op not allowed")
+        operand = _compile_node(node.operand)
+        return lambda v: op(operand(v))
+
+    # comparisons (x > y, a == b, a < b < c)
+    if isinstance(node, ast.Compare):
+        ops = []
+        for op_node in node.ops:
+            op_func = _SAFE_COMP_OPS.get(type(op_node))
+            if op_func is None:
+                raise ExpressionEvaluationError("Comparison op not allowed")
+            ops.append(op_func)
+        operands = [_compile_node(node.left)] + [_compile_node(c) for c in node.comparators]
+        if len(ops) == 1:
+            op_func, left, right = ops[0], operands[0], operands[1]
+            return lambda v: op_func(left(v), right(v))
+
+        def _chain(v):
+            vals = [f(v) for f in operands]
+            # support chained comparisons
+            return np.logical_and.reduce([op_func(vals[i], vals[i + 1])
+                                          for i, op_func in enumerate(ops)])
+        return _chain
+
+    # function calls
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        func_name = node.func.id
+        if func_name not in _SAFE_FUNCS:
+            raise ExpressionEvaluationError(f"Function '{func_name}' not allowed")
+        func = _SAFE_FUNCS[func_name]
+        args = [_compile_node(arg) for arg in node.args]
+        return lambda v: func(*[a(v) for a in args])
+
+    raise ExpressionEvaluationError(f"Unsupported syntax: {ast.dump(node)}")
+
+
+# --------------------------------------------------------------------------- #
+# Array mode: per-lane error reasons
+# --------------------------------------------------------------------------- #
+LANE_ERROR_REASONS = ("division_by_zero", "log_domain", "overflow", "nan", "invalid_input")
+_DIV0, _LOG, _OVERFLOW, _NAN, _INPUT = range(1, 6)
+_DIV_OPS = (ast.Div, ast.Mod, ast.FloorDiv)
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def _parse(expr: str) -> ast.AST:
+    try:
+        return ast.parse(expr, mode="eval").body
+    except SyntaxError as exc:
+        raise ExpressionEvaluationError(str(exc)) from exc
+
+
+def lane_errors(expr: str,
+                variables: Mapping[str, Any],
+                inline: Mapping[str, str] | None = None) -> np.ndarray:
+    """
+    Why each lane of ``expr`` is non-finite: an int8 code per lane, 0 for a
+    finite lane, otherwise 1 + the index into LANE_ERROR_REASONS.  The
+    innermost failing operation wins, and ``where`` only blames the branch
+    it selected.  Names in ``inline`` are expanded to their formulas (e.g.
+    sub-formulas the optimizer hoisted) so the root cause stays visible.
+    Meant for the few lanes that already failed, so it favours clarity over
+    speed.
+    """
+    with np.errstate(all="ignore"):
+        value, code = _diagnose(_parse(expr), variables, inline or {})
+    shape = np.broadcast(np.asarray(value), code).shape
+    return np.broadcast_to(code, shape).astype(np.int8)
+
+
+def lane_reason_counts(codes: np.ndarray) -> Dict[str, int]:
+    counts = np.bincount(codes.ravel(), minlength=len(LANE_ERROR_REASONS) + 1)
+    return {name: int(counts[i]) for i, name in enumerate(LANE_ERROR_REASONS, 1) if counts[i]}
+
+
+def nonfinite_codes(value: Any) -> np.ndarray:
+    """Codes for values with no known cause: "nan" for NaN, "overflow" for ±inf."""
+    return np.where(np.isfinite(value), 0, np.where(np.isnan(value), _NAN, _OVERFLOW)).astype(np.int8)
+
+
+def _first(*codes: Any) -> np.ndarray:
+    """Lane-wise first non-zero code, in argument order."""
+    out = codes[-1]
+    for c in reversed(codes[:-1]):
+        out = np.where(c != 0, c, out)
+    return out
+
+
+def _diagnose(node: ast.AST, v: Mapping[str, Any],
+              inline: Mapping[str, str]) -> Tuple[Any, np.ndarray]:
+    if isinstance(node, ast.Constant):
+        return node.value, np.int8(0)
+
+    if isinstance(node, ast.Name):
+        if node.id in inline:
+            return _diagnose(_parse(inline[node.id]), v, inline)
+        try:
+            value = v[node.id]
+        except KeyError:
+            raise ExpressionEvaluationError(f"Unknown variable '{node.id}'") from None
+        return value, np.where(np.isfinite(value), 0, _INPUT)
+
+    if isinstance(node, ast.BinOp):
+        op = _SAFE_BIN_OPS.get(type(node.op))
+        if op is None:
+            raise ExpressionEvaluationError("Operator not allowed")
+        (lv, lc), (rv, rc) = _diagnose(node.left, v, inline), _diagnose(node.right, v, inline)
+        value = op(lv, rv)
+        own = nonfinite_codes(value)
+        if isinstance(node.op, _DIV_OPS):
+            own = np.where(np.equal(rv, 0), _DIV0, own)
+        return value, _first(lc, rc, own)
+
+    if isinstance(node, ast.UnaryOp):
+        op = _SAFE_UNARY_OPS.get(type(node.op))
+        if op is None:
+            raise ExpressionEvaluationError("Unary op not allowed")
+        value, code = _diagnose(node.operand, v, inline)
+        value = op(value)
+        return value, _first(code, nonfinite_codes(value))
+
+    if isinstance(node, ast.Compare):
+        # comparisons are always finite: NaN inputs just compare False
+        return compile_expression(ast.unparse(node))(v), np.int8(0)
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        name = node.func.id
+        if name not in _SAFE_FUNCS:
+            raise ExpressionEvaluationError(f"Function '{name}' not allowed")
+        args = [_diagnose(a, v, inline) for a in node.args]
+        value = _SAFE_FUNCS[name](*[a[0] for a in args])
+        if name == "where" and len(args) == 3:
+            (cond, _), (_, ac), (_, bc) = args
+            return value, _first(np.where(cond, ac, bc), nonfinite_codes(value))
+        own = nonfinite_codes(value)
+        if name == "log" and args:
+            own = np.where(np.less_equal(args[0][0], 0), _LOG, own)
+        return value, _first(*[a[1] for a in args], own)
+
+    raise ExpressionEvaluationError(f"Unsupported syntax: {ast.dump(node)}")
+
+
 class SafeEvaluator:
     """
     Evaluate an arithmetic / comparison expression using only whitelisted
-    operators and NumPy-friendly functions.
+    operators and NumPy-friendly functions.  Formulas are compiled once via
+    :func:`compile_expression` and reused across evaluators.
     """
 
     def __init__(self, variables: Dict[str, Any]):
@@ -61,60 +290,39 @@ class SafeEvaluator:
 
     # ---------- public ---------- #
     def evaluate(self, expr: str) -> Any:
-        try:
-            tree = ast.parse(expr, mode="eval")
-            return self._eval_node(tree.body)
-        except ExpressionEvaluationError:
-            raise
-        except Exception as exc:  # pragma: no cover
-            raise ExpressionEvaluationError(str(exc)) from exc
+        return compile_expression(expr)(self.vars)
+
+    def evaluate_masked(self, expr: str) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Array mode: returns (value, valid, reasons).  Domain errors never
+        raise; ``valid`` is False in every non-finite lane and ``reasons``
+        maps each LANE_ERROR_REASONS entry that occurred to its lane mask.
+        """
+        with np.errstate(all="ignore"):
+            value = np.asarray(self.evaluate(expr), dtype=float)
+        valid = np.isfinite(value)
+        reasons: Dict[str, np.ndarray] = {}
+        if not valid.all():
+            bad = ~valid
+            sub = {k: np.broadcast_to(x, value.shape)[bad] if np.ndim(x) else x
+                   for k, x in self.vars.items()}
+            codes = lane_errors(expr, sub)
+            for i, name in enumerate(LANE_ERROR_REASONS, 1):
+                hit = codes == i
+                if hit.any():
+                    mask = np.zeros(value.shape, dtype=bool)
+                    mask[bad] = hit
+                    reasons[name] = mask
+        return value, valid, reasons
+
 
-    # ---------- private recursive ---------- #
-    def _eval_node(self, node: ast.AST) -> Any:
-        # literals
-        if isinstance(node, ast.Constant):
-            return node.value
-
-        # variables
-        if isinstance(node, ast.Name):
-            if node.id not in self.vars:
-                raise ExpressionEvaluationError(f"Unknown variable '{node.id}'")
-            return self.vars[node.id]
-
-        # binary operators
-        if isinstance(node, ast.BinOp):
-            op = _SAFE_BIN_OPS.get(type(node.op))
-            if op is None:
-                raise ExpressionEvaluationError("Operator not allowed")
-            return op(self._eval_node(node.left),
-                      self._eval_node(node.right))
-
-        # unary operators
-        if isinstance(node, ast.UnaryOp):
-            op = _SAFE_UNARY_OPS.get(type(node.op))
-            if op is None:
-                raise ExpressionEvaluationError("Unary op not allowed")
-            return op(self._eval_node(node.operand))
-
-        # comparisons (x > y, a == b, a < b < c)
-        if isinstance(node, ast.Compare):
-            left_val = self._eval_node(node.left)
-            results = []
-            for op_node, comparator in zip(node.ops, node.comparators):
-                op_func = _SAFE_COMP_OPS.get(type(op_node))
-                if op_func is None:
-                    raise ExpressionEvaluationError("Comparison op not allowed")
-                right_val = self._eval_node(comparator)
-                results.append(op_func(left_val, right_val))
-                left_val = right_val  # support chained comparisons
-            return np.logical_and.reduce(results)
-
-        # function calls
-        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-            func_name = node.func.id
-            if func_name not in _SAFE_FUNCS:
-                raise ExpressionEvaluationError(f"Function '{func_name}' not allowed")
-            args = [self._eval_node(arg) for arg in node.args]
-            return _SAFE_FUNCS[func_name](*args)
-
-        raise ExpressionEvaluationError(f"Unsupported syntax: {ast.dump(node)}")
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def referenced_names(expr: str) -> frozenset:
+    """Variable identifiers read by ``expr`` (function names excluded)."""
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as exc:
+        raise ExpressionEvaluationError(str(exc)) from exc
+    funcs = {id(n.func) for n in ast.walk(tree) if isinstance(n, ast.Call)}
+    return frozenset(n.id for n in ast.walk(tree)
+                     if isinstance(n, ast.Name) and id(n) not in funcs)
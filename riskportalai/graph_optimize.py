@@ -0,0 +1,303 @@
+"""
+graph_optimize.py
+Whole-graph optimisation pass run between topological sorting and execution.
+• constant folding: ``constant`` parameters without incoming edges, and every
+  formula (or sub-formula) that depends only on them, become literals
+• dead-node pruning: nodes / edges that reach no ``is_result`` node are
+  dropped, but only when they cannot invalidate an iteration: formulas
+  built from references, literals, sign changes, comparisons and bounded
+  functions (abs, min, max, round, floor, ceil, where) are total; any
+  other arithmetic can overflow or hit a domain error, and parameters
+  drawing lognormal values (own distribution or edge impacts) can
+  overflow, so those are kept with their inputs - their NaNs decide which
+  iterations are discarded
+• common-subexpression elimination: sub-formulas repeated across the graph
+  are hoisted into internal ``__cse<N>`` expression nodes, evaluated once;
+  one bottom-up pass keys every sub-tree, so the cost is linear in the
+  total formula size
+Folding evaluates with the same NumPy operations the engine would use, and
+random streams are keyed per node / edge, so simulation results are unchanged.
+"""
+
+from __future__ import annotations
+import ast
+import copy
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from .expression_eval import _compile_node, referenced_names
+from .graph_utils import topological_sort
+
+CSE_PREFIX = "__cse"
+_FORMULA_TYPES = ("expression", "result")
+_TOTAL_FUNCS = {"abs", "min", "max", "round", "floor", "ceil", "where"}  # finite in, finite out
+_OVERFLOW_FAMILIES = {"lognormal"}  # finite parameters, possibly non-finite draws
+_BOOL_FUNCS = {"where"}  # may return booleans
+
+
+@dataclass
+class OptimizedGraph:
+    nodes: Dict[str, Dict[str, Any]]
+    edges: List[Dict[str, Any]]
+    internal: frozenset          # ids of hoisted CSE nodes
+    report: Dict[str, Any]
+
+
+def optimize_graph(nodes: Dict[str, Dict[str, Any]],
+                   edges: Sequence[Dict[str, Any]]) -> OptimizedGraph:
+    """Return an equivalent, smaller graph plus a report of what changed."""
+    targeted = {e["target"] for e in edges}
+    nodes = {nid: dict(n) for nid, n in nodes.items()}
+
+    folded = _fold_constants(nodes, targeted)
+    live = _live_nodes(nodes, edges)
+    # folded constants are dropped too once nothing reads them; report them once, as folded
+    pruned = [nid for nid in nodes if nid not in live and nid not in folded]
+    kept_edges = [e for e in edges if e["target"] in live]
+    pruned_edges = [e["id"] for e in edges if e["target"] not in live]
+    nodes = {nid: n for nid, n in nodes.items() if nid in live}
+    internal = _eliminate_common_subexpressions(nodes)
+
+    return OptimizedGraph(nodes=nodes, edges=kept_edges, internal=frozenset(internal), report={
+        "folded_nodes": folded,
+        "pruned_nodes": pruned,
+        "pruned_edges": pruned_edges,
+        "shared_subexpressions": len(internal),
+    })
+
+
+# ---------- constant folding ----------
+def _fold_constants(nodes: Dict[str, Dict[str, Any]], targeted: Set[str]) -> List[str]:
+    """Rewrite formulas in place; returns ids of nodes that became constants."""
+    consts: Dict[str, np.ndarray] = {}
+    for nid, n in nodes.items():
+        dist = n.get("distribution") or {}
+        if (n["type"] == "parameter" and nid not in targeted
+                and dist.get("type", "").lower() == "constant"):
+            # one-lane array: same dtype / ufunc loops as np.full in the engine
+            consts[nid] = np.array([dist["parameters"]["value"]], dtype=float)
+    folded = list(consts)
+    if not consts:
+        return folded
+
+    for nid in topological_sort(nodes):
+        tree = ast.parse(nodes[nid]["formula"], mode="eval")
+        if not referenced_names(nodes[nid]["formula"]) & consts.keys():
+            continue
+        body = _Folder(consts).visit(tree.body)
+        if isinstance(body, ast.Constant) and isinstance(body.value, np.ndarray):
+            consts[nid] = body.value
+            folded.append(nid)
+        nodes[nid]["formula"] = ast.unparse(_Literals().visit(body))
+    return folded
+
+
+class _Folder(ast.NodeTransformer):
+    """Substitute constant nodes, then evaluate all-constant sub-trees."""
+
+    def __init__(self, consts: Dict[str, np.ndarray]):
+        self.consts = consts
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id in self.consts:
+            return ast.copy_location(ast.Constant(self.consts[node.id]), node)
+        return node
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        node.args = [self.visit(a) for a in node.args]  # never touch node.func
+        return self._try_fold(node, node.args)
+
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        node = super().generic_visit(node)
+        if isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Compare)):
+            return self._try_fold(node, list(ast.iter_child_nodes(node)))
+        return node
+
+    @staticmethod
+    def _try_fold(node: ast.AST, children: List[ast.AST]) -> ast.AST:
+        operands = [c for c in children if isinstance(c, ast.expr)]
+        if not all(isinstance(c, ast.Constant) for c in operands):
+            return node
+        if not any(isinstance(c.value, np.ndarray) for c in operands):
+            return node  # pure literals: leave to the engine, as before
+        try:
+            with np.errstate(all="ignore"):
+                value = np.asarray(_compile_node(node)({}))
+        except Exception:
+            return node  # keep the failure for run time
+        if value.dtype != bool and not np.all(np.isfinite(value)):
+            return node  # inf / nan have no literal form; keep the lanes' NaN semantics
+        return ast.copy_location(ast.Constant(value.reshape(1)), node)
+
+
+class _Literals(ast.NodeTransformer):
+    """One-lane arrays back to Python literals so the formula can be unparsed."""
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        if not isinstance(node.value, np.ndarray):
+            return node
+        value = node.value[0].item()
+        if isinstance(value, float) and (value < 0 or str(value).startswith("-")):
+            # spelt as -(x) so operator precedence survives unparsing (e.g. ** binds tighter)
+            lit: ast.AST = ast.UnaryOp(ast.USub(), ast.Constant(-value))
+        else:
+            lit = ast.Constant(value)
+        return ast.copy_location(lit, node)
+
+
+# ---------- dead-node pruning ----------
+def _live_nodes(nodes: Dict[str, Dict[str, Any]], edges: Sequence[Dict[str, Any]]) -> Set[str]:
+    overflowing = {e["target"] for e in edges if _may_overflow(e.get("distribution"))}
+    roots = [nid for nid, n in nodes.items()
+             if n.get("is_result")
+             or (n["type"] in _FORMULA_TYPES and not _is_total(n["formula"], nodes))
+             or (n["type"] == "parameter"
+                 and (nid in overflowing or _may_overflow(n.get("distribution"))))]
+    live: Set[str] = set()
+    stack = list(roots)
+    while stack:
+        nid = stack.pop()
+        if nid in live:
+            continue
+        live.add(nid)
+        if nodes[nid]["type"] in _FORMULA_TYPES:
+            stack.extend(d for d in referenced_names(nodes[nid]["formula"]) if d in nodes)
+    return live
+
+
+def _may_overflow(dist: Dict[str, Any] | None) -> bool:
+    return (dist or {}).get("type", "").lower() in _OVERFLOW_FAMILIES
+
+
+def _is_total(formula: str, nodes: Dict[str, Dict[str, Any]]) -> bool:
+    """True if finite inputs always give a finite result (so pruning can't change discards)."""
+    for sub in ast.walk(ast.parse(formula, mode="eval").body):
+        if isinstance(sub, ast.Call):
+            if not isinstance(sub.func, ast.Name) or sub.func.id not in _TOTAL_FUNCS:
+                return False
+        elif isinstance(sub, ast.Name):
+            if sub.id not in nodes and sub.id not in _TOTAL_FUNCS:
+                return False  # unknown names fail every lane
+        elif not isinstance(sub, (ast.Constant, ast.UnaryOp, ast.Compare,
+                                  ast.unaryop, ast.cmpop, ast.expr_context)):
+            return False  # BinOp: + - * can overflow, / % ** can also hit domain errors
+    return True
+
+
+# ---------- common-subexpression elimination ----------
+@dataclass
+class _Sub:
+    """One distinct sub-tree shape (all occurrences share a key)."""
+    sample: ast.AST
+    children: List[int]      # keys of the direct children, with repeats
+    size: int                # AST nodes in the sub-tree
+    hoistable: bool
+    has_name: bool           # reads a node (function names don't count)
+    has_bool: bool           # may be boolean-valued somewhere inside
+    uses: int = 0            # evaluations of this shape once bigger shapes are hoisted
+
+
+def _eliminate_common_subexpressions(nodes: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Hoist repeated sub-formulas; returns the new node ids.  Larger shapes
+    are settled first, so a sub-tree only repeated inside one hoisted shape
+    is evaluated once and stays inline.
+    """
+    trees = {nid: ast.parse(n["formula"], mode="eval").body
+             for nid, n in nodes.items() if n["type"] in _FORMULA_TYPES}
+    shapes: Dict[Tuple, int] = {}
+    subs: List[_Sub] = []
+    keys: Dict[int, int] = {}  # id(ast node) -> shape key
+    roots = [_key(tree, shapes, subs, keys) for tree in trees.values()]
+
+    for k in roots:
+        subs[k].uses += 1      # every formula is evaluated once
+    # parents are strictly bigger than their children: visit big to small
+    hoisted: Dict[int, str] = {}
+    counter = 0
+    for k in sorted(range(len(subs)), key=lambda k: -subs[k].size):
+        sub = subs[k]
+        if sub.hoistable and sub.uses > 1:
+            while f"{CSE_PREFIX}{counter}" in nodes:
+                counter += 1
+            hoisted[k] = f"{CSE_PREFIX}{counter}"
+            counter += 1
+            runs = 1
+        else:
+            runs = sub.uses
+        for c in sub.children:
+            subs[c].uses += runs
+
+    for nid, tree in trees.items():
+        nodes[nid]["formula"] = ast.unparse(_rewrite(tree, keys, hoisted))
+    for k, name in hoisted.items():
+        formula = ast.unparse(_rewrite(subs[k].sample, keys, hoisted, top=False))
+        nodes[name] = {"id": name, "type": "expression", "formula": formula}
+    return list(hoisted.values())
+
+
+def _key(node: ast.AST, shapes: Dict[Tuple, int], subs: List[_Sub], keys: Dict[int, int]) -> int:
+    """Shape key of ``node``, interning its children first (one visit per AST node)."""
+    children: List[int] = []
+    fields: List[Any] = [type(node).__name__]
+    for _, value in ast.iter_fields(node):
+        if isinstance(value, ast.AST):
+            children.append(_key(value, shapes, subs, keys))
+            fields.append(("k", children[-1]))
+        elif isinstance(value, list):
+            items = []
+            for v in value:
+                if isinstance(v, ast.AST):
+                    children.append(_key(v, shapes, subs, keys))
+                    items.append(("k", children[-1]))
+                else:
+                    items.append((type(v).__name__, v))
+            fields.append(tuple(items))
+        else:
+            fields.append((type(value).__name__, value))  # 1, 1.0 and True stay distinct
+    shape = tuple(fields)
+    k = shapes.get(shape)
+    if k is None:
+        k = shapes[shape] = len(subs)
+        subs.append(_describe(node, children, subs))
+    keys[id(node)] = k
+    return k
+
+
+def _describe(node: ast.AST, children: List[int], subs: List[_Sub]) -> _Sub:
+    inner = [subs[c] for c in children]
+    is_call = isinstance(node, ast.Call)
+    func = node.func if is_call else None
+    bool_call = is_call and isinstance(func, ast.Name) and func.id in _BOOL_FUNCS
+    has_bool = (isinstance(node, ast.Compare) or bool_call or any(c.has_bool for c in inner))
+    if isinstance(node, ast.Name):
+        has_name = True
+    else:
+        # a call's own function name is not a read of a node
+        skip = subs[children[0]] if is_call and isinstance(func, ast.Name) else None
+        has_name = any(c.has_name for c in inner if c is not skip)
+    if is_call:
+        hoistable = isinstance(func, ast.Name) and not bool_call
+    else:
+        hoistable = isinstance(node, (ast.BinOp, ast.UnaryOp))  # names and literals stay put
+    # bool + bool is logical or, not 2.0: keep possibly boolean trees inline
+    hoistable = hoistable and not has_bool and has_name
+    return _Sub(node, children, 1 + sum(c.size for c in inner), hoistable, has_name, has_bool)
+
+
+def _rewrite(node: ast.AST, keys: Dict[int, int], hoisted: Dict[int, str],
+             top: bool = True) -> ast.AST:
+    """Copy of ``node`` with hoisted shapes replaced by their node names."""
+    name = hoisted.get(keys[id(node)])
+    if top and name is not None:
+        return ast.copy_location(ast.Name(name, ast.Load()), node)
+    out = copy.copy(node)
+    for field, value in ast.iter_fields(node):
+        if isinstance(value, ast.AST):
+            setattr(out, field, _rewrite(value, keys, hoisted))
+        elif isinstance(value, list):
+            setattr(out, field, [_rewrite(v, keys, hoisted) if isinstance(v, ast.AST) else v
+                                 for v in value])
+    return out
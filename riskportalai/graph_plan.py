@@ -0,0 +1,220 @@
+"""
+graph_plan.py
+Compiled execution plans for scenarios.
+• evaluation order, edges grouped per target (priority order),
+  compiled formulas and result-node ids built once per scenario
+• per-target EdgeGroup: stream keys, probability column and impact-type
+  tiers, so the engine applies all of a target's edges as 2-D arrays
+• Gaussian copula for the scenario's correlations, factorised once
+• graph optimisation (constant folding, dead-node pruning, CSE) applied
+  before execution, see graph_optimize.py
+• plans cached in a size-bounded LRU keyed by a canonical scenario hash
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .copula import Copula, build_copula
+from .expression_eval import CompiledExpression, compile_expression
+from .graph_optimize import optimize_graph
+from .graph_utils import topological_levels
+
+PLAN_CACHE_SIZE = 128
+
+
+@dataclass(frozen=True)
+class EdgeGroup:
+    """
+    One target's edges in priority order, pre-shaped for matrix application.
+    ``tiers`` are maximal runs of one impact type: absolute impacts inside a
+    run commute and are summed, percentage impacts compound (product); runs
+    are applied in priority order.
+    """
+    ids: Tuple[str, ...]
+    stream_key: str                                    # prefix of the target's edge streams
+    fire_keys: Tuple[str, ...]
+    impact_keys: Tuple[str, ...]
+    distributions: Tuple[Dict[str, Any], ...]
+    probability: np.ndarray                            # (k, 1) firing probabilities
+    tiers: Tuple[Tuple[str, int, int], ...]            # (impact_type, start, stop)
+
+    def apply(self, v: np.ndarray, impact: np.ndarray) -> np.ndarray:
+        """
+        Apply a (k, n) impact matrix to ``v``.  Lanes where an edge did not
+        fire must hold 0 (not ``impact * fired``, which is NaN for inf impacts).
+        """
+        for kind, lo, hi in self.tiers:
+            if kind == "absolute":
+                v = v + impact[lo:hi].sum(axis=0)
+            else:  # percentage
+                v = v * np.prod(1.0 + impact[lo:hi] / 100.0, axis=0)
+        return v
+
+
+def _edge_group(edges: Tuple[Dict[str, Any], ...]) -> EdgeGroup:
+    tiers: List[Tuple[str, int, int]] = []
+    for i, e in enumerate(edges):
+        kind = "absolute" if e["impact_type"] == "absolute" else "percentage"
+        if tiers and tiers[-1][0] == kind:
+            tiers[-1] = (kind, tiers[-1][1], i + 1)
+        else:
+            tiers.append((kind, i, i + 1))
+    keys = [edge_stream_keys(e) for e in edges]
+    return EdgeGroup(
+        ids=tuple(e["id"] for e in edges),
+        stream_key=f"edges:{edges[0]['target']}",
+        fire_keys=tuple(k[0] for k in keys),
+        impact_keys=tuple(k[1] for k in keys),
+        distributions=tuple(e["distribution"] for e in edges),
+        probability=np.array([[e["probability"]] for e in edges], dtype=float),
+        tiers=tuple(tiers),
+    )
+
+
+@dataclass(frozen=True)
+class CompiledPlan:
+    """Everything the engines need that depends only on the scenario."""
+    key: str
+    nodes: Dict[str, Dict[str, Any]]
+    parameters: Tuple[str, ...]
+    edges: Tuple[Dict[str, Any], ...]                  # flat, priority order
+    edges_by_target: Dict[str, Tuple[Dict[str, Any], ...]]
+    edge_groups: Dict[str, EdgeGroup]                  # same targets, matrix-ready
+    order: Tuple[str, ...]                             # expression eval order
+    levels: Tuple[Tuple[str, ...], ...]                # independent groups
+    formulas: Dict[str, CompiledExpression]
+    result_ids: Tuple[str, ...]
+    internal: frozenset                                # optimizer-made nodes (no NaN check)
+    stream_keys: Tuple[str, ...]                       # random streams of the unoptimised graph
+    optimization: Dict[str, Any]                       # optimizer report ({} when disabled)
+    copula: Copula | None = None                       # correlated parameters, unoptimised ids
+
+
+def scenario_hash(scenario: Dict[str, Any]) -> str:
+    """sha256 of the scenario serialised with sorted keys and no whitespace."""
+    return hashlib.sha256(_canonical_json(scenario).encode("utf-8")).hexdigest()
+
+
+def _canonical_json(scenario: Dict[str, Any]) -> str:
+    return json.dumps(scenario, sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False)
+
+
+def build_plan(scenario: Dict[str, Any], key: str | None = None,
+               optimize: bool = True) -> CompiledPlan:
+    """Compile a scenario into a CompiledPlan (no caching)."""
+    nodes = {n["id"]: n for n in scenario["nodes"]}
+    edges = tuple(sorted(_with_edge_ids(scenario["edges"]), key=lambda e: e.get("priority", 0)))
+    # Sobol' dimensions follow the full graph, so optimised plans draw the same numbers
+    stream_keys = tuple(["param:" + nid for nid, n in nodes.items() if n["type"] == "parameter"]
+                        + [k for e in edges for k in edge_stream_keys(e)])
+    copula = build_copula(scenario)  # validated / factorised once per plan
+    internal: frozenset = frozenset()
+    report: Dict[str, Any] = {}
+    if optimize:
+        topological_levels(nodes)  # report cycles against the graph as written
+        opt = optimize_graph(nodes, edges)
+        nodes, edges, internal, report = opt.nodes, tuple(opt.edges), opt.internal, opt.report
+
+    by_target: Dict[str, List[Dict[str, Any]]] = {}
+    for e in edges:
+        by_target.setdefault(e["target"], []).append(e)
+
+    levels = tuple(tuple(level) for level in topological_levels(nodes))
+    order = tuple(nid for level in levels for nid in level)
+    return CompiledPlan(
+        key=key or scenario_hash(scenario),
+        nodes=nodes,
+        parameters=tuple(nid for nid, n in nodes.items() if n["type"] == "parameter"),
+        edges=edges,
+        edges_by_target={t: tuple(es) for t, es in by_target.items()},
+        edge_groups={t: _edge_group(tuple(es)) for t, es in by_target.items()},
+        order=order,
+        levels=levels,
+        formulas={nid: compile_expression(nodes[nid]["formula"]) for nid in order},
+        result_ids=tuple(nid for nid, n in nodes.items() if n.get("is_result")),
+        internal=internal,
+        stream_keys=stream_keys,
+        optimization=report,
+        copula=copula,
+    )
+
+
+def _with_edge_ids(edges: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Give id-less (legacy) edges a unique id, ``<target>#<position>``, so
+    they never share a random stream / Sobol' dimension with each other.
+    """
+    return [e if "id" in e else {**e, "id": f"{e['target']}#{i}"} for i, e in enumerate(edges)]
+
+
+def edge_stream_keys(edge: Dict[str, Any]) -> Tuple[str, str]:
+    """(firing, impact) stream keys of an edge (its Sobol' dimensions)."""
+    return f"edge:{edge['id']}:fire", f"edge:{edge['id']}:impact"
+
+
+# ---------- LRU plan cache ----------
+class PlanCache:
+    """Thread-safe, size-bounded LRU of CompiledPlan keyed by (scenario hash, optimize)."""
+
+    def __init__(self, maxsize: int = PLAN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._plans: "OrderedDict[Tuple[str, bool], CompiledPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, scenario: Dict[str, Any], optimize: bool = True) -> Tuple[CompiledPlan, bool]:
+        """Return (plan, cache_hit)."""
+        canonical = _canonical_json(scenario)
+        key = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        slot = (key, optimize)
+        with self._lock:
+            plan = self._plans.get(slot)
+            if plan is not None:
+                self._plans.move_to_end(slot)
+                self.hits += 1
+                return plan, True
+            self.misses += 1
+
+        # build from the canonical copy so later caller mutations can't leak in
+        plan = build_plan(json.loads(canonical), key=key, optimize=optimize)
+        with self._lock:
+            self._plans[slot] = plan
+            self._plans.move_to_end(slot)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+        return plan, False
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._plans), "maxsize": self.maxsize}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
+            self.hits = self.misses = 0
+
+
+_plan_cache = PlanCache()
+
+
+def get_plan(scenario: Dict[str, Any], optimize: bool = True) -> Tuple[CompiledPlan, bool]:
+    """Fetch (or build and cache) the plan for ``scenario``."""
+    return _plan_cache.get(scenario, optimize)
+
+
+def plan_cache_info() -> Dict[str, int]:
+    return _plan_cache.info()
+
+
+def clear_plan_cache() -> None:
+    _plan_cache.clear()
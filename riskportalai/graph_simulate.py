@@ -2,18 +2,57 @@
 graph_simulate.py – Day-4
 • samples parameter nodes
 • applies risk edges in priority order
-• evaluates expression / result nodes with SafeEvaluator
-• discards iterations that raise math errors (NaN)
-• returns P5, P50, P95, mean + count of discarded iterations
+• evaluates expression / result nodes with compiled SafeEvaluator formulas
+• reuses cached execution plans (see graph_plan.py), optimised by
+  constant folding, dead-node pruning and CSE (see graph_optimize.py)
+• discards iterations where any node is non-finite (per-lane masks, so a
+  domain error drops only its own iterations)
+• returns P5, P50, P95, mean + count of discarded iterations, broken down
+  per node and reason in metadata["discard_reasons"]
+• mode="vectorized" (default) runs whole-batch array maths;
+  mode="scalar" keeps the per-iteration loop as a reference
+• optional sharding: SeedSequence.spawn children per shard, per-node
+  streams inside each shard, merged deterministically in shard order
+• optional chunked mode: fixed-size blocks feed mergeable streaming
+  estimators (see streaming_stats.py) so memory stays flat
+• samples returned as full list, histogram, reservoir, npy or binary
+• adaptive mode stops once P5/P50/P95/mean CIs reach a target precision
+• sampling strategies: pseudo-random, Latin hypercube, scrambled Sobol'
+• optional Gaussian-copula correlations between parameters (see copula.py)
+• metadata["timings"]: seconds per stage (plan, sampling, edges,
+  expressions, stats), summed over shards / blocks
+• optional single-run sensitivity (tornado) ranking per result node
+• incremental re-runs: keep a run, then recompute only the downstream
+  cone of an edited scenario (see incremental.py)
+• optional archiving of a run's raw samples (see run_store.py)
 """
 
 from __future__ import annotations
-from typing import Dict, Any
+import math
+import secrets
+import time
+from concurrent.futures import Executor
+from typing import TYPE_CHECKING, Dict, Any, List, Sequence, Tuple
 
 import numpy as np
-from .expression_eval import SafeEvaluator, ExpressionEvaluationError
-from .graph_utils import topological_sort  # helper added below
-from .graph_utils import RESULT_KEYS
+from .convergence import streaming_halfwidths
+from .distributions import (SAMPLING_STRATEGIES, BlockSampler, ppf_distribution, ppf_rows,
+                            sample_distribution)  # re-exported for callers / tests
+from .expression_eval import (ExpressionEvaluationError, lane_errors,
+                              lane_reason_counts, nonfinite_codes)
+from .graph_plan import CompiledPlan, get_plan
+from .metrics import merge_timings, timed
+from .incremental import (RUN_CACHE_BYTES, CarryMemo, RunSnapshot, get_run, new_run_id,
+                          reusable_nodes, store_run)
+from .sensitivity import driver_sensitivity
+from .sample_encoding import (SAMPLE_ENCODINGS, DEFAULT_SAMPLE_BINS,
+                              DEFAULT_RESERVOIR_SIZE, encode_samples)
+from .streaming_stats import (DEFAULT_HIST_BINS, DEFAULT_RELATIVE_ACCURACY,
+                              QuantileSketch, RunningMoments, StreamingSummary,
+                              histogram_range)
+
+if TYPE_CHECKING:
+    from .run_store import RunStore
 
 # ---------- RNG helper (unchanged) ----------
 _rng: np.random.Generator | None = None
@@ -23,62 +62,410 @@ def _get_rng(seed: int | None) -> np.random.Generator:
         _rng = np.random.default_rng(seed)
     return _rng
 
-# --- Distribution sampling --------------------------------
-def sample_distribution(dist: Dict[str, Any],
-                        size: int,
-                        rng: np.random.Generator) -> np.ndarray:
-    dtype = float
-    d_type = dist["type"].lower()
-    p = dist["parameters"]
-
-    if d_type == "constant":
-        return np.full(size, p["value"], dtype=dtype)
-    if d_type == "normal":
-        return rng.normal(p["mean"], p["stddev"], size=size)
-    if d_type == "uniform":
-        return rng.uniform(p["lower"], p["upper"], size=size)
-    if d_type == "triangular":
-        return rng.triangular(p["min"], p["mode"], p["max"], size=size)
-    if d_type == "discrete":
-        vals = np.array(p["values"])
-        idx = rng.integers(0, len(vals), size=size)
-        return vals[idx].astype(dtype)
-    if d_type == "lognormal":
-        return rng.lognormal(p["mean"], p["sigma"], size=size)
-    if d_type == "bernoulli":
-        return (rng.random(size) < p["p"]).astype(dtype)
-    raise ValueError(f"Unsupported distribution: {d_type}")
+
+PILOT_ITERATIONS = 2048
+ADAPTIVE_BLOCK_SIZE = 2000
+ADAPTIVE_MIN_ACCURACY = 1e-4  # finest quantile sketch used by the stopping rule
+_PILOT_KEY = 0x70696C6F  # spawn-key slot reserved for histogram pilots
+
+# ---------- sharding ----------
+def shard_plan(iterations: int,
+               seed: int | None,
+               shards: int = 1) -> List[Tuple[int, np.random.SeedSequence]]:
+    """
+    Split ``iterations`` into ``shards`` near-equal blocks, each paired with a
+    ``SeedSequence.spawn`` child of the run seed.  Merging shard outputs in
+    this order is bit-identical for a given (seed, shards) no matter where or
+    when each shard ran.
+    """
+    if shards < 1:
+        raise ValueError("shards must be >= 1")
+    shards = min(shards, iterations)
+    base, extra = divmod(iterations, shards)
+    children = np.random.SeedSequence(seed).spawn(shards)
+    return [(base + (i < extra), children[i]) for i in range(shards)]
+
+
+def run_shard(scenario: Dict[str, Any],
+              iterations: int,
+              seq: np.random.SeedSequence,
+              chunk_size: int | None = None,
+              hist_ranges: Dict[str, Tuple[float, float]] | None = None,
+              hist_bins: int = DEFAULT_HIST_BINS,
+              sampling: str = "random") -> Dict[str, Any]:
+    """
+    Execute one shard; picklable entry point for executors / worker pools.
+    With ``chunk_size`` the shard streams fixed-size blocks into mergeable
+    estimators instead of keeping every sample.
+    """
+    timings: Dict[str, float] = {}
+    plan, plan_cached = _timed_plan(scenario, timings)
+    part: Dict[str, Any] = {"plan_cached": plan_cached, "optimizer": plan.optimization,
+                            "timings": timings}
+    if chunk_size is None:
+        part["samples"], part["discarded"], part["discard_reasons"] = _run_vectorized(
+            plan, iterations, seq, sampling, timings)
+    else:
+        part["summaries"], part["discarded"], part["discard_reasons"] = _run_chunked(
+            plan, iterations, seq, chunk_size, hist_ranges or {}, hist_bins, sampling, timings)
+    part["sampling"] = sampling
+    return part
+
+
+def pilot_ranges(scenario: Dict[str, Any],
+                 seq: np.random.SeedSequence,
+                 iterations: int = PILOT_ITERATIONS,
+                 sampling: str = "random") -> Dict[str, Tuple[float, float]]:
+    """
+    Histogram bin ranges for every result node from a small pilot run on a
+    stream derived from ``seq``; shared by all shards so histograms merge.
+    """
+    plan, _ = get_plan(scenario)
+    pilot = np.random.SeedSequence(seq.entropy, spawn_key=seq.spawn_key + (_PILOT_KEY,))
+    samples, _, _ = _run_vectorized(plan, iterations, pilot, sampling)
+    return {nid: histogram_range(arr) for nid, arr in samples.items()}
+
+
+def merge_shards(parts: Sequence[Dict[str, Any]],
+                 seed: int | None = None,
+                 **sample_opts: Any) -> Dict[str, Any]:
+    """Merge shard outputs (in shard order) and compute the statistics."""
+    discarded = sum(p["discarded"] for p in parts)
+    metadata = {
+        "seed": seed,
+        "mode": "vectorized",
+        "sampling": parts[0].get("sampling", "random"),
+        "shards": len(parts),
+        "plan_cached": all(p["plan_cached"] for p in parts),
+        "optimizer": parts[0].get("optimizer", {}),
+        "discard_reasons": merge_discard_reasons(*(p.get("discard_reasons", {}) for p in parts)),
+        "timings": merge_timings(*(p.get("timings", {}) for p in parts)),
+    }
+
+    if "summaries" in parts[0]:
+        summaries = parts[0]["summaries"]
+        for p in parts[1:]:
+            for nid, summ in p["summaries"].items():
+                summaries[nid].merge(summ)
+        kept = next(iter(summaries.values())).moments.n if summaries else 0
+        metadata.update(iterations=discarded + kept,
+                        chunked=True,
+                        quantile_relative_accuracy=DEFAULT_RELATIVE_ACCURACY)
+        with timed(metadata["timings"], "stats"):
+            results = {nid: summ.to_dict() for nid, summ in summaries.items()}
+        return {
+            "results": results,
+            "metadata": {**metadata, "discarded": discarded}
+        }
+
+    samples = {nid: np.concatenate([p["samples"][nid] for p in parts])
+               for nid in parts[0]["samples"]}
+    metadata["iterations"] = discarded + (len(next(iter(samples.values()))) if samples else 0)
+    return _summarise(samples, discarded, metadata, **sample_opts)
 
 
 # ---------- core driver ----------
+SIMULATION_MODES = ("vectorized", "scalar")
+
+
 def simulate_graph(scenario: Dict[str, Any],
                    iterations: int = 10000,
-                   seed: int | None = None) -> Dict[str, Any]:
-    rng = _get_rng(seed)
+                   seed: int | None = None,
+                   mode: str = "vectorized",
+                   shards: int = 1,
+                   executor: Executor | None = None,
+                   chunk_size: int | None = None,
+                   hist_bins: int = DEFAULT_HIST_BINS,
+                   sample_encoding: str = "full",
+                   sample_bins: int = DEFAULT_SAMPLE_BINS,
+                   reservoir_size: int = DEFAULT_RESERVOIR_SIZE,
+                   precision: float | None = None,
+                   max_iterations: int | None = None,
+                   max_seconds: float | None = None,
+                   block_size: int = ADAPTIVE_BLOCK_SIZE,
+                   sampling: str = "random",
+                   sensitivity: bool = False,
+                   sensitivity_top: int | None = None,
+                   keep_run: bool = False,
+                   previous_run: str | None = None,
+                   run_id: str | None = None,
+                   run_store: RunStore | None = None) -> Dict[str, Any]:
+    """
+    Run the Monte-Carlo graph.
 
-    nodes = {n["id"]: n for n in scenario["nodes"]}
-    edges = sorted(scenario["edges"],
-                   key=lambda e: e.get("priority", 0))
+    mode="vectorized" samples every parameter / edge as a full
+    ``iterations``-length array and evaluates each formula once over whole
+    arrays.  mode="scalar" is the original per-iteration loop, kept as the
+    reference implementation for regression tests.
 
-    # Build evaluation order for expressions/results
-    expr_order = topological_sort(nodes)
+    shards > 1 splits the vectorized run into independently seeded blocks;
+    pass a ``concurrent.futures`` executor to run them on separate cores.
 
-    # Pre-allocate samples dict
-    samples = {nid: np.empty(iterations) for nid in nodes if nodes[nid].get("is_result")}
+    chunk_size processes iterations in fixed-size blocks and reports
+    streaming estimates (sketch quantiles, moments, fixed-bin histogram)
+    instead of raw samples, so peak memory no longer grows with iterations.
 
-    discarded = 0
+    sample_encoding picks how ``samples`` is returned (see sample_encoding.py).
+
+    precision turns on adaptive mode: blocks of ``block_size`` iterations run
+    until the relative 95 % CI half-width of mean/P5/P50/P95 of every result
+    node is <= precision, or ``max_iterations`` (default: ``iterations``) or
+    ``max_seconds`` is reached.
+
+    sampling selects pseudo-random ("random"), Latin hypercube ("lhs") or
+    scrambled Sobol' ("sobol") draws for parameters and edge firing/impacts.
+
+    sensitivity=True keeps every parameter's draws and every edge's firing
+    mask / impact from the (single, unchunked) run and adds a top-level
+    "sensitivity" block ranking drivers per result node (see sensitivity.py),
+    cut to ``sensitivity_top`` drivers each when given.  Results are identical
+    to the same run without sensitivity.
+
+    keep_run=True stores the run's arrays in an in-process LRU and returns
+    its handle as metadata["run_id"].  previous_run=<run_id> diffs the
+    scenario against that run and recomputes only the nodes downstream of
+    what changed; results equal a clean run with the same seed (seed=None
+    inherits the previous run's seed).  Falls back to a full run when the
+    handle has expired or iterations / seed / sampling differ.  run_id names
+    the kept run (default: a fresh id), so a caller can route later re-runs
+    to the process holding it.  Runs whose arrays could exceed the run
+    cache's byte budget are refused.
+
+    run_store=<RunStore> archives the run (scenario, seed, summary and every
+    parameter / result sample array) and returns its id as
+    metadata["stored_run"]; a missing seed is drawn so the record is
+    reproducible.  Needs the same single vectorized run as keep_run.
+    """
+    if mode not in SIMULATION_MODES:
+        raise ValueError(f"Unknown simulation mode: {mode}")
+    if sampling not in SAMPLING_STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy: {sampling}")
+    if sample_encoding not in SAMPLE_ENCODINGS:
+        raise ValueError(f"Unknown sample encoding: {sample_encoding}")
+    sample_opts = {"sample_encoding": sample_encoding, "sample_bins": sample_bins,
+                   "reservoir_size": reservoir_size}
+
+    single = sensitivity or keep_run or previous_run is not None or run_store is not None
+    if single and (mode != "vectorized" or shards != 1 or chunk_size is not None
+                   or precision is not None):
+        raise ValueError("Sensitivity / incremental / stored runs need a single vectorized run "
+                         "(no shards / chunk_size / precision)")
+    if sensitivity and previous_run is not None:
+        raise ValueError("Sensitivity analysis cannot reuse a previous run")
+
+    if mode == "scalar":
+        if shards != 1 or chunk_size is not None or sampling != "random":
+            raise ValueError("Sharding / chunking / sampling strategies require mode='vectorized'")
+        rng = _get_rng(seed)
+        # Evaluation order, grouped edges and compiled formulas come from the
+        # plan cache, so re-running the same scenario skips all of that work.
+        # The reference loop shares one stream across nodes, so it runs the
+        # graph as written (pruning a node would shift every later draw).
+        timings: Dict[str, float] = {}
+        plan, plan_cached = _timed_plan(scenario, timings, optimize=False)
+        samples, discarded, reasons = _run_scalar(plan, iterations, rng, timings)
+        return _summarise(samples, discarded, {
+            "iterations": iterations,
+            "seed": seed,
+            "mode": mode,
+            "plan_cached": plan_cached,
+            "discard_reasons": reasons,
+            "timings": timings,
+        }, **sample_opts)
+
+    if precision is not None:
+        if shards != 1 or chunk_size is not None:
+            raise ValueError("Adaptive mode cannot be combined with shards / chunk_size")
+        timings: Dict[str, float] = {}
+        plan, plan_cached = _timed_plan(scenario, timings)
+        seq = shard_plan(1, seed, 1)[0][1]
+        samples, discarded, reasons, report = _run_adaptive(
+            plan, seq, precision, max_iterations or iterations, max_seconds, block_size, sampling,
+            timings)
+        return _summarise(samples, discarded, {
+            "iterations": report["iterations_used"],
+            "seed": seed,
+            "mode": mode,
+            "sampling": sampling,
+            "shards": 1,
+            "plan_cached": plan_cached,
+            "optimizer": plan.optimization,
+            "discard_reasons": reasons,
+            "timings": timings,
+            "adaptive": report,
+        }, **sample_opts)
+
+    if single:
+        return _run_single(scenario, iterations, seed, sampling, sample_opts,
+                           sensitivity=sensitivity, sensitivity_top=sensitivity_top,
+                           keep_run=keep_run, previous_run=previous_run,
+                           run_id=run_id, run_store=run_store)
+
+    jobs = shard_plan(iterations, seed, shards)
+    extra: Dict[str, Any] = {}
+    if chunk_size is not None:
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+        extra = {"chunk_size": chunk_size, "hist_bins": hist_bins,
+                 "hist_ranges": pilot_ranges(scenario, jobs[0][1], sampling=sampling)}
+    extra["sampling"] = sampling
+    if executor is None:
+        parts = [run_shard(scenario, n, seq, **extra) for n, seq in jobs]
+    else:
+        futures = [executor.submit(run_shard, scenario, n, seq, **extra) for n, seq in jobs]
+        parts = [f.result() for f in futures]
+    result = merge_shards(parts, seed=seed, **sample_opts)
+    if chunk_size is not None:
+        result["metadata"]["chunk_size"] = chunk_size
+    return result
+
+
+def _run_single(scenario: Dict[str, Any],
+                iterations: int,
+                seed: int | None,
+                sampling: str,
+                sample_opts: Dict[str, Any],
+                sensitivity: bool = False,
+                sensitivity_top: int | None = None,
+                keep_run: bool = False,
+                previous_run: str | None = None,
+                run_id: str | None = None,
+                run_store: RunStore | None = None) -> Dict[str, Any]:
+    """One in-process engine step, for sensitivity, incremental and stored runs."""
+    timings: Dict[str, float] = {}
+    # An archived run keeps every parameter the scenario declares, so it runs
+    # the graph as written: folding / pruning would drop some of them (the
+    # optimiser leaves every other value and stream unchanged).
+    plan, plan_cached = _timed_plan(scenario, timings, optimize=run_store is None)
+    if keep_run:
+        # node values + one carried draw per stream, float64 each
+        needed = iterations * 8 * (len(plan.nodes) + len(plan.stream_keys))
+        if needed > RUN_CACHE_BYTES:
+            raise ValueError(f"keep_run needs ~{needed / 2**20:.0f} MiB, over the run cache's "
+                             f"{RUN_CACHE_BYTES / 2**20:.0f} MiB; lower iterations")
+    prev = get_run(previous_run) if previous_run is not None else None
+    if prev is not None and (prev.iterations != iterations or prev.sampling != sampling
+                             or (seed is not None and seed != prev.seed)):
+        prev = None
+    if prev is not None:
+        seed, seq = prev.seed, prev.seq
+    else:
+        if seed is None and run_store is not None:
+            seed = secrets.randbits(63)  # an archived run must be reproducible
+        seq = shard_plan(iterations, seed, 1)[0][1]
+
+    memo = None
+    if keep_run or prev is not None:
+        memo = CarryMemo(prev.memo if prev is not None else None)
+    engine = VectorEngine(plan, seq, sampling, memo=memo, retain=sensitivity, timings=timings)
+    reuse: Dict[str, np.ndarray] = {}
+    if prev is not None:
+        reuse = {nid: prev.values[nid] for nid in reusable_nodes(prev, plan, engine.keys)}
+    values, valid = engine.step(iterations, reuse)
+
+    metadata: Dict[str, Any] = {
+        "iterations": iterations,
+        "seed": seed,
+        "mode": "vectorized",
+        "sampling": sampling,
+        "shards": 1,
+        "plan_cached": plan_cached,
+        "optimizer": plan.optimization,
+        "discard_reasons": engine.discards,
+        "timings": timings,
+    }
+    if previous_run is not None:
+        metadata["incremental"] = {
+            "previous_run": previous_run,
+            "reused": prev is not None,
+            "reused_nodes": len(reuse),
+            "recomputed_nodes": len(plan.nodes) - len(reuse),
+        }
+    if keep_run:
+        metadata["run_id"] = run_id or new_run_id()
+        store_run(RunSnapshot(metadata["run_id"], plan, seq, seed, iterations, sampling,
+                              engine.keys, values, memo))
+
+    samples = {nid: values[nid][valid] for nid in plan.result_ids}
+    result = _summarise(samples, int(iterations - valid.sum()), metadata, **sample_opts)
+    if run_store is not None:
+        started = time.perf_counter()
+        result["metadata"]["stored_run"] = run_store.save(
+            scenario, result, {nid: values[nid][valid] for nid in plan.parameters}, samples)
+        result["metadata"]["timings"]["store"] = time.perf_counter() - started
+    if sensitivity:
+        result["sensitivity"] = driver_sensitivity(engine.retained, values, valid,
+                                                   plan.result_ids, sensitivity_top)
+    return result
+
+
+def _timed_plan(scenario: Dict[str, Any], timings: Dict[str, float],
+                optimize: bool = True) -> Tuple[CompiledPlan, bool]:
+    with timed(timings, "plan"):
+        return get_plan(scenario, optimize)
+
+
+def _summarise(samples: Dict[str, np.ndarray],
+               discarded: int,
+               metadata: Dict[str, Any],
+               sample_encoding: str = "full",
+               sample_bins: int = DEFAULT_SAMPLE_BINS,
+               reservoir_size: int = DEFAULT_RESERVOIR_SIZE) -> Dict[str, Any]:
+    started = time.perf_counter()
+    # reservoir picks are seeded from the run seed so responses are repeatable
+    rng = np.random.default_rng(metadata.get("seed")) if sample_encoding == "reservoir" else None
+    results = {}
+    for nid, valid in samples.items():
+        p5, p50, p95 = np.percentile(valid, [5, 50, 95])
+        results[nid] = {
+            "p5": float(p5),
+            "p50": float(p50),
+            "p95": float(p95),
+            "mean": float(valid.mean()),
+            "samples": encode_samples(valid, sample_encoding, sample_bins, reservoir_size, rng)
+        }
+    if "timings" in metadata:
+        metadata = {**metadata, "timings": merge_timings(
+            metadata["timings"], {"stats": time.perf_counter() - started})}
+    return {
+        "results": results,
+        "metadata": {**metadata, "discarded": discarded,
+                     "sample_encoding": sample_encoding}
+    }
+
+
+# ---------- scalar reference engine ----------
+def _run_scalar(plan: CompiledPlan,
+                iterations: int,
+                rng: np.random.Generator,
+                timings: Dict[str, float] | None = None
+                ) -> Tuple[Dict[str, np.ndarray], int, Dict[str, Dict[str, int]]]:
+    nodes = plan.nodes
+    # Pre-allocate samples dict; kept iterations are packed at the front
+    samples = {nid: np.empty(iterations) for nid in plan.result_ids}
+    reasons: Dict[str, Dict[str, int]] = {}
+    kept = 0
+    clock = time.perf_counter
+    spent = [0.0, 0.0, 0.0]  # sampling, edges, expressions
 
     # ------------ Monte-Carlo loop ------------
     for idx in range(iterations):
         values: Dict[str, Any] = {}
+        t0 = clock()
+
+        # 1. sample parameter nodes (correlated ones through the copula)
+        if plan.copula is not None:
+            u = plan.copula.correlate(rng.random((len(plan.copula.ids), 1)))[:, 0]
+            for i, nid in enumerate(plan.copula.ids):
+                values[nid] = ppf_distribution(nodes[nid]["distribution"], u[i])[()]
+        for nid in plan.parameters:
+            if nid not in values:
+                values[nid] = sample_distribution(nodes[nid]["distribution"], 1, rng)[0]
 
-        # 1. sample parameter nodes
-        for n in nodes.values():
-            if n["type"] == "parameter":
-                values[n["id"]] = sample_distribution(n["distribution"], 1, rng)[0]
+        t1 = clock()
 
         # 2. apply risk edges in priority order
-        for e in edges:
+        for e in plan.edges:
             if rng.random() > e["probability"]:
                 continue  # edge did not fire
             target = e["target"]
@@ -88,42 +475,302 @@ def simulate_graph(scenario: Dict[str, Any],
             else:  # percentage
                 values[target] += values[target] * (impact / 100.0)
 
-        # 3. evaluate expression / result nodes
-        success = True
-        try:
-            for nid in expr_order:
-                n = nodes[nid]
-                evaluator = SafeEvaluator(values)
-                values[nid] = evaluator.evaluate(n["formula"])
-        except ExpressionEvaluationError:
-            success = False
-
-        if not success or any(np.isnan(v).any() for v in values.values()):
-            discarded += 1
+        t2 = clock()
+
+        # 3. evaluate expression / result nodes; the first non-finite node
+        #    discards the iteration and is blamed for it
+        failed = next((nid for nid in plan.parameters if not np.isfinite(values[nid])), None)
+        why: Dict[str, int] = {}
+        if failed is not None:
+            why = lane_reason_counts(nonfinite_codes(values[failed]))
+        else:
+            with np.errstate(all="ignore"):
+                for nid in plan.order:
+                    try:
+                        values[nid] = plan.formulas[nid](values)
+                    except ExpressionEvaluationError:
+                        failed, why = nid, {"error": 1}
+                        break
+                    if not np.all(np.isfinite(values[nid])):
+                        failed = nid
+                        codes = lane_errors(nodes[nid]["formula"], values)
+                        why = lane_reason_counts(np.where(codes == 0, nonfinite_codes(values[nid]), codes))
+                        break
+
+        t3 = clock()
+        spent[0] += t1 - t0
+        spent[1] += t2 - t1
+        spent[2] += t3 - t2
+
+        if failed is not None:
+            reasons = merge_discard_reasons(reasons, {failed: why})
             continue
 
         # 4. store result samples
         for res_id in samples:
-            samples[res_id][idx] = values[res_id]
+            samples[res_id][kept] = values[res_id]
+        kept += 1
 
-    effective_n = iterations - discarded
+    if timings is not None:
+        timings.update(merge_timings(timings, dict(zip(("sampling", "edges", "expressions"), spent))))
+    return {nid: arr[:kept] for nid, arr in samples.items()}, iterations - kept, reasons
 
-    results = {}
-    for nid, arr in samples.items():
-        valid = arr[:effective_n]  # ignore unfilled / discarded tail
-        results[nid] = {
-            "p5": float(np.percentile(valid, 5)),
-            "p50": float(np.percentile(valid, 50)),
-            "p95": float(np.percentile(valid, 95)),
-            "mean": float(valid.mean()),
-            "samples": valid.tolist()
-        }
 
-    return {
-        "results": results,
-        "metadata": {
-            "iterations": iterations,
-            "discarded": discarded,
-            "seed": seed
-        }
+# ---------- vectorized engine ----------
+class VectorEngine:
+    """
+    Whole-array executor for one plan.  Every parameter, edge firing and
+    edge impact owns a persistent stream (or Sobol' dimension), so running
+    ``step`` in blocks draws exactly the same numbers as one big step under
+    the "random" strategy.
+
+    retain=True keeps the last step's raw inputs in ``self.retained`` (each
+    parameter's own draws before edges, each edge's firing mask and impact)
+    for sensitivity analysis.
+    """
+
+    def __init__(self, plan: CompiledPlan, seq: np.random.SeedSequence,
+                 sampling: str = "random", memo: Dict[Any, np.ndarray] | None = None,
+                 retain: bool = False,
+                 timings: Dict[str, float] | None = None):
+        self.plan = plan
+        self.retain = retain
+        self.retained: Dict[str, Dict[str, Any]] | None = None
+        self.keys = plan.stream_keys
+        self.sampler = BlockSampler(sampling, seq, self.keys, memo)
+        self.discards: Dict[str, Dict[str, int]] = {}  # node -> reason -> lanes, all steps
+        self.timings = timings if timings is not None else {}  # stage -> seconds, all steps
+
+    def step(self, n: int,
+             reuse: Dict[str, np.ndarray] | None = None) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Simulate ``n`` iterations; returns (node values, valid-lane mask).
+        Nodes in ``reuse`` take the given arrays instead of being sampled /
+        evaluated (incremental re-runs, see incremental.py).
+        """
+        reuse = reuse or {}
+        with timed(self.timings, "sampling"):
+            values = self._sample(n, reuse)
+        with timed(self.timings, "edges"):
+            self._apply_edges(values, reuse)
+        with timed(self.timings, "expressions"):
+            valid = self._evaluate(n, values, reuse)
+        return values, valid
+
+    def _sample(self, n: int, reuse: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        plan, nodes, sampler = self.plan, self.plan.nodes, self.sampler
+        sampler.start_block(n)
+        values: Dict[str, np.ndarray] = {}
+
+        # 1. sample every parameter node as a full array; correlated ones
+        #    come from one copula block (see copula.py)
+        correlated = self._correlated(reuse)
+        for nid in plan.parameters:
+            if nid in reuse:
+                values[nid] = reuse[nid]
+            elif nid in correlated:
+                values[nid] = correlated[nid]
+            else:
+                values[nid] = sampler.sample("param:" + nid, nodes[nid]["distribution"])
+        if self.retain:
+            self.retained = {"parameters": dict(values), "edges": {}}
+        return values
+
+    def _apply_edges(self, values: Dict[str, np.ndarray], reuse: Dict[str, np.ndarray]) -> None:
+        plan, sampler = self.plan, self.sampler
+
+        # 2. apply risk edges target by target: firing masks and impacts for
+        #    all of a target's edges come as (k, n) blocks from the target's
+        #    streams (impacts are zero where an edge did not fire) and are
+        #    combined tier by tier in priority order (edges only touch
+        #    parameters, so targets are independent)
+        for target, group in plan.edge_groups.items():
+            if target in reuse:
+                continue  # reused value already includes its edges
+            fired, impact = sampler.edge_rows(group.stream_key, group.fire_keys,
+                                              group.impact_keys, group.distributions,
+                                              group.probability)
+            if self.retain:
+                for i, eid in enumerate(group.ids):
+                    self.retained["edges"][eid] = {"target": target, "fired": fired[i],
+                                                   "impact": impact[i]}
+            values[target] = group.apply(values[target], impact)
+
+    def _evaluate(self, n: int, values: Dict[str, np.ndarray],
+                  reuse: Dict[str, np.ndarray]) -> np.ndarray:
+        plan = self.plan
+        # 3. evaluate each expression / result node once over whole arrays;
+        #    domain errors only invalidate their own lanes (see step 4)
+        valid = np.ones(n, dtype=bool)
+        for nid in plan.parameters:
+            self._screen(nid, values, valid)
+        with np.errstate(all="ignore"):
+            for i, nid in enumerate(plan.order):
+                if nid in reuse:
+                    values[nid] = reuse[nid]
+                else:
+                    try:
+                        out = np.asarray(plan.formulas[nid](values), dtype=float)
+                    except ExpressionEvaluationError:
+                        # structural failure (e.g. unknown name): no lane can be computed
+                        self._count(nid, {"error": int(valid.sum())})
+                        valid[:] = False
+                        for rest in plan.order[i:]:
+                            values[rest] = np.full(n, np.nan)
+                        break
+                    values[nid] = np.broadcast_to(out, (n,))
+                # 4. an iteration is discarded where any node is non-finite
+                if nid not in plan.internal:  # hoisted sub-formulas may be masked by where()
+                    self._screen(nid, values, valid)
+        return valid
+
+    def _correlated(self, reuse: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Draws of the copula's parameters that this step has to compute."""
+        copula, nodes = self.plan.copula, self.plan.nodes
+        if copula is None:
+            return {}
+        # members the optimizer removed still take part, so the others' draws don't move
+        rows = [i for i, nid in enumerate(copula.ids) if nid in nodes and nid not in reuse]
+        if not rows:
+            return {}
+        u = copula.correlate(self.sampler.uniform_rows(["param:" + nid for nid in copula.ids]))
+        out = ppf_rows([nodes[copula.ids[i]]["distribution"] for i in rows], u[rows])
+        return {copula.ids[i]: out[j] for j, i in enumerate(rows)}
+
+    def _screen(self, nid: str, values: Dict[str, np.ndarray], valid: np.ndarray) -> None:
+        """Drop lanes where ``nid`` is non-finite; blame newly failed lanes on it."""
+        finite = np.isfinite(values[nid])
+        failed = valid & ~finite
+        if not failed.any():
+            return
+        node = self.plan.nodes[nid]
+        if node["type"] == "parameter":
+            codes = nonfinite_codes(values[nid][failed])
+        else:
+            inline = {i: self.plan.nodes[i]["formula"] for i in self.plan.internal}
+            codes = lane_errors(node["formula"], _Lanes(values, failed), inline)
+            codes = np.where(codes == 0, nonfinite_codes(values[nid][failed]), codes)
+        self._count(nid, lane_reason_counts(codes))
+        valid &= finite
+
+    def _count(self, nid: str, reasons: Dict[str, int]) -> None:
+        self.discards = merge_discard_reasons(self.discards, {nid: reasons})
+
+
+class _Lanes:
+    """Read-only view of node arrays restricted to a lane mask (indexed lazily)."""
+
+    def __init__(self, values: Dict[str, np.ndarray], lanes: np.ndarray):
+        self._values, self._lanes = values, lanes
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self._values[key][self._lanes]
+
+
+def merge_discard_reasons(*parts: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+    """Sum per-node discard-reason counts."""
+    out: Dict[str, Dict[str, int]] = {}
+    for part in parts:
+        for nid, reasons in part.items():
+            node = out.setdefault(nid, {})
+            for reason, c in reasons.items():
+                node[reason] = node.get(reason, 0) + c
+    return out
+
+
+def _run_vectorized(plan: CompiledPlan,
+                    iterations: int,
+                    seq: np.random.SeedSequence,
+                    sampling: str = "random",
+                    timings: Dict[str, float] | None = None
+                    ) -> Tuple[Dict[str, np.ndarray], int, Dict[str, Dict[str, int]]]:
+    engine = VectorEngine(plan, seq, sampling, timings=timings)
+    values, valid = engine.step(iterations)
+    discarded = int(iterations - valid.sum())
+    samples = {nid: values[nid][valid] if valid.any() else np.empty(0)
+               for nid in plan.result_ids}
+    return samples, discarded, engine.discards
+
+
+def _run_chunked(plan: CompiledPlan,
+                 iterations: int,
+                 seq: np.random.SeedSequence,
+                 chunk_size: int,
+                 hist_ranges: Dict[str, Tuple[float, float]],
+                 hist_bins: int,
+                 sampling: str = "random",
+                 timings: Dict[str, float] | None = None
+                 ) -> Tuple[Dict[str, StreamingSummary], int, Dict[str, Dict[str, int]]]:
+    engine = VectorEngine(plan, seq, sampling, timings=timings)
+    summaries = {nid: StreamingSummary(hist_ranges.get(nid, (0.0, 1.0)), hist_bins)
+                 for nid in plan.result_ids}
+    discarded = 0
+    for start in range(0, iterations, chunk_size):
+        n = min(chunk_size, iterations - start)
+        values, valid = engine.step(n)
+        discarded += int(n - valid.sum())
+        if valid.any():
+            with timed(engine.timings, "stats"):
+                for nid, summ in summaries.items():
+                    summ.update(values[nid][valid])
+    return summaries, discarded, engine.discards
+
+
+def _run_adaptive(plan: CompiledPlan,
+                  seq: np.random.SeedSequence,
+                  precision: float,
+                  max_iterations: int,
+                  max_seconds: float | None,
+                  block_size: int,
+                  sampling: str = "random",
+                  timings: Dict[str, float] | None = None
+                  ) -> Tuple[Dict[str, np.ndarray], int, Dict[str, Dict[str, int]], Dict[str, Any]]:
+    if precision <= 0:
+        raise ValueError("precision must be > 0")
+    if block_size < 1:
+        raise ValueError("block_size must be >= 1")
+    engine = VectorEngine(plan, seq, sampling, timings=timings)
+    blocks: Dict[str, List[np.ndarray]] = {nid: [] for nid in plan.result_ids}
+    # the stopping rule reads streaming estimators, so each check costs one
+    # block, not the whole run; the sketch is finer than the target (floor
+    # 1e-4 keeps it small) and its error is counted in the widths
+    accuracy = min(DEFAULT_RELATIVE_ACCURACY, max(precision / 4, ADAPTIVE_MIN_ACCURACY))
+    moments = {nid: RunningMoments() for nid in plan.result_ids}
+    sketches = {nid: QuantileSketch(accuracy) for nid in plan.result_ids}
+    discarded = used = 0
+    started = time.perf_counter()
+    widths: Dict[str, Dict[str, float]] = {}
+    achieved = math.inf
+    stopped_by = "max_iterations"
+
+    while used < max_iterations:
+        n = min(block_size, max_iterations - used)
+        values, valid = engine.step(n)
+        used += n
+        discarded += int(n - valid.sum())
+        with timed(engine.timings, "stats"):
+            for nid in blocks:
+                kept = values[nid][valid]
+                blocks[nid].append(kept)
+                moments[nid].update(kept)
+                sketches[nid].update(kept)
+            widths = {nid: streaming_halfwidths(moments[nid], sketches[nid]) for nid in blocks}
+        achieved = max((w for ws in widths.values() for w in ws.values()), default=0.0)
+        if achieved <= precision:
+            stopped_by = "precision"
+            break
+        if max_seconds is not None and time.perf_counter() - started >= max_seconds:
+            stopped_by = "time"
+            break
+
+    samples = {nid: np.concatenate(parts) if parts else np.empty(0)
+               for nid, parts in blocks.items()}
+    finite = lambda x: x if math.isfinite(x) else None  # JSON has no inf
+    report = {
+        "target_precision": precision,
+        "achieved_precision": finite(achieved),
+        "iterations_used": used,
+        "stopped_by": stopped_by,
+        "per_node": {nid: {k: finite(v) for k, v in ws.items()} for nid, ws in widths.items()},
     }
+    return samples, discarded, engine.discards, report
@@ -1,33 +1,65 @@
 """
 graph_utils.py
-• topological sort for expression nodes
+• dependency extraction from formula identifiers (AST based)
+• Kahn-style topological sort for expression nodes, with dependency levels
 """
 
 from typing import Dict, List, Set
 
+from .expression_eval import referenced_names
+
 RESULT_KEYS = ("p5", "p50", "p95", "mean")
 
 def topological_sort(nodes: Dict[str, dict]) -> List[str]:
     """Return evaluation order for expression/result nodes."""
-    expr_nodes = [n for n in nodes.values() if n["type"] in ("expression", "result")]
-    deps: Dict[str, Set[str]] = {n["id"]: _find_deps(n["formula"], nodes) for n in expr_nodes}
-    order, temp = [], set()
-
-    def visit(nid: str):
-        if nid in order:
-            return
-        if nid in temp:
-            raise ValueError("Cycle detected in expressions")
-        temp.add(nid)
+    return [nid for level in topological_levels(nodes) for nid in level]
+
+def topological_levels(nodes: Dict[str, dict]) -> List[List[str]]:
+    """
+    Group expression/result nodes into dependency levels: every node in a
+    level depends only on parameters and nodes in earlier levels, so nodes
+    within one level can be evaluated independently.  O(V + E).
+    """
+    expr_ids = [nid for nid, n in nodes.items() if n["type"] in ("expression", "result")]
+    deps: Dict[str, Set[str]] = {nid: _find_deps(nodes[nid]["formula"], nodes) for nid in expr_ids}
+
+    indegree = {nid: 0 for nid in expr_ids}
+    dependents: Dict[str, List[str]] = {nid: [] for nid in expr_ids}
+    for nid in expr_ids:
         for d in deps[nid]:
-            if d in deps:  # only visit other expression nodes
-                visit(d)
-        temp.remove(nid)
-        order.append(nid)
+            if d in indegree:  # only other expression nodes impose ordering
+                indegree[nid] += 1
+                dependents[d].append(nid)
 
-    for n in expr_nodes:
-        visit(n["id"])
-    return order
+    levels: List[List[str]] = []
+    current = [nid for nid in expr_ids if indegree[nid] == 0]
+    placed = 0
+    while current:
+        levels.append(current)
+        placed += len(current)
+        nxt = []
+        for nid in current:
+            for child in dependents[nid]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    nxt.append(child)
+        current = nxt
+
+    if placed != len(expr_ids):
+        stuck = [nid for nid in expr_ids if indegree[nid] > 0]
+        raise ValueError("Cycle detected in expressions: " + _describe_cycle(stuck, deps))
+    return levels
 
 def _find_deps(formula: str, nodes: Dict[str, dict]) -> Set[str]:
-    return {nid for nid in nodes if nid in formula}
+    return {name for name in referenced_names(formula) if name in nodes}
+
+def _describe_cycle(stuck: List[str], deps: Dict[str, Set[str]]) -> str:
+    """Walk dependencies among the unresolved nodes until one repeats."""
+    remaining = set(stuck)
+    path, seen = [stuck[0]], {stuck[0]: 0}
+    while True:
+        nxt = min(d for d in deps[path[-1]] if d in remaining)
+        if nxt in seen:
+            return " -> ".join(path[seen[nxt]:] + [nxt])
+        seen[nxt] = len(path)
+        path.append(nxt)
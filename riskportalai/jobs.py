@@ -0,0 +1,330 @@
+"""
+jobs.py
+Asynchronous simulation jobs: a priority scheduler in front of the worker
+pool, with cooperative cancellation and persisted results.
+• a job runs as a pilot (histogram ranges) plus blocks of ``block_size``
+  iterations, each block one streaming run_shard in the pool; the merged
+  result equals /graph_simulate with shards=<blocks> and chunk_size set,
+  so it is reproducible from the recorded seed
+• scheduling is per block: after every block the job re-enters the queue,
+  so an "interactive" job overtakes "normal" / "bulk" ones at the next
+  block boundary; ``slots`` blocks run at once, leaving the rest of the
+  pool to synchronous requests
+• cancel = a flag checked between blocks; the stats of finished blocks
+  are kept as the cancelled job's partial result
+• batch comparisons run the same way: each block runs every variant on
+  the block's shared streams (batch_block), so progress, cancellation
+  and partial results work per block as well
+• every job is written to ``<dir>/<id>.json`` on submit and when it ends
+  (request incl. scenario, seed, timestamps, result); finished jobs are
+  served from disk, never re-simulated
+RISKPORTAL_JOB_DIR, RISKPORTAL_JOB_SLOTS and RISKPORTAL_JOB_BLOCK tune it.
+"""
+
+from __future__ import annotations
+import copy
+import heapq
+import json
+import logging
+import math
+import os
+import secrets
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .batch import batch_block, batch_pilot_ranges, check_batch, merge_batch_blocks
+from .graph_simulate import merge_shards, pilot_ranges, run_shard, shard_plan
+from .metrics import observe_simulation
+from .worker_pool import PoolSaturated, SimulationPool, get_simulation_pool
+
+log = logging.getLogger(__name__)
+
+PRIORITIES = {"interactive": 0, "normal": 1, "bulk": 2}
+FINAL_STATES = ("done", "failed", "cancelled")
+DEFAULT_JOB_DIR = "data/jobs"
+DEFAULT_SLOTS = 2
+DEFAULT_BLOCK_SIZE = 50_000
+_SATURATED_WAIT = 0.5  # seconds before retrying a block the pool turned away
+
+
+class Job:
+    """In-memory state of an active job (finished jobs live in the store)."""
+
+    def __init__(self, request: Dict[str, Any], priority: str, block_size: int):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.priority = priority
+        self.kind = "batch" if "scenarios" in request else "simulation"
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.cancel_requested = False
+        self.running = False           # a step is executing in the pool right now
+        self.error: str | None = None
+        self.result: Dict[str, Any] | None = None
+        self.parts: List[Dict[str, Any]] = []
+        self.hist_ranges: Dict[str, Any] | None = None
+        iterations = request["iterations"]
+        self.blocks: List[Tuple[int, Any]] = shard_plan(
+            iterations, request["seed"], max(1, math.ceil(iterations / block_size)))
+        self.lock = threading.Lock()
+
+    def progress(self) -> Dict[str, Any]:
+        done = sum(n for n, _ in self.blocks[:len(self.parts)])
+        total = self.request["iterations"]
+        return {"iterations_done": done, "iterations": total,
+                "blocks_done": len(self.parts), "blocks": len(self.blocks),
+                "fraction": done / total}
+
+    def partial(self) -> Dict[str, Any] | None:
+        """Stats over the blocks finished so far (the summaries are merged on copies)."""
+        with self.lock:
+            parts = copy.deepcopy(self.parts)
+        return self.merge(parts) if parts else None
+
+    def merge(self, parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        req = self.request
+        if self.kind == "batch":
+            result = merge_batch_blocks(parts, seed=req["seed"], baseline=req.get("baseline"))
+        else:
+            result = merge_shards(parts, seed=req["seed"])
+        result["metadata"]["chunk_size"] = max(n for n, _ in self.blocks)
+        return result
+
+    def record(self) -> Dict[str, Any]:
+        """The persisted / reported form of the job."""
+        out = {"id": self.id, "kind": self.kind, "state": self.state, "priority": self.priority,
+               "created_at": self.created_at, "started_at": self.started_at,
+               "finished_at": self.finished_at, "seed": self.request["seed"],
+               "progress": self.progress(), "request": self.request}
+        if self.error is not None:
+            out["error"] = self.error
+        if self.result is not None:
+            out["result"] = self.result
+        return out
+
+
+class JobStore:
+    """One JSON file per job, written atomically."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id + ".json")
+
+    def save(self, record: Dict[str, Any]) -> None:
+        tmp = self._path(record["id"]) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(record, fh)
+        os.replace(tmp, self._path(record["id"]))  # readers never see a half-written file
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+            return None  # ids are uuid4 hex; anything else is not a path we wrote
+        try:
+            with open(self._path(job_id), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+
+class JobScheduler:
+    """
+    ``slots`` threads pull the highest-priority ready job, run one step of
+    it in the pool (blocking) and requeue it.  Ties keep submission order.
+    """
+
+    def __init__(self,
+                 store: JobStore,
+                 pool: Callable[[], SimulationPool] = get_simulation_pool,
+                 slots: int = DEFAULT_SLOTS,
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+        self.store = store
+        self._pool = pool
+        self.slots = slots
+        self.block_size = block_size
+        self._jobs: Dict[str, Job] = {}
+        self._ready: List[Tuple[int, int, str]] = []   # (priority rank, ticket, job id)
+        self._ticket = 0
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+
+    # ---------- API ----------
+    def submit(self, request: Dict[str, Any], priority: str = "normal") -> Dict[str, Any]:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        request = dict(request)
+        if "scenarios" in request:
+            check_batch(request["scenarios"], request.get("baseline"), request["sampling"])
+        if request.get("seed") is None:
+            request["seed"] = secrets.randbits(63)  # recorded, so every job is reproducible
+        job = Job(request, priority, self.block_size)
+        self.store.save(job.record())
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Job scheduler is shut down")
+            self._jobs[job.id] = job
+            self._push(job)
+            self._start()
+        return job.record()
+
+    def get(self, job_id: str, partial: bool = True) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+        if job is None:
+            record = self.store.load(job_id)
+            if record is not None and record["state"] not in FINAL_STATES:
+                record["state"] = "interrupted"  # the process that ran it has gone
+            return record
+        record = job.record()
+        if partial and job.state != "queued":
+            record["partial"] = job.partial()
+        return record
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Request cancellation; queued jobs stop at once, running ones after their block."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return self.store.load(job_id)
+            job.cancel_requested = True
+            if not job.running:
+                self._finish(job, "cancelled")
+        return self.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            states = [j.state for j in self._jobs.values()]
+        return {s: states.count(s) for s in ("queued", "running")}
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+
+    # ---------- scheduling ----------
+    def _push(self, job: Job) -> None:
+        self._ticket += 1
+        heapq.heappush(self._ready, (PRIORITIES[job.priority], self._ticket, job.id))
+        self._cond.notify()
+
+    def _start(self) -> None:
+        while len(self._threads) < self.slots:
+            t = threading.Thread(target=self._loop, name=f"job-slot-{len(self._threads)}",
+                                 daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                _, _, job_id = heapq.heappop(self._ready)
+                job = self._jobs.get(job_id)
+                if job is None or job.state in FINAL_STATES:
+                    continue  # cancelled while queued
+                job.running = True
+                if job.state == "queued":
+                    job.state, job.started_at = "running", time.time()
+            try:
+                finished = self._step(job)
+            except PoolSaturated:
+                time.sleep(_SATURATED_WAIT)
+                finished = False
+            except Exception as exc:
+                log.warning("job %s failed: %s", job.id, exc, extra={"job_id": job.id})
+                with self._cond:
+                    job.running = False
+                    job.error = str(exc)
+                    self._finish(job, "failed")
+                continue
+            with self._cond:
+                job.running = False
+                if finished:
+                    self._finish(job, "done")
+                elif job.cancel_requested:
+                    self._finish(job, "cancelled")
+                else:
+                    self._push(job)
+
+    def _step(self, job: Job) -> bool:
+        """Run the job's next step in the pool; True when the job is complete."""
+        req, pool = job.request, self._pool()
+        batch = job.kind == "batch"
+        if job.hist_ranges is None:
+            if batch:
+                job.hist_ranges = pool.run(batch_pilot_ranges, req["scenarios"],
+                                           job.blocks[0][1], req["sampling"])
+            else:
+                job.hist_ranges = pool.run(pilot_ranges, req["scenario"], job.blocks[0][1],
+                                           sampling=req["sampling"])
+            return False
+        n, seq = job.blocks[len(job.parts)]
+        if batch:
+            part = pool.run(batch_block, req["scenarios"], n, seq, req.get("baseline"),
+                            req["sampling"], job.hist_ranges)
+        else:
+            part = pool.run(run_shard, req["scenario"], n, seq, chunk_size=n,
+                            hist_ranges=job.hist_ranges, sampling=req["sampling"])
+        with job.lock:
+            job.parts.append(part)
+        if len(job.parts) < len(job.blocks):
+            return False
+        with job.lock:
+            result = job.merge(job.parts)
+        for scenario_result in (result["scenarios"].values() if batch else [result]):
+            observe_simulation(scenario_result)
+        job.result = result
+        return True
+
+    def _finish(self, job: Job, state: str) -> None:
+        """Persist and forget a job (caller holds ``_cond``)."""
+        if state == "cancelled" and job.parts:
+            job.result = job.partial()
+        job.state, job.finished_at = state, time.time()
+        self.store.save(job.record())
+        self._jobs.pop(job.id, None)
+
+
+# ---------- process-wide scheduler ----------
+_scheduler: JobScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def scheduler_from_env() -> JobScheduler:
+    return JobScheduler(JobStore(os.getenv("RISKPORTAL_JOB_DIR", DEFAULT_JOB_DIR)),
+                        slots=int(os.getenv("RISKPORTAL_JOB_SLOTS", DEFAULT_SLOTS)),
+                        block_size=int(os.getenv("RISKPORTAL_JOB_BLOCK", DEFAULT_BLOCK_SIZE)))
+
+
+def get_job_scheduler() -> JobScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = scheduler_from_env()
+        return _scheduler
+
+
+def current_job_scheduler() -> JobScheduler | None:
+    """The shared scheduler if one exists (for probes)."""
+    with _scheduler_lock:
+        return _scheduler
+
+
+def shutdown_job_scheduler() -> None:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.shutdown()
+            _scheduler = None
@@ -0,0 +1,47 @@
+"""
+logging_config.py
+Level-gated logging for the API process.
+• RISKPORTAL_LOG_LEVEL: DEBUG / INFO / WARNING / ... (default INFO)
+• RISKPORTAL_LOG_FORMAT=json: one JSON object per line, including any
+  ``extra={...}`` fields passed to the logging call; otherwise plain text
+Only the ``riskportalai`` logger tree is configured, so uvicorn's own
+handlers are left alone.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import sys
+
+_LOGGER = "riskportalai"
+_TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# attributes every LogRecord has; anything else came from ``extra=``
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": self.formatTime(record), "level": record.levelname,
+                 "logger": record.name, "message": record.getMessage()}
+        entry.update({k: v for k, v in vars(record).items() if k not in _RESERVED})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str | None = None, fmt: str | None = None) -> logging.Logger:
+    """(Re)configure the package logger from arguments or the environment."""
+    level = (level or os.getenv("RISKPORTAL_LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("RISKPORTAL_LOG_FORMAT", "text")).lower()
+    logger = logging.getLogger(_LOGGER)
+    logger.setLevel(level)
+    for handler in list(logger.handlers):
+        if getattr(handler, "_riskportal", False):
+            logger.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(_TEXT_FORMAT))
+    handler._riskportal = True
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger
@@ -3,81 +3,82 @@ riskportalai.main
 Single-process FastAPI server:
 • Serves the frontend (index.html, styles.css) from /frontend
 • /health  – health check
-• /graph_simulate – run Monte-Carlo
+• /graph_simulate – run Monte-Carlo in the pre-warmed worker pool
+• /graph_simulate/batch – compare variants with common random numbers
 • /chat   – forwards to Claude Sonnet-4 (tool-calling) or stub if key missing
+• /chat/stream – same, as server-sent events (text deltas, then the reply)
+• /chat/cache – response-cache and prompt-cache hit rates
+• /jobs – asynchronous simulation / batch jobs: priorities, progress,
+  cooperative cancel, results persisted to disk
+• /runs – archived runs (/graph_simulate?store=true): slices, filters,
+  quantiles and CSV export from memory-mapped sample arrays
+• /metrics – Prometheus text format: stage latencies, discards, cache
+  hits, worker-pool queue depth
+Logging goes through the ``riskportalai`` logger (see logging_config.py).
 """
 
 from __future__ import annotations
-import os, pathlib, dotenv
+import asyncio, logging, os, pathlib, dotenv
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-
-from .graph_simulate import simulate_graph
-from .anthropic_client import call_claude
+from pydantic import BaseModel, Field
+
+from .graph_simulate import (simulate_graph, shard_plan, run_shard, merge_shards,
+                             pilot_ranges)
+from .graph_plan import scenario_hash
+from .incremental import new_run_id
+from .validation import get_validator, validate_scenario
+from .jobs import (PRIORITIES, current_job_scheduler, get_job_scheduler,
+                   shutdown_job_scheduler)
+from .run_store import FILTER_OPS, get_run_store
+from .batch import simulate_batch
+from .sample_encoding import (SAMPLE_ENCODINGS, DEFAULT_SAMPLE_BINS,
+                              DEFAULT_RESERVOIR_SIZE, pack_binary)
+from .anthropic_client import (call_claude, stream_claude, start_claude_client,
+                               close_claude_client)
+from .chat_stream import MessageAssembler, sse_event
+from .response_cache import get_response_cache, prompt_cache_stats
+from .worker_pool import (PoolError, PoolSaturated, SimulationTimeout,
+                          current_simulation_pool, get_simulation_pool,
+                          shutdown_simulation_pool)
+from .metrics import (observe_chat, observe_simulation, register_gauge, render as
+                      render_metrics, timed)
+from .logging_config import configure_logging
 
 # ───────────────────────────────────────────────────────────────
 # Load .env (ANTHROPIC_API_KEY) at startup
 # ───────────────────────────────────────────────────────────────
 dotenv.load_dotenv()
+configure_logging()
+log = logging.getLogger(__name__)
 
 # ───────────────────────────────────────────────────────────────
 # FastAPI app
 # ───────────────────────────────────────────────────────────────
-app = FastAPI(title="RiskPortal-AI", version="0.0.1")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # spawn + warm simulation workers before the first request arrives
+    get_simulation_pool().start()
+    get_validator()  # compile schema.graph.json once, before the first request
+    # one pooled keep-alive connection set to Anthropic for the app's lifetime
+    await start_claude_client()
+    yield
+    await close_claude_client()
+    shutdown_job_scheduler()
+    shutdown_simulation_pool()
+
+app = FastAPI(title="RiskPortal-AI", version="0.0.1", lifespan=lifespan)
 
 # ───────────────────────────────────────────────────────────────
 # Enhanced validation function
 # ───────────────────────────────────────────────────────────────
 def validate_scenario_enhanced(scenario: Dict[str, Any]) -> tuple[bool, List[str]]:
-    """Enhanced validation with specific edge targeting checks."""
-    errors = []
-
-    # Extract node info
-    nodes = {n["id"]: n for n in scenario.get("nodes", [])}
-    parameter_ids = {nid for nid, node in nodes.items() if node.get("type") == "parameter"}
-    expression_ids = {nid for nid, node in nodes.items() if node.get("type") in ("expression", "result")}
-
-    # Validate edges target parameters only
-    for edge in scenario.get("edges", []):
-        target = edge.get("target")
-        if not target:
-            errors.append("Edge missing 'target' field")
-            continue
-
-        if target not in nodes:
-            errors.append(f"Edge targets non-existent node '{target}'")
-            continue
-
-        # CRITICAL CHECK: Edge must target parameter only
-        if target in expression_ids:
-            node_type = nodes[target].get("type", "unknown")
-            errors.append(
-                f"Edge '{edge.get('id', 'unnamed')}' targets {node_type} node '{target}'. "
-                f"Edges can only target parameter nodes. "
-                f"Consider creating a base parameter and targeting that instead."
-            )
-            continue
-
-        if target not in parameter_ids:
-            errors.append(f"Edge targets '{target}' which is not a parameter node")
-
-    # Validate distributions have proper parameters wrapper
-    for node in scenario.get("nodes", []):
-        if node.get("type") == "parameter":
-            dist = node.get("distribution", {})
-            if "parameters" not in dist:
-                errors.append(f"Parameter '{node['id']}' distribution missing 'parameters' field")
-
-    # Validate edge distributions
-    for edge in scenario.get("edges", []):
-        dist = edge.get("distribution", {})
-        if "parameters" not in dist:
-            errors.append(f"Edge '{edge.get('id', 'unnamed')}' distribution missing 'parameters' field")
-
-    return len(errors) == 0, errors
+    """Schema + semantic validation (see validation.py), memoised by scenario hash."""
+    return validate_scenario(scenario)
 
 # ───────────────────  /health  ─────────────────────────────────
 @app.get("/health")
@@ -86,14 +87,291 @@ async def health() -> Dict[str, str]:
 
 # ───────────────────  /graph_simulate  ─────────────────────────
 @app.post("/graph_simulate")
-async def graph_simulate_endpoint(payload: Dict[str, Any]):
+async def graph_simulate_endpoint(payload: Dict[str, Any],
+                                  iterations: int = Query(10000, ge=1, le=1_000_000),
+                                  seed: int | None = Query(None, ge=0),
+                                  shards: int = Query(1, ge=1, le=64),
+                                  chunk_size: int | None = Query(None, ge=1),
+                                  samples: str = Query("full", pattern="^(" + "|".join(SAMPLE_ENCODINGS) + ")$"),
+                                  bins: int = Query(DEFAULT_SAMPLE_BINS, ge=1, le=10_000),
+                                  reservoir: int = Query(DEFAULT_RESERVOIR_SIZE, ge=1, le=1_000_000),
+                                  precision: float | None = Query(None, gt=0, lt=1),
+                                  max_iterations: int | None = Query(None, ge=1, le=1_000_000),
+                                  max_seconds: float | None = Query(None, gt=0),
+                                  sampling: str = Query("random", pattern="^(random|lhs|sobol)$"),
+                                  sensitivity: bool = Query(False),
+                                  sensitivity_top: int | None = Query(None, ge=1),
+                                  keep_run: bool = Query(False),
+                                  previous_run: str | None = Query(None, max_length=64),
+                                  store: bool = Query(False)):
     """
     Accepts graph JSON and returns Monte-Carlo statistics.
+    The simulation runs in worker processes so the event loop stays free;
+    shards > 1 spreads the iterations across several workers and
+    chunk_size switches to bounded-memory streaming statistics.
+    samples=none|histogram|reservoir|npy|binary shrinks the payload; binary
+    answers with an application/octet-stream body: a length-prefixed JSON
+    summary, then float32 samples (see sample_encoding.pack_binary).
+    precision=r runs adaptively until every result's CIs are within r
+    (bounded by max_iterations / max_seconds).
+    sampling=lhs|sobol switches to Latin hypercube / scrambled Sobol' draws.
+    sensitivity=true adds per-result driver rankings (tornado data) from the
+    same run; sensitivity_top keeps only the strongest N drivers.
+    keep_run=true returns metadata.run_id; previous_run=<run_id> re-simulates
+    only what the edit changed.  Snapshots live in the worker that made them,
+    so these runs are routed to it by affinity (a busy or recycled worker
+    means a full, equally exact re-run).
+    store=true archives the run's scenario, seed, stats and raw samples in
+    the run store and returns metadata.stored_run (see /runs).
+    """
+    try:
+        key = scenario_hash(payload)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    _require_valid(payload, key)
+    pool = get_simulation_pool()
+    sample_opts = {"sample_encoding": samples, "sample_bins": bins, "reservoir_size": reservoir}
+    if precision is not None:
+        sample_opts.update(precision=precision, max_iterations=max_iterations,
+                           max_seconds=max_seconds)
+    if sensitivity:
+        if shards != 1:
+            raise HTTPException(status_code=400,
+                                detail="sensitivity cannot be combined with shards > 1")
+        sample_opts.update(sensitivity=True, sensitivity_top=sensitivity_top)
+    affinity: Any = key
+    if keep_run or previous_run is not None:
+        sample_opts.update(keep_run=keep_run, previous_run=previous_run)
+        if keep_run:
+            sample_opts["run_id"] = new_run_id()
+        # prefer the worker holding the previous snapshot; remember the new one there too
+        affinity = tuple(k for k in (previous_run, key, sample_opts.get("run_id")) if k)
+    if store:
+        if shards != 1:
+            raise HTTPException(status_code=400, detail="store cannot be combined with shards > 1")
+        sample_opts.update(run_store=get_run_store())
+    try:
+        result = await _run_simulation(pool, payload, affinity, iterations, seed,
+                                       shards, chunk_size, sampling, sample_opts)
+    except PoolError as exc:
+        raise _pool_http_error(exc)
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    observe_simulation(result)
+
+    if samples == "binary":
+        body, headers = pack_binary(result)
+        return Response(content=body, media_type="application/octet-stream", headers=headers)
+    # already plain JSON types – skip FastAPI's recursive jsonable_encoder
+    return JSONResponse(content=result)
+
+
+async def _run_simulation(pool, payload, key, iterations, seed,
+                          shards, chunk_size, sampling, sample_opts) -> Dict[str, Any]:
+    """Dispatch one run (single job or sharded) to the worker pool."""
+    if shards == 1 or "keep_run" in sample_opts:  # incremental runs reject shards themselves
+        return await pool.submit(simulate_graph, payload, iterations, seed,
+                                 shards=shards, chunk_size=chunk_size, sampling=sampling,
+                                 affinity=key, **sample_opts)
+    jobs = shard_plan(iterations, seed, shards)
+    extra: Dict[str, Any] = {"sampling": sampling}
+    if chunk_size is not None:
+        extra.update(chunk_size=chunk_size,
+                     hist_ranges=await pool.submit(pilot_ranges, payload, jobs[0][1],
+                                                   sampling=sampling, affinity=key))
+    # admitted as one unit over at most pool.workers lanes, so any shard
+    # count fits, and a failing shard stops its siblings
+    parts = await pool.submit_many(run_shard, [((payload, n, seq), extra) for n, seq in jobs],
+                                   affinity=key)
+    result = merge_shards(parts, seed=seed, **sample_opts)
+    if chunk_size is not None:
+        result["metadata"]["chunk_size"] = chunk_size
+    return result
+
+def _require_valid(scenario: Dict[str, Any], key: str | None = None, name: str | None = None) -> None:
+    """400 before any compute is spent on a graph that cannot run."""
+    valid, errors = validate_scenario(scenario, key)
+    if not valid:
+        where = f" '{name}'" if name is not None else ""
+        raise HTTPException(status_code=400, detail={"message": f"Invalid scenario{where}",
+                                                     "errors": errors})
+
+def _pool_http_error(exc: PoolError) -> HTTPException:
+    status = 429 if isinstance(exc, PoolSaturated) else \
+             504 if isinstance(exc, SimulationTimeout) else 503
+    return HTTPException(status_code=status, detail=str(exc),
+                         headers={"Retry-After": str(exc.retry_after)})
+
+# ───────────────────  /graph_simulate/batch  ───────────────────
+class BatchScenario(BaseModel):
+    name: str
+    scenario: Dict[str, Any]
+
+class BatchPayload(BaseModel):
+    scenarios: List[BatchScenario] = Field(min_length=1, max_length=50)
+    baseline: str | None = None          # defaults to the first scenario
+    iterations: int = Field(10000, ge=1, le=1_000_000)
+    seed: int | None = Field(None, ge=0)
+    sampling: str = Field("random", pattern="^(random|lhs|sobol)$")
+    samples: str = Field("none", pattern="^(full|none|histogram|reservoir|npy)$")
+
+@app.post("/graph_simulate/batch")
+async def graph_simulate_batch_endpoint(payload: BatchPayload):
+    """
+    Runs several variants of a graph with common random numbers and
+    returns per-scenario stats plus paired differences vs the baseline.
     """
+    for s in payload.scenarios:
+        _require_valid(s.scenario, name=s.name)
     try:
-        return simulate_graph(payload)  # Use function default iterations
+        result = await get_simulation_pool().submit(
+            simulate_batch, [s.model_dump() for s in payload.scenarios],
+            payload.iterations, payload.seed, payload.baseline, payload.sampling,
+            sample_encoding=payload.samples)
+    except PoolError as exc:
+        raise _pool_http_error(exc)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc))
+    for scenario_result in result["scenarios"].values():
+        observe_simulation(scenario_result)
+    return JSONResponse(content=result)
+
+# ───────────────────  /jobs  ───────────────────────────────────
+class JobPayload(BaseModel):
+    scenario: Dict[str, Any] | None = None                              # one simulation ...
+    scenarios: List[BatchScenario] | None = Field(None, min_length=1, max_length=50)  # ... or a batch
+    baseline: str | None = None
+    iterations: int = Field(100_000, ge=1, le=10_000_000)
+    seed: int | None = Field(None, ge=0)
+    sampling: str = Field("random", pattern="^(random|lhs|sobol)$")
+    priority: str = Field("normal", pattern="^(" + "|".join(PRIORITIES) + ")$")
+
+@app.post("/jobs", status_code=202)
+async def create_job(payload: JobPayload) -> Dict[str, Any]:
+    """
+    Queues a long simulation (``scenario``) or batch comparison
+    (``scenarios``) and returns its id at once.  ``priority`` is
+    interactive | normal | bulk; interactive jobs overtake the others at
+    the next block boundary.  A missing seed is drawn and recorded.
+    """
+    if (payload.scenario is None) == (payload.scenarios is None):
+        raise HTTPException(status_code=400, detail="Give exactly one of 'scenario' or 'scenarios'")
+    if payload.scenario is not None:
+        _require_valid(payload.scenario)
+        request = {"scenario": payload.scenario}
+    else:
+        for s in payload.scenarios:
+            _require_valid(s.scenario, name=s.name)
+        request = {"scenarios": [s.model_dump() for s in payload.scenarios],
+                   "baseline": payload.baseline}
+    request.update(iterations=payload.iterations, seed=payload.seed, sampling=payload.sampling)
+    try:
+        job = await asyncio.to_thread(get_job_scheduler().submit, request, payload.priority)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {k: job[k] for k in ("id", "kind", "state", "priority", "seed", "progress")}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """State, progress and partial stats of a running job; the stored record once it ended."""
+    job = await asyncio.to_thread(get_job_scheduler().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return JSONResponse(content=job)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancels a queued job at once and a running one after its current block."""
+    scheduler = get_job_scheduler()
+    job = await asyncio.to_thread(scheduler.get, job_id, False)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    if job["state"] in ("done", "failed", "cancelled", "interrupted"):
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' has already ended ({job['state']})")
+    job = await asyncio.to_thread(scheduler.cancel, job_id)
+    return JSONResponse(content=job)
+
+# ───────────────────  /runs  ───────────────────────────────────
+_FILTER_OP = "^(" + "|".join(FILTER_OPS) + ")$"
+
+async def _query(fn, *args, **kwargs):
+    """Run a store query in a thread; unknown run / node -> 404, bad arguments -> 400."""
+    try:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=exc.args[0])
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+@app.get("/runs")
+async def list_runs(limit: int = Query(50, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    """Archived runs, newest first."""
+    return JSONResponse(content=await _query(get_run_store().list, limit, offset))
+
+@app.get("/runs/{run_id}")
+async def get_stored_run(run_id: str):
+    """Scenario, seed, timestamp, summary stats and the nodes with stored samples."""
+    record = await _query(get_run_store().get, run_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown run '{run_id}'")
+    return JSONResponse(content=record)
+
+@app.get("/runs/{run_id}/samples")
+async def run_samples(run_id: str,
+                      nodes: List[str] = Query([]),
+                      start: int = Query(0, ge=0),
+                      limit: int = Query(1000, ge=1, le=100_000)):
+    """Rows start .. start+limit of the given nodes (all when none are named)."""
+    return JSONResponse(content=await _query(get_run_store().rows, run_id, nodes,
+                                             start, start + limit))
+
+@app.get("/runs/{run_id}/filter")
+async def run_filter(run_id: str,
+                     node: str,
+                     op: str = Query(..., pattern=_FILTER_OP),
+                     value: str = Query(..., max_length=32),
+                     columns: List[str] = Query([]),
+                     offset: int = Query(0, ge=0),
+                     limit: int = Query(1000, ge=1, le=100_000)):
+    """
+    Iterations where ``node op value`` holds, e.g. node=total_revenue&op=lt&value=p5.
+    value is a number or pNN (that percentile of the node).  Returns the
+    match count plus row indices and ``columns`` (default: node) for the
+    requested page of matches.
+    """
+    return JSONResponse(content=await _query(get_run_store().filter, run_id, node, op, value,
+                                             columns, offset, limit))
+
+@app.get("/runs/{run_id}/quantiles")
+async def run_quantiles(run_id: str,
+                        node: str,
+                        q: List[float] = Query([0.05, 0.5, 0.95]),
+                        where: str | None = None,
+                        op: str | None = Query(None, pattern=_FILTER_OP),
+                        value: str | None = Query(None, max_length=32)):
+    """Recomputed quantiles of ``node``, optionally over the rows where ``where op value``."""
+    cond = None
+    if where is not None:
+        if op is None or value is None:
+            raise HTTPException(status_code=400, detail="where needs op and value")
+        cond = (where, op, value)
+    return JSONResponse(content=await _query(get_run_store().quantiles, run_id, node, q, cond))
+
+@app.get("/runs/{run_id}/csv")
+async def run_csv(run_id: str,
+                  nodes: List[str] = Query([]),
+                  start: int = Query(0, ge=0),
+                  stop: int | None = Query(None, ge=0)):
+    """Streams rows start .. stop (default: all) of the given nodes as CSV."""
+    store = get_run_store()
+    chunks = store.csv(run_id, nodes, start, stop)
+    header = await _query(next, chunks)  # resolves the columns: 404 before streaming starts
+    async def body():
+        yield header
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            yield chunk
+    return StreamingResponse(body(), media_type="text/csv",
+                             headers={"Content-Disposition": f'attachment; filename="{run_id}.csv"'})
 
 # ───────────────────  /chat  ───────────────────────────────────
 class ChatMsg(BaseModel):
@@ -109,89 +387,165 @@ async def chat_endpoint(payload: ChatPayload):
     Forwards message history to Claude Sonnet-4 with tool-calling.
     Falls back to a stub reply if ANTHROPIC_API_KEY is missing.
     """
-    print(f"🟢 CHAT ENDPOINT: Received payload: {payload}")
-    print(f"🟢 CHAT ENDPOINT: History length: {len(payload.history)}")
-    for i, msg in enumerate(payload.history):
-        print(f"🟢 CHAT ENDPOINT: Message {i}: {msg.role} = '{msg.content[:100]}...'")
+    log.debug("chat: %d messages", len(payload.history),
+              extra={"history": [m.model_dump() for m in payload.history]})
 
     if "ANTHROPIC_API_KEY" not in os.environ:
-        # stub response so you can develop without a key
-        last_user = next((m.content for m in reversed(payload.history)
-                          if m.role == "user"), "")
-        print(f"🟡 CHAT ENDPOINT: Using stub mode")
-        return {"type": "text",
-                "content": f"(stub) You said: {last_user}. "
-                           "Add ANTHROPIC_API_KEY to .env for live Claude."}
+        return _stub_reply(payload)
 
+    timings: Dict[str, float] = {}
     try:
-        print(f"🟢 CHAT ENDPOINT: Calling Claude...")
-        claude_json = await call_claude([m.model_dump() for m in payload.history])
-        print(f"🟡 CHAT ENDPOINT: Claude raw response: {claude_json}")
-
-        # Extract tool_use content correctly from Claude's response
-        content_items = claude_json.get("content", [])
-        print(f"🟡 CHAT ENDPOINT: Content items: {content_items}")
-
-        # Look for tool_use in all content items
-        tool_content = None
-        text_content = None
-
-        for item in content_items:
-            if item.get("type") == "tool_use":
-                tool_content = item
-                print(f"🟢 CHAT ENDPOINT: Found tool_use: {tool_content}")
-            elif item.get("type") == "text":
-                text_content = item
-                print(f"🟡 CHAT ENDPOINT: Found text: {text_content}")
-
-        # Handle tool use with enhanced validation
-        if tool_content:
-            print(f"🟢 CHAT ENDPOINT: Tool use detected!")
-            print(f"🟢 CHAT ENDPOINT: Tool name: {tool_content.get('name')}")
-            print(f"🟢 CHAT ENDPOINT: Tool input: {tool_content.get('input')}")
-
-            scenario = tool_content["input"]
-
-            # Enhanced validation with specific error messages
-            try:
-                valid, errors = validate_scenario_enhanced(scenario)
-                if not valid:
-                    # Return detailed error message for Claude to fix
-                    error_msg = "I found issues with the model:\n" + "\n".join(f"- {err}" for err in errors[:3])
-                    error_msg += "\n\nLet me revise this with the correct structure."
-                    print(f"🔴 CHAT ENDPOINT: Validation failed: {error_msg}")
-                    response = {"type": "text", "content": error_msg}
-                    print(f"🟡 CHAT ENDPOINT: Returning validation error for Claude to fix")
-                    return response
-            except Exception as exc:
-                error_msg = f"Model validation failed: {str(exc)}. Let me try a different approach."
-                print(f"🔴 CHAT ENDPOINT: Validation exception: {exc}")
-                return {"type": "text", "content": error_msg}
-
-            # If validation passes, return schema for frontend
-            response = {"type": "json", "content": scenario}
-            print(f"🟢 CHAT ENDPOINT: Validation passed, returning schema for frontend simulation")
-            return response
+        with timed(timings, "claude"):
+            claude_json = await call_claude([m.model_dump() for m in payload.history])
+        log.debug("chat: Claude response", extra={"response": claude_json})
+        reply = _chat_reply(claude_json.get("content", []), timings)
+    except Exception as exc:
+        log.exception("chat: Claude call failed")
+        raise HTTPException(status_code=502, detail=str(exc))
 
-        # If no tool use, return text response
-        if text_content:
-            text_response = text_content.get("text", "")
-            print(f"🟢 CHAT ENDPOINT: Text response: '{text_response}'")
-            response = {"type": "text", "content": text_response}
-            print(f"🟢 CHAT ENDPOINT: Returning text response: {response}")
-            return response
+    with timed(timings, "serialization"):
+        response = JSONResponse(content=reply)
+    observe_chat(timings)
+    return response
 
-        # Fallback if neither found
-        print(f"🔴 CHAT ENDPOINT: No tool_use or text content found")
-        return {"type": "text", "content": "I apologize, but I couldn't process that request properly."}
+@app.post("/chat/stream")
+async def chat_stream_endpoint(payload: ChatPayload):
+    """
+    Server-sent-events variant of /chat: Claude's text is forwarded as
+    ``text`` events while it is generated, tool input is assembled from
+    the partial JSON deltas, and a closing ``final`` event carries exactly
+    what /chat would have returned (validated graph or text).
+    """
+    return StreamingResponse(_chat_events(payload), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
+async def _chat_events(payload: ChatPayload):
+    if "ANTHROPIC_API_KEY" not in os.environ:
+        reply = _stub_reply(payload)
+        yield sse_event("text", {"delta": reply["content"]})
+        yield sse_event("final", reply)
+        return
+    assembler = MessageAssembler()
+    # "claude" spans the whole stream, including time spent flushing events
+    timings: Dict[str, float] = {}
+    try:
+        with timed(timings, "claude"):
+            async for event in stream_claude([m.model_dump() for m in payload.history]):
+                out = assembler.feed(event)
+                if out is not None:
+                    yield sse_event(*out)
+        reply = _chat_reply(assembler.content(), timings)
     except Exception as exc:
-        print(f"🔴 CHAT ENDPOINT: Exception: {exc}")
-        print(f"🔴 CHAT ENDPOINT: Exception type: {type(exc)}")
-        import traceback
-        print(f"🔴 CHAT ENDPOINT: Full traceback:")
-        traceback.print_exc()
-        raise HTTPException(status_code=502, detail=str(exc))
+        # the 200 and earlier events are already sent: report in-band
+        log.exception("chat stream: Claude call failed")
+        yield sse_event("error", {"detail": str(exc)})
+        return
+    with timed(timings, "serialization"):
+        final = sse_event("final", reply)
+    observe_chat(timings)
+    yield final
+
+def _stub_reply(payload: ChatPayload) -> Dict[str, Any]:
+    # stub response so you can develop without a key
+    last_user = next((m.content for m in reversed(payload.history)
+                      if m.role == "user"), "")
+    log.info("chat: no ANTHROPIC_API_KEY, answering with the stub")
+    return {"type": "text",
+            "content": f"(stub) You said: {last_user}. "
+                       "Add ANTHROPIC_API_KEY to .env for live Claude."}
+
+def _chat_reply(content_items: List[Dict[str, Any]],
+                timings: Dict[str, float] | None = None) -> Dict[str, Any]:
+    """Turn Claude's content blocks into the /chat response body."""
+    timings = {} if timings is None else timings
+
+    # Look for tool_use in all content items
+    tool_content = None
+    text_content = None
+
+    for item in content_items:
+        if item.get("type") == "tool_use":
+            tool_content = item
+        elif item.get("type") == "text":
+            text_content = item
+
+    # Handle tool use with enhanced validation
+    if tool_content:
+        log.debug("chat: tool_use %s", tool_content.get("name"),
+                  extra={"tool_input": tool_content.get("input")})
+
+        scenario = tool_content["input"]
+
+        # Enhanced validation with specific error messages
+        try:
+            with timed(timings, "validation"):
+                valid, errors = validate_scenario_enhanced(scenario)
+            if not valid:
+                # Return detailed error message for Claude to fix
+                error_msg = "I found issues with the model:\n" + "\n".join(f"- {err}" for err in errors[:3])
+                error_msg += "\n\nLet me revise this with the correct structure."
+                log.info("chat: generated graph failed validation",
+                         extra={"errors": errors})
+                return {"type": "text", "content": error_msg}
+        except Exception as exc:
+            error_msg = f"Model validation failed: {str(exc)}. Let me try a different approach."
+            log.warning("chat: validation raised %s", exc)
+            return {"type": "text", "content": error_msg}
+
+        # If validation passes, return schema for frontend
+        return {"type": "json", "content": scenario}
+
+    # If no tool use, return text response
+    if text_content:
+        return {"type": "text", "content": text_content.get("text", "")}
+
+    # Fallback if neither found
+    log.warning("chat: response had neither tool_use nor text content")
+    return {"type": "text", "content": "I apologize, but I couldn't process that request properly."}
+
+# ───────────────────  /chat/cache  ─────────────────────────────
+@app.get("/chat/cache")
+async def chat_cache_endpoint() -> Dict[str, Any]:
+    """Hit rates of the response cache (null when disabled) and of provider prompt caching."""
+    cache = get_response_cache()
+    return {"responses": cache.info() if cache is not None else None,
+            "prompt": prompt_cache_stats.info()}
+
+# ───────────────────  /metrics  ────────────────────────────────
+def _pool_depth() -> Dict[Any, float]:
+    pool = current_simulation_pool()  # a scrape must not spawn workers
+    stats = pool.stats() if pool is not None else {}
+    return {(("state", s),): stats.get(s, 0) for s in ("busy", "queued", "in_flight")}
+
+def _response_cache_lookups() -> Dict[Any, float]:
+    cache = get_response_cache()
+    if cache is None:
+        return {}
+    info = cache.info()
+    return {(("result", "hit"),): info["hits"], (("result", "miss"),): info["misses"]}
+
+def _prompt_cache_tokens() -> Dict[Any, float]:
+    info = prompt_cache_stats.info()
+    return {(("kind", k),): info[k + "_tokens"]
+            for k in ("input", "cache_read_input", "cache_creation_input")}
+
+register_gauge("riskportal_pool_jobs", "Simulation jobs by state (queued = queue depth).",
+               _pool_depth)
+def _job_states() -> Dict[Any, float]:
+    scheduler = current_job_scheduler()
+    stats = scheduler.stats() if scheduler is not None else {}
+    return {(("state", s),): stats.get(s, 0) for s in ("queued", "running")}
+
+register_gauge("riskportal_jobs", "Asynchronous jobs by state.", _job_states)
+register_gauge("riskportal_chat_response_cache_lookups",
+               "Chat response-cache lookups since start, by result.", _response_cache_lookups)
+register_gauge("riskportal_prompt_cache_tokens",
+               "Input tokens reported by Anthropic, by prompt-cache use.", _prompt_cache_tokens)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition (format 0.0.4)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 # ───────────────────  STATIC FILES (MOVED TO END)  ─────────────
 # Serve static frontend  (index.html, styles.css)  →  http://localhost:8000/
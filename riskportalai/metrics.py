@@ -0,0 +1,221 @@
+"""
+metrics.py
+Dependency-free Prometheus-style metrics for the API process.
+• Counter / Gauge / Histogram with labels, rendered in the text
+  exposition format (version 0.0.4) by ``render()``
+• gauges may be callbacks, read at scrape time (e.g. pool queue depth)
+• stage timing: ``timed(timings, stage)`` adds wall time to a plain dict,
+  so simulations running in worker processes can return their timings
+  in metadata and the API process observes them (``observe_simulation``)
+"""
+
+from __future__ import annotations
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+# seconds; simulations and Claude round-trips span ~1 ms .. ~1 min
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_labels(labels), 0.0)
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Gauge whose samples come from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str,
+                 read: Callable[[], Dict[Labels, float]]):
+        super().__init__(name, help)
+        self._read = read
+
+    def lines(self) -> List[str]:
+        try:
+            items = sorted(self._read().items())
+        except Exception:  # a failing probe must not break the scrape
+            return []
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[float]] = {}   # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            i = bisect.bisect_left(self.buckets, value)  # first bucket with le >= value
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            s = self._series.get(_labels(labels))
+            return int(s[-1]) if s else 0
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(s)) for k, s in self._series.items())
+        out: List[str] = []
+        for key, s in items:
+            running = 0.0
+            for bound, c in zip(self.buckets, s):
+                running += c
+                out.append(f"{self.name}_bucket{_fmt_labels(key, (('le', _fmt_value(bound)),))} "
+                           f"{_fmt_value(running)}")
+            out.append(f"{self.name}_bucket{_fmt_labels(key, (('le', '+Inf'),))} {_fmt_value(s[-1])}")
+            out.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(s[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(key)} {_fmt_value(s[-1])}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> Any:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines += m.header() + m.lines()
+        return "\n".join(lines) + "\n"
+
+
+# ---------- stage timing ----------
+@contextmanager
+def timed(timings: Dict[str, float], stage: str) -> Iterator[None]:
+    """Add the wall time of the ``with`` block to ``timings[stage]`` (seconds)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def merge_timings(*parts: Dict[str, float]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in parts:
+        for stage, secs in part.items():
+            out[stage] = out.get(stage, 0.0) + secs
+    return out
+
+
+# ---------- process-wide registry ----------
+REGISTRY = Registry()
+SIMULATION_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "riskportal_simulation_stage_seconds",
+    "Wall time per simulation stage (summed over shards / blocks)."))
+SIMULATION_ITERATIONS = REGISTRY.register(Counter(
+    "riskportal_simulation_iterations_total", "Monte-Carlo iterations run."))
+SIMULATION_DISCARDED = REGISTRY.register(Counter(
+    "riskportal_simulation_discarded_iterations_total",
+    "Iterations discarded because a node was non-finite."))
+CHAT_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "riskportal_chat_stage_seconds", "Wall time per /chat stage."))
+CLAUDE_ATTEMPT_SECONDS = REGISTRY.register(Histogram(
+    "riskportal_claude_attempt_seconds", "Latency of each Anthropic API attempt."))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "riskportal_cache_lookups_total", "Cache lookups by cache and result (hit / miss)."))
+
+
+def observe_simulation(result: Dict[str, Any]) -> None:
+    """Record a finished simulation's metadata (timings, discards, plan-cache use)."""
+    meta = result.get("metadata", {})
+    for stage, secs in (meta.get("timings") or {}).items():
+        SIMULATION_STAGE_SECONDS.observe(secs, stage=stage)
+    SIMULATION_ITERATIONS.inc(meta.get("iterations") or 0)
+    SIMULATION_DISCARDED.inc(meta.get("discarded") or 0)
+    if "plan_cached" in meta:
+        CACHE_LOOKUPS.inc(cache="plan", result="hit" if meta["plan_cached"] else "miss")
+
+
+def observe_chat(timings: Dict[str, float]) -> None:
+    for stage, secs in timings.items():
+        CHAT_STAGE_SECONDS.observe(secs, stage=stage)
+
+
+def observe_claude_attempt(record: Dict[str, Any]) -> None:
+    """ClaudeClient ``on_attempt`` hook."""
+    status = record.get("status")
+    CLAUDE_ATTEMPT_SECONDS.observe(record["latency_ms"] / 1000.0,
+                                   status=status if status is not None else "error")
+
+
+def register_gauge(name: str, help: str, read: Callable[[], Dict[Labels, float]]) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, read))
+
+
+def render() -> str:
+    return REGISTRY.render()
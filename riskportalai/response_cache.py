@@ -0,0 +1,195 @@
+"""
+response_cache.py
+Opt-in cache of Claude responses for repeated chat turns.
+• key: sha256 of canonical JSON of (model, system prompt, tools, history)
+• TTL + LRU eviction in memory; optional on-disk backend (one JSON file
+  per key, written atomically) so demo scripts survive restarts
+• hit / miss counters and hit rate via ``info()``
+• PromptCacheStats: provider-side prompt-cache usage (cache_read /
+  cache_creation input tokens) aggregated from response ``usage`` blocks
+Enabled with RISKPORTAL_CHAT_CACHE=1; RISKPORTAL_CHAT_CACHE_TTL,
+RISKPORTAL_CHAT_CACHE_SIZE and RISKPORTAL_CHAT_CACHE_DIR tune it.
+"""
+
+from __future__ import annotations
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_TTL = 3600.0
+DEFAULT_SIZE = 256
+
+
+def response_key(payload: Dict[str, Any]) -> str:
+    """Cache key of a Messages API payload: only what determines the answer."""
+    parts = {k: payload.get(k) for k in ("model", "system", "tools", "messages")}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, separators=(",", ":"),
+                                     ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache of response dicts, optionally backed by a directory."""
+
+    def __init__(self, maxsize: int = DEFAULT_SIZE, ttl: float = DEFAULT_TTL,
+                 directory: str | None = None, clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.directory = directory
+        self._clock = clock
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """A deep copy of the cached response, or None (expired entries are dropped)."""
+        now = self._clock()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None and self.directory:
+                entry = self._load(key)
+                if entry is not None:
+                    self._items[key] = entry
+            if entry is not None and now - entry[0] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        entry = (self._clock(), copy.deepcopy(response))
+        with self._lock:
+            self._items[key] = entry
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                old, _ = self._items.popitem(last=False)
+                self._unlink(old)
+            if self.directory:
+                self._store(key, entry)
+                self._prune_disk()
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "size": len(self._items), "maxsize": self.maxsize, "ttl": self.ttl,
+                    "backend": "disk" if self.directory else "memory"}
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._items):
+                self._drop(key)
+            if self.directory:
+                for name in os.listdir(self.directory):
+                    if name.endswith(".json"):
+                        os.remove(os.path.join(self.directory, name))
+            self.hits = self.misses = 0
+
+    # ---------- disk backend ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def _load(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        try:
+            with open(self._path(key), encoding="utf-8") as fh:
+                raw = json.load(fh)
+            return float(raw["stored"]), raw["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, key: str, entry: Tuple[float, Dict[str, Any]]) -> None:
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"stored": entry[0], "response": entry[1]}, fh)
+        os.replace(tmp, self._path(key))  # readers never see a half-written file
+
+    def _prune_disk(self) -> None:
+        """Files from earlier processes count too: keep the newest ``maxsize``."""
+        names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        if len(names) <= self.maxsize:
+            return
+        paths = sorted((os.path.join(self.directory, n) for n in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.maxsize]:
+            os.remove(path)
+
+    def _drop(self, key: str) -> None:
+        self._items.pop(key, None)
+        self._unlink(key)
+
+    def _unlink(self, key: str) -> None:
+        if self.directory:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+
+class PromptCacheStats:
+    """Running totals of Anthropic prompt-cache usage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+
+    def record(self, usage: Dict[str, Any] | None) -> None:
+        if not usage:
+            return
+        with self._lock:
+            self.responses += 1
+            self.input_tokens += usage.get("input_tokens") or 0
+            self.cache_read_input_tokens += usage.get("cache_read_input_tokens") or 0
+            self.cache_creation_input_tokens += usage.get("cache_creation_input_tokens") or 0
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.input_tokens + self.cache_read_input_tokens + self.cache_creation_input_tokens
+            return {"responses": self.responses,
+                    "input_tokens": self.input_tokens,
+                    "cache_read_input_tokens": self.cache_read_input_tokens,
+                    "cache_creation_input_tokens": self.cache_creation_input_tokens,
+                    "token_hit_rate": self.cache_read_input_tokens / total if total else 0.0}
+
+
+# ---------- process-wide instances ----------
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+prompt_cache_stats = PromptCacheStats()
+
+
+def cache_from_env() -> ResponseCache | None:
+    if os.getenv("RISKPORTAL_CHAT_CACHE", "").lower() not in ("1", "true", "yes", "on"):
+        return None
+    return ResponseCache(maxsize=int(os.getenv("RISKPORTAL_CHAT_CACHE_SIZE", DEFAULT_SIZE)),
+                         ttl=float(os.getenv("RISKPORTAL_CHAT_CACHE_TTL", DEFAULT_TTL)),
+                         directory=os.getenv("RISKPORTAL_CHAT_CACHE_DIR") or None)
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Shared cache, built from the environment on first use (None when disabled)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = cache_from_env()
+        return _cache
+
+
+def set_response_cache(cache: ResponseCache | None) -> None:
+    """Install (or remove, with None) the shared cache, e.g. from tests."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
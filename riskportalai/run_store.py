@@ -0,0 +1,266 @@
+"""
+run_store.py
+Local archive of simulation runs, queryable without re-running them.
+• metadata in SQLite (``<dir>/runs.sqlite``): id, timestamp, seed,
+  iterations, sampling, scenario hash, scenario JSON and summary stats
+• raw samples as one ``.npy`` file per node under ``<dir>/<id>/``: every
+  result node plus every parameter (its value after risk edges, i.e. what
+  the formulas saw); row i of every array is the same kept iteration
+• arrays are opened memory-mapped, so slices, filters and CSV export read
+  only the rows they touch; quantiles load a single column (or the
+  filtered subset of it)
+• a run's files are written to a temp directory and renamed before its
+  row is inserted, so readers never see a partial run
+RISKPORTAL_RUN_DIR sets the location (default data/runs).
+"""
+
+from __future__ import annotations
+import io
+import json
+import operator
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .graph_plan import scenario_hash
+
+DEFAULT_RUN_DIR = "data/runs"
+BLOCK_ROWS = 65_536  # rows scanned per step when filtering / exporting
+
+FILTER_OPS = {"lt": operator.lt, "le": operator.le, "gt": operator.gt, "ge": operator.ge}
+_PERCENTILE = re.compile(r"^[pP](\d+(?:\.\d+)?)$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    seed INTEGER,
+    iterations INTEGER NOT NULL,
+    kept INTEGER NOT NULL,
+    sampling TEXT,
+    scenario_hash TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    summary TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS arrays (
+    run_id TEXT NOT NULL REFERENCES runs(id),
+    node TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    file TEXT NOT NULL,
+    PRIMARY KEY (run_id, node)
+);
+"""
+
+
+class RunStore:
+    """
+    SQLite index + per-node ``.npy`` files.  Only the directory is held, so
+    the store pickles cheaply and worker processes can write runs themselves.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+            db.executescript(_SCHEMA)
+
+    def __reduce__(self):
+        return (RunStore, (self.directory,))
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """A short-lived connection, committed and closed on exit."""
+        db = sqlite3.connect(os.path.join(self.directory, "runs.sqlite"), timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # ---------- writing ----------
+    def save(self,
+             scenario: Dict[str, Any],
+             result: Dict[str, Any],
+             parameters: Dict[str, np.ndarray],
+             results: Dict[str, np.ndarray]) -> str:
+        """Store one run; returns its id.  ``result`` is the simulate_graph response."""
+        run_id = uuid.uuid4().hex
+        meta = result["metadata"]
+        tmp = os.path.join(self.directory, f".{run_id}.tmp")
+        os.makedirs(tmp)
+        rows = []
+        for kind, arrays in (("parameter", parameters), ("result", results)):
+            for i, (nid, arr) in enumerate(arrays.items()):
+                name = f"{kind[0]}{i:05d}.npy"  # node ids are not safe file names
+                np.save(os.path.join(tmp, name), np.ascontiguousarray(arr, dtype=float))
+                rows.append((run_id, nid, kind, name))
+        os.replace(tmp, os.path.join(self.directory, run_id))
+        kept = len(next(iter(results.values()))) if results else 0
+        summary = {"results": {nid: {k: v for k, v in stats.items() if k != "samples"}
+                               for nid, stats in result["results"].items()},
+                   "metadata": meta}
+        with self._connect() as db:
+            db.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (run_id, time.time(), meta.get("seed"), meta["iterations"], kept,
+                        meta.get("sampling"), scenario_hash(scenario), json.dumps(scenario),
+                        json.dumps(summary)))
+            db.executemany("INSERT INTO arrays VALUES (?, ?, ?, ?)", rows)
+        return run_id
+
+    # ---------- reading ----------
+    def list(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Newest first, without scenario / summary bodies."""
+        with self._connect() as db:
+            rows = db.execute("SELECT id, created_at, seed, iterations, kept, sampling, "
+                              "scenario_hash FROM runs ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                              (limit, offset)).fetchall()
+        return [dict(r) for r in rows]
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            arrays = db.execute("SELECT node, kind FROM arrays WHERE run_id = ?",
+                                (run_id,)).fetchall()
+        out = dict(row)
+        out["scenario"] = json.loads(out["scenario"])
+        out["summary"] = json.loads(out["summary"])
+        out["arrays"] = {r["node"]: r["kind"] for r in arrays}
+        return out
+
+    def array(self, run_id: str, node: str) -> np.ndarray:
+        """Read-only memory map of one node's samples; KeyError if unknown."""
+        with self._connect() as db:
+            row = db.execute("SELECT file FROM arrays WHERE run_id = ? AND node = ?",
+                             (run_id, node)).fetchone()
+        if row is None:
+            raise KeyError(f"Run '{run_id}' has no samples for '{node}'")
+        return np.load(os.path.join(self.directory, run_id, row["file"]), mmap_mode="r")
+
+    def _columns(self, run_id: str, nodes: Sequence[str]) -> Dict[str, np.ndarray]:
+        if not nodes:
+            record = self.get(run_id)
+            if record is None:
+                raise KeyError(f"Unknown run '{run_id}'")
+            nodes = list(record["arrays"])
+        return {nid: self.array(run_id, nid) for nid in nodes}
+
+    def rows(self, run_id: str, nodes: Sequence[str] = (), start: int = 0,
+             stop: int | None = None) -> Dict[str, Any]:
+        """Rows ``start:stop`` of the given nodes (all nodes when empty)."""
+        cols = self._columns(run_id, nodes)
+        out = {nid: mm[start:stop].tolist() for nid, mm in cols.items()}
+        n = len(next(iter(out.values()))) if out else 0
+        return {"start": start, "rows": n, "columns": out}
+
+    def threshold(self, run_id: str, node: str, value: str | float) -> float:
+        """A number, or ``pNN``: that percentile of ``node`` in this run."""
+        m = _PERCENTILE.match(str(value))
+        if m is None:
+            try:
+                return float(value)
+            except ValueError:
+                raise ValueError(f"Threshold must be a number or pNN, got '{value}'") from None
+        q = float(m.group(1))
+        if q > 100:
+            raise ValueError(f"Percentile out of range: '{value}'")
+        return float(np.percentile(self.array(run_id, node), q))
+
+    def mask_blocks(self, run_id: str, node: str, op: str,
+                    value: str | float) -> Tuple[float, Iterator[Tuple[int, np.ndarray]]]:
+        """(threshold, iterator of (row offset, boolean mask)) over ``node`` op threshold."""
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unknown filter op '{op}' (use {', '.join(FILTER_OPS)})")
+        mm, cmp = self.array(run_id, node), FILTER_OPS[op]
+        t = self.threshold(run_id, node, value)
+        blocks = ((s, cmp(mm[s:s + BLOCK_ROWS], t)) for s in range(0, len(mm), BLOCK_ROWS))
+        return t, blocks
+
+    def filter(self, run_id: str, node: str, op: str, value: str | float,
+               columns: Sequence[str] = (), offset: int = 0, limit: int = 1000) -> Dict[str, Any]:
+        """
+        Rows where ``node`` op ``value`` holds: the total count plus row
+        indices and column values for matches ``offset .. offset+limit``.
+        """
+        t, blocks = self.mask_blocks(run_id, node, op, value)
+        matched, picked = 0, []
+        for start, mask in blocks:
+            hits = np.flatnonzero(mask)
+            lo, hi = max(offset - matched, 0), max(offset + limit - matched, 0)
+            if lo < len(hits) and hi > 0:
+                picked.append(hits[lo:hi] + start)
+            matched += len(hits)
+        idx = np.concatenate(picked) if picked else np.empty(0, dtype=np.int64)
+        cols = self._columns(run_id, columns or [node])
+        return {"node": node, "op": op, "threshold": t, "matched": matched, "offset": offset,
+                "rows": idx.tolist(), "columns": {nid: mm[idx].tolist() for nid, mm in cols.items()}}
+
+    def quantiles(self, run_id: str, node: str, qs: Sequence[float],
+                  where: Tuple[str, str, str | float] | None = None) -> Dict[str, Any]:
+        """Quantiles of ``node``, optionally over the rows matching ``where`` = (node, op, value)."""
+        if any(not 0 <= q <= 1 for q in qs):
+            raise ValueError("Quantiles must be within [0, 1]")
+        mm = self.array(run_id, node)
+        out: Dict[str, Any] = {"node": node}
+        if where is None:
+            data = np.asarray(mm)
+        else:
+            t, blocks = self.mask_blocks(run_id, *where)
+            data = np.concatenate([mm[s:s + len(mask)][mask] for s, mask in blocks] or [np.empty(0)])
+            out["where"] = {"node": where[0], "op": where[1], "threshold": t}
+        out["rows"] = int(len(data))
+        out["quantiles"] = ({str(q): float(v) for q, v in zip(qs, np.quantile(data, qs))}
+                            if len(data) else {str(q): None for q in qs})
+        return out
+
+    def csv(self, run_id: str, nodes: Sequence[str] = (), start: int = 0,
+            stop: int | None = None) -> Iterator[str]:
+        """CSV text (header, then ``row,<node>...``), one block of rows per chunk."""
+        cols = self._columns(run_id, nodes)
+        yield ",".join(["row"] + [_csv_field(n) for n in cols]) + "\n"
+        n = min(len(mm) for mm in cols.values()) if cols else 0
+        stop = n if stop is None else min(stop, n)
+        for s in range(start, stop, BLOCK_ROWS):
+            e = min(s + BLOCK_ROWS, stop)
+            block = np.column_stack([np.arange(s, e)] + [mm[s:e] for mm in cols.values()])
+            buf = io.StringIO()
+            np.savetxt(buf, block, fmt=["%d"] + ["%.17g"] * len(cols), delimiter=",")
+            yield buf.getvalue()
+
+
+def _csv_field(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"' if any(c in text for c in ',"\n') else text
+
+
+# ---------- process-wide store ----------
+_store: RunStore | None = None
+_store_lock = threading.Lock()
+
+
+def run_store_from_env() -> RunStore:
+    return RunStore(os.getenv("RISKPORTAL_RUN_DIR", DEFAULT_RUN_DIR))
+
+
+def get_run_store() -> RunStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = run_store_from_env()
+        return _store
+
+
+def reset_run_store() -> None:
+    """Forget the shared store (the next get_run_store re-reads the environment)."""
+    global _store
+    with _store_lock:
+        _store = None
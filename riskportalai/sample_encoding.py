@@ -0,0 +1,110 @@
+"""
+sample_encoding.py
+How result-node samples travel back to the client.
+• full       – JSON list of floats (original behaviour)
+• none       – statistics only
+• histogram  – server-side counts over N equal-width bins
+• reservoir  – fixed-size uniform subsample (seeded, order preserved)
+• npy        – base64 of a float32 ``.npy`` file inside the JSON body
+• binary     – length-prefixed JSON summary + raw little-endian float32
+               samples in one application/octet-stream body
+"""
+
+from __future__ import annotations
+import base64
+import io
+import json
+import struct
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+SAMPLE_ENCODINGS = ("full", "none", "histogram", "reservoir", "npy", "binary")
+DEFAULT_SAMPLE_BINS = 50
+DEFAULT_RESERVOIR_SIZE = 1000
+
+
+def encode_samples(arr: np.ndarray,
+                   encoding: str = "full",
+                   bins: int = DEFAULT_SAMPLE_BINS,
+                   reservoir_size: int = DEFAULT_RESERVOIR_SIZE,
+                   rng: np.random.Generator | None = None) -> Any:
+    """Return the ``samples`` field for one result node."""
+    if encoding == "full":
+        return arr.tolist()
+    if encoding == "none":
+        return None
+    if encoding == "histogram":
+        if len(arr) == 0:
+            return {"edges": [], "counts": []}
+        counts, edges = np.histogram(arr, bins=bins)
+        return {"edges": edges.tolist(), "counts": counts.tolist()}
+    if encoding == "reservoir":
+        if len(arr) <= reservoir_size:
+            return arr.tolist()
+        rng = rng or np.random.default_rng()
+        idx = np.sort(rng.choice(len(arr), size=reservoir_size, replace=False))
+        return arr[idx].tolist()
+    if encoding == "npy":
+        buf = io.BytesIO()
+        np.save(buf, arr.astype("<f4"), allow_pickle=False)
+        return {"format": "npy", "dtype": "float32",
+                "data": base64.b64encode(buf.getvalue()).decode("ascii")}
+    if encoding == "binary":
+        return arr.astype("<f4")  # packed by pack_binary() at the HTTP layer
+    raise ValueError(f"Unknown sample encoding: {encoding}")
+
+
+def decode_npy(payload: Dict[str, Any]) -> np.ndarray:
+    return np.load(io.BytesIO(base64.b64decode(payload["data"])), allow_pickle=False)
+
+
+def pack_binary(result: Dict[str, Any]) -> Tuple[bytes, Dict[str, str]]:
+    """
+    One octet-stream body for a whole result:
+
+        uint32 LE  n = length of the summary JSON
+        n bytes    summary JSON (statistics, metadata, sensitivity, layout)
+        padding    zero bytes up to a 4-byte boundary
+        float32 LE every result node's samples, back to back
+
+    The summary travels in the body because it grows with the graph
+    (optimizer report, discard reasons, sensitivity) and would overflow
+    proxy header limits.  Headers only carry offsets: ``X-Samples-Offset``
+    (byte offset of the samples) and ``X-Sample-Layout`` (id / offset /
+    count per node, in float32 elements from that offset).
+    """
+    layout: List[Dict[str, Any]] = []
+    chunks: List[bytes] = []
+    summary: Dict[str, Any] = {k: v for k, v in result.items() if k != "results"}
+    summary["results"] = {}
+    offset = 0
+    for nid, stats in result["results"].items():
+        arr = stats.get("samples")
+        arr = np.asarray(arr if arr is not None else [], dtype="<f4")
+        layout.append({"id": nid, "offset": offset, "count": int(arr.size)})
+        chunks.append(arr.tobytes())
+        offset += arr.size
+        summary["results"][nid] = {k: v for k, v in stats.items() if k != "samples"}
+    summary["layout"] = layout
+    head = json.dumps(summary, separators=(",", ":")).encode("utf-8")
+    start = _align(4 + len(head))
+    prefix = struct.pack("<I", len(head)) + head + b"\0" * (start - 4 - len(head))
+    headers = {
+        "X-Samples-Offset": str(start),
+        "X-Sample-Layout": json.dumps(layout, separators=(",", ":")),
+    }
+    return prefix + b"".join(chunks), headers
+
+
+def unpack_binary(body: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Inverse of pack_binary: (summary, {node id: float32 samples})."""
+    (n,) = struct.unpack_from("<I", body)
+    summary = json.loads(body[4:4 + n].decode("utf-8"))
+    data = np.frombuffer(body, dtype="<f4", offset=_align(4 + n))
+    return summary, {e["id"]: data[e["offset"]:e["offset"] + e["count"]]
+                     for e in summary["layout"]}
+
+
+def _align(n: int) -> int:
+    return (n + 3) // 4 * 4
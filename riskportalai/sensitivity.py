@@ -0,0 +1,82 @@
+"""
+sensitivity.py
+Single-run driver ranking (tornado data) for every result node.
+• inputs are the arrays retained by one VectorEngine step: each parameter's
+  own sampled values (before edges) and each edge's firing mask + impact
+• rank_correlation: Spearman correlation between driver and result
+• contribution_to_variance: rho² normalised over all drivers of a result
+• edges also report fire_rate and conditional_mean_shift
+  (mean result when the edge fired minus mean when it did not)
+Each driver is ranked once and reused for every result node, so the whole
+analysis is one extra pass over the stored arrays.
+"""
+
+from __future__ import annotations
+import math
+from typing import Any, Dict, List
+
+import numpy as np
+
+_MIN_LANES = 3
+
+
+def _standardised_ranks(x: np.ndarray) -> np.ndarray | None:
+    """Average ranks scaled to zero mean / unit norm; None if ``x`` is constant."""
+    from scipy.stats import rankdata  # lazy: only sensitivity runs need it
+    r = rankdata(x)
+    r -= r.mean()
+    norm = math.sqrt(float(r @ r))
+    return r / norm if norm > 0 else None
+
+
+def driver_sensitivity(inputs: Dict[str, Dict[str, Any]],
+                       values: Dict[str, np.ndarray],
+                       valid: np.ndarray,
+                       result_ids: List[str],
+                       top: int | None = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Rank drivers for each node in ``result_ids``.
+
+    ``inputs`` is ``VectorEngine.retained``: ``{"parameters": {id: values},
+    "edges": {id: {"target", "fired", "impact"}}}``.  Only lanes in ``valid``
+    are used.  Each result's list is sorted by |rank_correlation| and cut to
+    ``top`` entries when given.
+    """
+    out: Dict[str, List[Dict[str, Any]]] = {nid: [] for nid in result_ids}
+    if int(valid.sum()) < _MIN_LANES:
+        return out
+
+    # standardised result ranks, one row per result node (None if constant)
+    ys = {nid: np.asarray(values[nid])[valid] for nid in result_ids}
+    zy = {nid: _standardised_ranks(y) for nid, y in ys.items()}
+
+    drivers: List[Dict[str, Any]] = []
+    for nid, x in inputs["parameters"].items():
+        drivers.append({"driver": nid, "kind": "parameter", "x": x[valid]})
+    for eid, e in inputs["edges"].items():
+        fired = e["fired"][valid]
+        drivers.append({"driver": eid, "kind": "edge", "target": e["target"],
+                        "x": np.where(fired, e["impact"][valid], 0.0), "fired": fired})
+
+    for d in drivers:
+        zx = _standardised_ranks(d.pop("x"))
+        fired = d.pop("fired", None)
+        for nid in result_ids:
+            rho = 0.0 if zx is None or zy[nid] is None else float(zx @ zy[nid])
+            entry = dict(d, rank_correlation=rho)
+            if fired is not None:
+                n_fired = int(fired.sum())
+                entry["fire_rate"] = n_fired / len(fired)
+                entry["conditional_mean_shift"] = (
+                    float(ys[nid][fired].mean() - ys[nid][~fired].mean())
+                    if 0 < n_fired < len(fired) else None)
+            out[nid].append(entry)
+
+    for nid, entries in out.items():
+        total = sum(e["rank_correlation"] ** 2 for e in entries)
+        for e in entries:
+            e["contribution_to_variance"] = e["rank_correlation"] ** 2 / total if total else 0.0
+        entries.sort(key=lambda e: -abs(e["rank_correlation"]))
+        if top is not None:
+            del entries[top:]
+    return out
@@ -0,0 +1,208 @@
+"""
+streaming_stats.py
+Bounded-memory, mergeable estimators for chunked simulation runs.
+• RunningMoments   – count / mean / variance / min / max (Chan et al. merge)
+• QuantileSketch   – DDSketch-style log-bucket sketch, relative-error bound
+• FixedHistogram   – fixed bin edges + underflow / overflow counters
+All three update from NumPy blocks and merge across shards exactly.
+"""
+
+from __future__ import annotations
+import math
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+DEFAULT_RELATIVE_ACCURACY = 0.005
+DEFAULT_HIST_BINS = 50
+
+
+class RunningMoments:
+    """Streaming mean / variance via per-block moments + pairwise merge."""
+
+    __slots__ = ("n", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, x: np.ndarray) -> None:
+        if len(x) == 0:
+            return
+        other = RunningMoments()
+        other.n = len(x)
+        other.mean = float(x.mean())
+        other.m2 = float(((x - other.mean) ** 2).sum())
+        other.min = float(x.min())
+        other.max = float(x.max())
+        self.merge(other)
+
+    def merge(self, other: "RunningMoments") -> None:
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class QuantileSketch:
+    """
+    Log-bucket quantile sketch (DDSketch, Masson et al. 2019).
+
+    Error bound: for any quantile q the returned value v satisfies
+    ``|v - x_q| <= relative_accuracy * |x_q|`` where x_q is the exact
+    sample quantile (values with ``|x| < min_value`` collapse to 0).
+    Memory grows with log(max|x| / min|x|) / relative_accuracy, not with
+    the number of samples, and merging two sketches is exact.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 min_value: float = 1e-12):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.pos: Dict[int, int] = {}
+        self.neg: Dict[int, int] = {}
+        self.zero = 0
+        self.n = 0
+
+    def update(self, x: np.ndarray) -> None:
+        x = np.asarray(x, dtype=float)
+        self.n += len(x)
+        tiny = np.abs(x) < self.min_value
+        self.zero += int(tiny.sum())
+        self._add(self.pos, x[(x > 0) & ~tiny])
+        self._add(self.neg, -x[(x < 0) & ~tiny])
+
+    def _add(self, store: Dict[int, int], mags: np.ndarray) -> None:
+        if len(mags) == 0:
+            return
+        idx = np.ceil(np.log(mags) / self._log_gamma).astype(np.int64)
+        keys, counts = np.unique(idx, return_counts=True)
+        for k, c in zip(keys.tolist(), counts.tolist()):
+            store[k] = store.get(k, 0) + c
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for mine, theirs in ((self.pos, other.pos), (self.neg, other.neg)):
+            for k, c in theirs.items():
+                mine[k] = mine.get(k, 0) + c
+        self.zero += other.zero
+        self.n += other.n
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Sequence[float]) -> list:
+        """Several quantiles from one sorted pass over the buckets."""
+        if self.n == 0:
+            return [math.nan for _ in qs]
+        neg_keys, neg_counts = _sorted_buckets(self.neg)
+        pos_keys, pos_counts = _sorted_buckets(self.pos)
+        # buckets in value order: negatives (largest magnitude first), zero, positives
+        keys = np.concatenate([neg_keys[::-1], [0], pos_keys])
+        sign = np.concatenate([-np.ones(len(neg_keys)), [0.0], np.ones(len(pos_keys))])
+        counts = np.concatenate([neg_counts[::-1], [self.zero], pos_counts])
+        # first bucket whose cumulative count passes rank q * (n - 1)
+        idx = np.searchsorted(np.cumsum(counts), np.asarray(qs, dtype=float) * (self.n - 1),
+                              side="right")
+        idx = np.minimum(idx, len(keys) - 1)
+        return [float(s * self._value(int(k))) if s else 0.0
+                for s, k in zip(sign[idx].tolist(), keys[idx].tolist())]
+
+
+def _sorted_buckets(store: Dict[int, int]) -> tuple:
+    keys = np.fromiter(store.keys(), dtype=np.int64, count=len(store))
+    counts = np.fromiter(store.values(), dtype=np.int64, count=len(store))
+    order = np.argsort(keys)
+    return keys[order], counts[order]
+
+
+class FixedHistogram:
+    """Histogram over fixed edges; values outside go to under/overflow."""
+
+    def __init__(self, lower: float, upper: float, bins: int = DEFAULT_HIST_BINS):
+        if not upper > lower:
+            upper = lower + 1.0
+        self.edges = np.linspace(lower, upper, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def update(self, x: np.ndarray) -> None:
+        self.underflow += int((x < self.edges[0]).sum())
+        self.overflow += int((x > self.edges[-1]).sum())
+        self.counts += np.histogram(x, bins=self.edges)[0]
+
+    def merge(self, other: "FixedHistogram") -> None:
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different bin edges")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"edges": self.edges.tolist(), "counts": self.counts.tolist(),
+                "underflow": self.underflow, "overflow": self.overflow}
+
+
+class StreamingSummary:
+    """Moments + sketch + histogram for one result node."""
+
+    def __init__(self, hist_range: Sequence[float], bins: int = DEFAULT_HIST_BINS,
+                 relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.moments = RunningMoments()
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.histogram = FixedHistogram(hist_range[0], hist_range[1], bins)
+
+    def update(self, x: np.ndarray) -> None:
+        self.moments.update(x)
+        self.sketch.update(x)
+        self.histogram.update(x)
+
+    def merge(self, other: "StreamingSummary") -> None:
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+
+    def to_dict(self) -> Dict[str, Any]:
+        p5, p50, p95 = self.sketch.quantiles((0.05, 0.50, 0.95))
+        return {
+            "p5": p5, "p50": p50, "p95": p95,
+            "mean": self.moments.mean,
+            "std": self.moments.std,
+            "min": self.moments.min,
+            "max": self.moments.max,
+            "histogram": self.histogram.to_dict(),
+        }
+
+
+def histogram_range(pilot: np.ndarray, pad: float = 0.25) -> tuple:
+    """Bin range from a pilot block: robust [P0.1, P99.9] span padded both sides."""
+    if len(pilot) == 0:
+        return (0.0, 1.0)
+    lo, hi = np.percentile(pilot, [0.1, 99.9])
+    span = (hi - lo) or max(abs(lo), 1.0)
+    return (float(lo - pad * span), float(hi + pad * span))
@@ -0,0 +1,151 @@
+"""
+synthetic.py
+Seeded generator of random, valid scenarios for tests and benchmarks.
+• layered DAG: parameters first, then ``layers`` of expression nodes that
+  read parameters and earlier layers; the last layer holds the results
+• every node feeds a result, so plan pruning cannot shrink the graph
+• 0..max_edges risk edges per parameter (absolute and percentage),
+  mixed distribution families and formula trees of varying depth
+• formulas are means of their leaves (bounded operators only), so values
+  stay finite however deep the graph is
+Same (nodes, seed, options) -> identical scenario.
+"""
+
+from __future__ import annotations
+import math
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+FAMILIES = ("constant", "normal", "uniform", "triangular", "discrete",
+            "lognormal", "bernoulli", "beta", "poisson", "pert")
+
+# binary templates whose magnitude never exceeds their largest operand
+# and that use each operand once (formula text grows linearly with leaves)
+_BINARY = ("{a} + {b}", "{a} - {b}", "max({a}, {b})", "min({a}, {b})",
+           "{a} / (1 + abs({b}))", "where({a} > 0, {b}, 0)")
+_UNARY = ("abs({a})", "log(1 + abs({a}))", "-{a}")
+
+
+def synthetic_scenario(nodes: int,
+                       seed: int = 0,
+                       parameter_share: float = 0.5,
+                       max_edges: int = 50,
+                       formula_depth: Tuple[int, int] = (1, 4),
+                       layers: int | None = None) -> Dict[str, Any]:
+    """
+    Random scenario with ``nodes`` nodes in total.  Each parameter gets
+    ``U{0..max_edges}`` edges; each expression a formula tree whose depth is
+    drawn from ``formula_depth`` (inclusive).  ``layers`` defaults to about
+    sqrt(expressions) / 1.5, i.e. deeper graphs as they grow.
+    """
+    if nodes < 2:
+        raise ValueError("A synthetic scenario needs at least 2 nodes")
+    rng = np.random.default_rng(seed)
+    n_params = min(max(1, round(nodes * parameter_share)), nodes - 1)
+    n_expr = nodes - n_params
+    if layers is None:
+        layers = round(math.sqrt(n_expr) / 1.5)
+    layers = min(max(1, layers), n_expr)
+
+    params = [f"p{i:04d}" for i in range(n_params)]
+    out_nodes: List[Dict[str, Any]] = [
+        {"id": nid, "type": "parameter", "distribution": _distribution(rng)} for nid in params]
+    edges: List[Dict[str, Any]] = []
+    for nid in params:
+        for _ in range(int(rng.integers(0, max_edges + 1))):
+            edges.append(_edge(rng, f"e{len(edges):05d}", nid))
+
+    unused = list(rng.permutation(params))     # consumed first, so every node is read
+    pool: List[str] = list(params)             # everything an expression may read
+    previous: List[str] = list(params)
+    sizes = [len(a) for a in np.array_split(np.arange(n_expr), layers)]
+    for li, size in enumerate(sizes):
+        last = li == len(sizes) - 1
+        ids = [f"x{li:02d}_{j:04d}" for j in range(size)]
+        trees: List[Tuple[str, int]] = []     # (formula tree, leaves in it)
+        for _ in ids:
+            leaves: List[str] = []
+            depth = int(rng.integers(formula_depth[0], formula_depth[1] + 1))
+            trees.append((_tree(rng, depth, leaves, unused, pool, previous), len(leaves)))
+        extra: List[List[str]] = [[] for _ in ids]
+        if last:
+            # whatever is still unread is folded into the results' means
+            for k, nid in enumerate(unused):
+                extra[k % size].append(nid)
+            unused = []
+        for nid, (tree, n_leaves), more in zip(ids, trees, extra):
+            n_terms = n_leaves + len(more)
+            terms = " + ".join([f"({tree})" if more else tree] + more)
+            formula = terms if n_terms == 1 else f"({terms}) / {n_terms}"
+            node = {"id": nid, "type": "result" if last else "expression", "formula": formula}
+            if last:
+                node["is_result"] = True
+            out_nodes.append(node)
+        unused.extend(rng.permutation(ids).tolist())
+        pool.extend(ids)
+        previous = ids
+
+    return {"schemaVersion": "1.0",
+            "metadata": {"generator": "synthetic", "seed": seed, "nodes": nodes},
+            "nodes": out_nodes,
+            "edges": edges}
+
+
+def _tree(rng: np.random.Generator, depth: int, leaves: List[str],
+          unused: List[str], pool: List[str], previous: List[str]) -> str:
+    if depth == 0:
+        leaves.append(_leaf(rng, unused, pool, previous))
+        return leaves[-1]
+    if rng.random() < 0.2:
+        return rng.choice(_UNARY).format(a=_tree(rng, depth - 1, leaves, unused, pool, previous))
+    a = _tree(rng, depth - 1, leaves, unused, pool, previous)
+    b = _tree(rng, depth - 1, leaves, unused, pool, previous)
+    return "(" + rng.choice(_BINARY).format(a=a, b=b) + ")"
+
+
+def _leaf(rng: np.random.Generator, unused: List[str], pool: List[str],
+          previous: List[str]) -> str:
+    if unused:
+        return unused.pop()
+    # prefer the previous layer so the graph stays deep, not flat
+    source = previous if rng.random() < 0.6 else pool
+    return source[int(rng.integers(len(source)))]
+
+
+def _distribution(rng: np.random.Generator) -> Dict[str, Any]:
+    family = FAMILIES[int(rng.integers(len(FAMILIES)))]
+    centre = float(np.round(rng.uniform(1, 1000), 2))
+    spread = float(np.round(centre * rng.uniform(0.05, 0.5), 2))
+    if family == "constant":
+        p = {"value": centre}
+    elif family == "normal":
+        p = {"mean": centre, "stddev": spread}
+    elif family == "uniform":
+        p = {"lower": centre - spread, "upper": centre + spread}
+    elif family in ("triangular", "pert"):
+        p = {"min": centre - spread, "mode": centre, "max": centre + 2 * spread}
+    elif family == "discrete":
+        p = {"values": sorted(np.round(rng.uniform(1, 1000, int(rng.integers(2, 6))), 2).tolist())}
+    elif family == "lognormal":
+        p = {"mean": float(np.round(np.log(centre), 3)), "sigma": float(np.round(rng.uniform(0.1, 0.6), 3))}
+    elif family == "bernoulli":
+        p = {"p": float(np.round(rng.uniform(0.05, 0.95), 3))}
+    elif family == "beta":
+        p = {"alpha": float(np.round(rng.uniform(0.5, 5), 2)), "beta": float(np.round(rng.uniform(0.5, 5), 2))}
+    else:  # poisson
+        p = {"lambda": float(np.round(rng.uniform(0.5, 50), 2))}
+    return {"type": family, "parameters": p}
+
+
+def _edge(rng: np.random.Generator, eid: str, target: str) -> Dict[str, Any]:
+    edge = {"id": eid, "target": target,
+            "probability": float(np.round(rng.uniform(0.05, 1.0), 3)),
+            "priority": int(rng.integers(0, 3))}
+    if rng.random() < 0.5:
+        edge.update(impact_type="percentage",
+                    distribution={"type": "triangular",
+                                  "parameters": {"min": -10, "mode": 2, "max": 20}})
+    else:
+        edge.update(impact_type="absolute", distribution=_distribution(rng))
+    return edge
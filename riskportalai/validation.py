@@ -0,0 +1,385 @@
+"""
+validation.py
+Scenario validation: schema.graph.json plus the engine's semantic rules.
+• the JSON schema is compiled once into nested checker closures (the
+  keyword subset the schema uses; an unsupported keyword fails at build
+  time rather than being silently ignored)
+• one pass over nodes, then one over edges, O(nodes + edges):
+  – every node / edge against its compiled schema
+  – distribution parameter names must match the family
+  – formulas must parse, use whitelisted operators and reference known ids
+  – node ids and edge ids must be unique (an edge id keys its random
+    streams, so duplicates would draw identical numbers)
+  – edges may only target parameter nodes
+  – at least one node must be marked ``is_result``
+• outcomes are memoised by scenario hash (LRU), so repeat submissions
+  from /chat and /graph_simulate are answered without re-walking the graph
+"""
+
+from __future__ import annotations
+import json
+import math
+import pathlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from .copula import correlation_errors
+from .expression_eval import ExpressionEvaluationError, compile_expression, referenced_names
+from .graph_plan import scenario_hash
+from .metrics import CACHE_LOOKUPS
+
+SCHEMA_PATH = pathlib.Path(__file__).resolve().parent.parent / "schema.graph.json"
+MAX_ERRORS = 20          # stop collecting after this many (the first few matter)
+CACHE_SIZE = 1024
+
+# family -> (required parameter names, optional parameter names)
+DISTRIBUTION_PARAMETERS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "constant": (("value",), ()),
+    "normal": (("mean", "stddev"), ()),
+    "uniform": (("lower", "upper"), ()),
+    "triangular": (("min", "mode", "max"), ()),
+    "discrete": (("values",), ()),
+    "lognormal": (("mean", "sigma"), ()),
+    "bernoulli": (("p",), ()),
+    "beta": (("alpha", "beta"), ()),
+    "poisson": (("lambda",), ()),
+    "pert": (("min", "mode", "max"), ("lambda",)),
+}
+
+Check = Callable[[Any, str, List[str]], None]
+Compiled = Tuple[Callable[[Any], bool], Check]   # (fast predicate, error reporter)
+
+
+# ---------- schema compilation ----------
+# Every (sub)schema compiles to a cheap predicate plus a reporter that builds
+# path-qualified messages; the reporter only runs where the predicate failed,
+# so valid documents never pay for error formatting.
+_ANNOTATIONS = {"$schema", "$id", "title", "description", "$defs", "default", "examples"}
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool))
+                         or (isinstance(v, float) and v.is_integer()),
+}
+
+
+def compile_schema(schema: Dict[str, Any], root: Dict[str, Any] | None = None) -> Check:
+    """Turn a JSON-schema (sub)document into ``check(value, path, errors)``."""
+    ok, report = _compile(schema, root if root is not None else schema)
+
+    def check(value: Any, path: str, errors: List[str]) -> None:
+        if not ok(value):
+            report(value, path, errors)
+    return check
+
+
+def _compile(schema: Dict[str, Any], root: Dict[str, Any]) -> Compiled:
+    if "$ref" in schema:
+        ref = schema["$ref"]
+        if not ref.startswith("#/"):
+            raise ValueError(f"Unsupported schema reference: {ref}")
+        target: Any = root
+        for part in ref[2:].split("/"):
+            target = target[part]
+        return _compile(target, root)
+
+    typed: Compiled | None = None
+    rest: List[Compiled] = []
+    for keyword, arg in schema.items():
+        if keyword in _ANNOTATIONS:
+            continue
+        factory = _KEYWORDS.get(keyword)
+        if factory is None:
+            raise ValueError(f"Unsupported schema keyword: {keyword}")
+        if keyword == "type":
+            typed = factory(arg, root)
+        else:
+            rest.append(factory(arg, root))
+    # type first: the other keywords assume the right kind of value
+    preds = tuple(([typed[0]] if typed else []) + [p for p, _ in rest])
+
+    def ok(value: Any) -> bool:
+        for p in preds:
+            if not p(value):
+                return False
+        return True
+
+    def report(value: Any, path: str, errors: List[str]) -> None:
+        if typed is not None and not typed[0](value):
+            typed[1](value, path, errors)
+            return
+        for p, r in rest:
+            if not p(value):
+                r(value, path, errors)
+    return ok, report
+
+
+def _k_type(arg, root) -> Compiled:
+    names = arg if isinstance(arg, list) else [arg]
+    tests = [_TYPES[n] for n in names]
+    ok = tests[0] if len(tests) == 1 else (lambda v: any(t(v) for t in tests))
+
+    def report(v, path, errors):
+        errors.append(f"{path}: expected {' or '.join(names)}, got {_kind(v)}")
+    return ok, report
+
+
+def _k_required(arg, root) -> Compiled:
+    names = tuple(arg)
+
+    def ok(v):
+        return not isinstance(v, dict) or all(n in v for n in names)
+
+    def report(v, path, errors):
+        for name in names:
+            if name not in v:
+                errors.append(f"{path}: missing required field '{name}'")
+    return ok, report
+
+
+def _k_properties(arg, root) -> Compiled:
+    props = tuple((name, *_compile(sub, root)) for name, sub in arg.items())
+
+    def ok(v):
+        if isinstance(v, dict):
+            for name, p, _ in props:
+                if name in v and not p(v[name]):
+                    return False
+        return True
+
+    def report(v, path, errors):
+        for name, p, r in props:
+            if name in v and not p(v[name]):
+                r(v[name], f"{path}.{name}", errors)
+    return ok, report
+
+
+def _k_items(arg, root) -> Compiled:
+    p, r = _compile(arg, root)
+
+    def ok(v):
+        return not isinstance(v, list) or all(map(p, v))
+
+    def report(v, path, errors):
+        for i, x in enumerate(v):
+            if not p(x):
+                r(x, f"{path}[{i}]", errors)
+    return ok, report
+
+
+def _k_enum(arg, root) -> Compiled:
+    allowed = list(arg)
+
+    def report(v, path, errors):
+        errors.append(f"{path}: {v!r} is not one of {allowed}")
+    return (lambda v: v in allowed), report
+
+
+def _k_const(arg, root) -> Compiled:
+    def report(v, path, errors):
+        errors.append(f"{path}: must be {arg!r}")
+    return (lambda v: v == arg), report
+
+
+def _bound(op: Callable[[float, float], bool], word: str) -> Callable:
+    def factory(arg, root) -> Compiled:
+        def report(v, path, errors):
+            errors.append(f"{path}: {v} is {word} {arg}")
+        return (lambda v: not _TYPES["number"](v) or op(v, arg)), report
+    return factory
+
+
+def _length(op: Callable[[int, int], bool], word: str) -> Callable:
+    def factory(arg, root) -> Compiled:
+        def report(v, path, errors):
+            errors.append(f"{path}: needs {word} {arg} items")
+        return (lambda v: not isinstance(v, list) or op(len(v), arg)), report
+    return factory
+
+
+_KEYWORDS: Dict[str, Callable[[Any, Dict[str, Any]], Compiled]] = {
+    "type": _k_type,
+    "required": _k_required,
+    "properties": _k_properties,
+    "items": _k_items,
+    "enum": _k_enum,
+    "const": _k_const,
+    "minimum": _bound(lambda v, a: v >= a, "below the minimum"),
+    "maximum": _bound(lambda v, a: v <= a, "above the maximum"),
+    "minItems": _length(lambda n, a: n >= a, "at least"),
+    "maxItems": _length(lambda n, a: n <= a, "at most"),
+}
+
+
+def _kind(v: Any) -> str:
+    return {dict: "object", list: "array", str: "string", bool: "boolean",
+            type(None): "null"}.get(type(v), "number" if isinstance(v, (int, float)) else type(v).__name__)
+
+
+# ---------- validator ----------
+class ScenarioValidator:
+    """Compiled schema + semantic rules; ``validate`` is safe to call from any thread."""
+
+    def __init__(self, schema: Dict[str, Any], cache_size: int = CACHE_SIZE):
+        defs = schema.get("$defs", {})
+        # nodes / edges are checked item by item in the semantic pass
+        top = {**schema, "properties": {
+            name: {k: v for k, v in sub.items() if k != "items"} if name in ("nodes", "edges") else sub
+            for name, sub in schema.get("properties", {}).items()}}
+        self._scenario = compile_schema(top, schema)
+        self._node = _compile(defs["node"], schema)
+        self._edge = _compile(defs["edge"], schema)
+        self._cache: "OrderedDict[str, Tuple[bool, Tuple[str, ...]]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_file(cls, path: pathlib.Path = SCHEMA_PATH) -> "ScenarioValidator":
+        return cls(json.loads(pathlib.Path(path).read_text(encoding="utf-8")))
+
+    def validate(self, scenario: Any, key: str | None = None) -> Tuple[bool, List[str]]:
+        """(valid, errors); memoised by ``key`` (the scenario hash, computed if omitted)."""
+        try:
+            key = key or scenario_hash(scenario)
+        except (TypeError, ValueError) as exc:
+            return False, [f"Scenario is not JSON-serialisable: {exc}"]
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(cache="validation", result="hit")
+                return hit[0], list(hit[1])
+            self.misses += 1
+        CACHE_LOOKUPS.inc(cache="validation", result="miss")
+        errors = self.errors(scenario)
+        with self._lock:
+            self._cache[key] = (not errors, tuple(errors))
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return not errors, errors
+
+    def errors(self, scenario: Any) -> List[str]:
+        """Every problem found (up to MAX_ERRORS), uncached."""
+        errors: List[str] = []
+        self._scenario(scenario, "scenario", errors)
+        if errors or not isinstance(scenario, dict):
+            return errors[:MAX_ERRORS]
+
+        types: Dict[str, str] = {}
+        formulas: List[Tuple[str, str]] = []
+        has_result = False
+        for i, node in enumerate(scenario["nodes"]):
+            if not self._node[0](node):
+                self._node[1](node, f"nodes[{i}]", errors)
+                if isinstance(node, dict) and isinstance(node.get("id"), str):
+                    types[node["id"]] = str(node.get("type"))  # spare edges a second error
+                continue
+            nid, kind = node["id"], node["type"]
+            if nid in types:
+                errors.append(f"Duplicate node id '{nid}'")
+            types[nid] = kind
+            has_result = has_result or bool(node.get("is_result"))
+            if kind == "parameter":
+                if "distribution" not in node:
+                    errors.append(f"Parameter '{nid}' has no 'distribution'")
+                else:
+                    _distribution_errors(node["distribution"], f"Parameter '{nid}'", errors)
+            elif "formula" not in node:
+                errors.append(f"{kind.capitalize()} node '{nid}' has no 'formula'")
+            else:
+                formulas.append((nid, node["formula"]))
+
+        for nid, formula in formulas:  # needs every id, so after the node pass
+            try:
+                compile_expression(formula)
+                unknown = sorted(n for n in referenced_names(formula) if n not in types)
+            except ExpressionEvaluationError as exc:
+                errors.append(f"Formula of '{nid}' is invalid: {exc}")
+                continue
+            if unknown:
+                errors.append(f"Formula of '{nid}' references unknown id(s): {', '.join(unknown)}")
+        if types and not has_result:
+            errors.append("Scenario has no result: mark at least one expression "
+                          "node with \"is_result\": true")
+
+        edge_ids: Set[str] = set()
+        for i, edge in enumerate(scenario["edges"]):
+            if not self._edge[0](edge):
+                self._edge[1](edge, f"edges[{i}]", errors)
+                continue
+            eid, target = edge["id"], edge["target"]
+            if eid in edge_ids:
+                errors.append(f"Duplicate edge id '{eid}'")
+            edge_ids.add(eid)
+            if target not in types:
+                errors.append(f"Edge '{eid}' targets non-existent node '{target}'")
+            elif types[target] != "parameter":
+                errors.append(
+                    f"Edge '{eid}' targets {types[target]} node '{target}'. "
+                    f"Edges can only target parameter nodes. "
+                    f"Consider creating a base parameter and targeting that instead.")
+            _distribution_errors(edge["distribution"], f"Edge '{eid}'", errors)
+            if len(errors) >= MAX_ERRORS:
+                break
+
+        if not errors and scenario.get("correlations"):
+            errors.extend(correlation_errors(scenario))
+        return errors[:MAX_ERRORS]
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._cache), "maxsize": self._cache_size}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+
+def _distribution_errors(dist: Dict[str, Any], owner: str, errors: List[str]) -> None:
+    """Parameter names must match the family; values must be finite numbers."""
+    family = dist["type"]
+    required, optional = DISTRIBUTION_PARAMETERS[family]
+    params = dist["parameters"]
+    if (len(params) == len(required) or params.keys() <= {*required, *optional}) \
+            and all(p in params for p in required) \
+            and all(type(v) in (int, float) and math.isfinite(v) for v in params.values()):
+        return  # the common case; ``values`` lists fall through to the full check
+    missing = [p for p in required if p not in params]
+    unexpected = sorted(set(params) - set(required) - set(optional))
+    if missing:
+        errors.append(f"{owner}: {family} distribution needs parameter(s) {', '.join(missing)}")
+    if unexpected:
+        errors.append(f"{owner}: {family} distribution does not take {', '.join(unexpected)} "
+                      f"(expected {', '.join(required + optional)})")
+    for name, value in params.items():
+        values = value if name == "values" and isinstance(value, list) else [value]
+        if not values or not all(_TYPES["number"](v) and math.isfinite(v) for v in values):
+            errors.append(f"{owner}: parameter '{name}' must be "
+                          f"{'a non-empty list of numbers' if name == 'values' else 'a finite number'}")
+
+
+# ---------- process-wide validator ----------
+_validator: ScenarioValidator | None = None
+_validator_lock = threading.Lock()
+
+
+def get_validator() -> ScenarioValidator:
+    """The shared validator, compiled from schema.graph.json on first use."""
+    global _validator
+    with _validator_lock:
+        if _validator is None:
+            _validator = ScenarioValidator.from_file()
+        return _validator
+
+
+def validate_scenario(scenario: Any, key: str | None = None) -> Tuple[bool, List[str]]:
+    return get_validator().validate(scenario, key)
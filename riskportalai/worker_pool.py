@@ -0,0 +1,366 @@
+"""
+worker_pool.py
+Pre-warmed process pool for CPU-bound simulations.
+• N worker processes, each with NumPy and the engine already imported
+• bounded admission: at most workers + queue_size jobs in flight,
+  anything beyond that is rejected with PoolSaturated (→ 429 + Retry-After)
+• per-job timeout: a runaway job's worker is killed and replaced
+• optional affinity key(s) so repeated scenarios / kept runs land on the
+  worker that already holds their compiled plan / run snapshot
+• submit_many: one request fanned out over at most ``workers`` lanes,
+  admitted as a unit (so any shard count fits), and cancelled as a unit
+  on its first failure
+"""
+
+from __future__ import annotations
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_RETRY_AFTER = 2
+_AFFINITY_KEYS = 32  # recent affinity keys remembered per worker
+_CANCEL_POLL = 0.05  # seconds between cancel checks of a submit_many call
+
+
+class PoolError(RuntimeError):
+    """Base class for pool failures surfaced to the API layer."""
+
+    def __init__(self, message: str, retry_after: int = DEFAULT_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PoolSaturated(PoolError):
+    """Admission queue is full."""
+
+
+class PoolUnavailable(PoolError):
+    """Pool is shutting down or a worker died mid-job."""
+
+
+class SimulationTimeout(PoolError):
+    """Job exceeded its time budget; its worker was killed."""
+
+
+class _Cancelled(PoolError):
+    """A sibling call of a submit_many group failed; this one was abandoned."""
+
+
+# ---------- worker process ----------
+def _warm() -> None:
+    import numpy  # noqa: F401
+    from .graph_simulate import simulate_graph
+    simulate_graph({"nodes": [{"id": "x", "type": "parameter", "is_result": True,
+                               "distribution": {"type": "constant", "parameters": {"value": 1}}}],
+                    "edges": []}, iterations=8, seed=0)
+
+
+def _worker_main(conn) -> None:
+    _warm()
+    conn.send(("ready", None))
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if msg is None:
+            break
+        fn, args, kwargs = msg
+        try:
+            conn.send(("ok", fn(*args, **kwargs)))
+        except Exception as exc:
+            try:
+                conn.send(("error", exc))
+            except Exception:  # unpicklable exception
+                conn.send(("error", RuntimeError(repr(exc))))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        self.proc.start()
+        child.close()
+        self.ready = False
+        self.keys: Deque[str] = deque(maxlen=_AFFINITY_KEYS)
+
+    def run(self, fn: Callable, args: tuple, kwargs: dict, timeout: float,
+            cancel: Optional[threading.Event] = None) -> tuple:
+        """Return (status, payload); raises only for timeouts / cancels / dead workers."""
+        if not self.ready:
+            self.conn.recv()  # wait for the warm-up handshake
+            self.ready = True
+        self.conn.send((fn, args, kwargs))
+        if cancel is None:
+            if not self.conn.poll(timeout):
+                raise SimulationTimeout(f"Simulation exceeded {timeout:g}s and was terminated")
+            return self.conn.recv()
+        deadline = time.monotonic() + timeout
+        while not self.conn.poll(min(_CANCEL_POLL, max(deadline - time.monotonic(), 0))):
+            if cancel.is_set():
+                raise _Cancelled("Cancelled after a sibling call failed")
+            if time.monotonic() >= deadline:
+                raise SimulationTimeout(f"Simulation exceeded {timeout:g}s and was terminated")
+        return self.conn.recv()
+
+    def kill(self) -> None:
+        self.proc.kill()
+        self.proc.join(timeout=5)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.proc.join(timeout=2)
+        if self.proc.is_alive():
+            self.kill()
+
+
+# ---------- pool ----------
+# one key, or several in preference order (all are remembered after the job)
+Affinity = Optional[Union[str, Sequence[str]]]
+
+
+def _affinity_keys(affinity: Affinity) -> Tuple[str, ...]:
+    if affinity is None:
+        return ()
+    return (affinity,) if isinstance(affinity, str) else tuple(affinity)
+
+
+class SimulationPool:
+    def __init__(self,
+                 workers: int = DEFAULT_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 retry_after: int = DEFAULT_RETRY_AFTER,
+                 start_method: str = "spawn"):
+        if workers < 1:
+            raise ValueError("SimulationPool needs at least one worker")
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._ctx = mp.get_context(start_method)
+        self._idle: List[_Worker] = []
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._started = False
+        self._closed = False
+        # one waiting thread per admitted job; admission bounds its size
+        self._threads = ThreadPoolExecutor(max_workers=self.capacity,
+                                           thread_name_prefix="sim-pool")
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def start(self) -> "SimulationPool":
+        with self._cond:
+            if not self._started:
+                self._idle = [_Worker(self._ctx) for _ in range(self.workers)]
+                self._started = True
+        return self
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            busy = self.workers - len(self._idle) if self._started else 0
+            return {"workers": self.workers, "busy": busy,
+                    "queued": max(0, self._in_flight - busy),
+                    "in_flight": self._in_flight, "capacity": self.capacity}
+
+    async def submit(self, fn: Callable, *args: Any,
+                     timeout: Optional[float] = None,
+                     affinity: Affinity = None,
+                     **kwargs: Any) -> Any:
+        """Run ``fn(*args, **kwargs)`` in a worker process."""
+        self._admit()
+        try:
+            self.start()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._threads, self._run, fn, args, kwargs,
+                self.timeout if timeout is None else timeout, affinity)
+        finally:
+            self._leave()
+
+    def run(self, fn: Callable, *args: Any,
+            timeout: Optional[float] = None,
+            affinity: Affinity = None,
+            **kwargs: Any) -> Any:
+        """Blocking ``submit`` for callers on their own threads (e.g. the job scheduler)."""
+        self._admit()
+        try:
+            self.start()
+            return self._run(fn, args, kwargs, self.timeout if timeout is None else timeout,
+                             affinity)
+        finally:
+            self._leave()
+
+    async def submit_many(self, fn: Callable,
+                          calls: Sequence[Tuple[tuple, Dict[str, Any]]],
+                          timeout: Optional[float] = None,
+                          affinity: Affinity = None) -> List[Any]:
+        """
+        ``[fn(*args, **kwargs) for args, kwargs in calls]`` on at most
+        ``workers`` lanes.  The lanes are admitted together (all or
+        nothing), so the number of calls is not bounded by the queue.  On
+        the first failure the remaining calls are skipped, running siblings
+        are killed (their workers replaced) and that failure is raised.
+        """
+        lanes = min(len(calls), self.workers)
+        if lanes == 0:
+            return []
+        self._admit(lanes)
+        cancel = threading.Event()
+        results: List[Any] = [None] * len(calls)
+        pending = iter(range(len(calls)))
+        lock = threading.Lock()
+        budget = self.timeout if timeout is None else timeout
+
+        def lane() -> None:
+            while not cancel.is_set():
+                with lock:
+                    i = next(pending, None)
+                if i is None:
+                    return
+                args, kwargs = calls[i]
+                try:
+                    results[i] = self._run(fn, args, kwargs, budget, affinity, cancel)
+                except BaseException:
+                    cancel.set()
+                    raise
+
+        try:
+            self.start()
+            loop = asyncio.get_running_loop()
+            gathered = asyncio.gather(*(loop.run_in_executor(self._threads, lane)
+                                        for _ in range(lanes)), return_exceptions=True)
+            try:
+                # wait for every lane, so no worker is still held when we return
+                outcomes = await asyncio.shield(gathered)
+            except asyncio.CancelledError:  # the request went away: stop its calls too
+                cancel.set()
+                await asyncio.shield(gathered)
+                raise
+        finally:
+            self._leave(lanes)
+        errors = [e for e in outcomes if isinstance(e, BaseException)]
+        if errors:
+            raise next((e for e in errors if not isinstance(e, _Cancelled)), errors[0])
+        return results
+
+    def _admit(self, n: int = 1) -> None:
+        with self._cond:
+            if self._closed:
+                raise PoolUnavailable("Simulation pool is shutting down", self.retry_after)
+            if self._in_flight + n > self.capacity:
+                raise PoolSaturated("Simulation queue is full", self.retry_after)
+            self._in_flight += n
+
+    def _leave(self, n: int = 1) -> None:
+        with self._cond:
+            self._in_flight -= n
+
+    def _acquire(self, affinity: Affinity) -> _Worker:
+        with self._cond:
+            while not self._idle:
+                if self._closed:
+                    raise PoolUnavailable("Simulation pool is shutting down")
+                self._cond.wait()
+            for key in _affinity_keys(affinity):  # first key that an idle worker knows
+                for i, w in enumerate(self._idle):
+                    if key in w.keys:
+                        return self._idle.pop(i)
+            return self._idle.pop()
+
+    def _release(self, worker: _Worker) -> None:
+        with self._cond:
+            if self._closed:
+                worker.stop()
+                return
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _run(self, fn, args, kwargs, timeout, affinity, cancel=None) -> Any:
+        worker = self._acquire(affinity)
+        if cancel is not None and cancel.is_set():
+            self._release(worker)
+            raise _Cancelled("Cancelled after a sibling call failed")
+        try:
+            status, payload = worker.run(fn, args, kwargs, timeout, cancel)
+        except _Cancelled:
+            worker.kill()  # the only way to stop a running job
+            worker = _Worker(self._ctx)
+            raise
+        except SimulationTimeout as exc:
+            worker.kill()
+            worker = _Worker(self._ctx)
+            exc.retry_after = self.retry_after
+            raise
+        except (EOFError, OSError) as exc:  # worker died mid-job
+            worker.kill()
+            worker = _Worker(self._ctx)
+            raise PoolUnavailable(f"Simulation worker crashed: {exc!r}",
+                                  self.retry_after) from exc
+        finally:
+            self._release(worker)
+        if status == "error":
+            raise payload
+        worker.keys.extend(_affinity_keys(affinity))
+        return payload
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for w in idle:
+            w.stop()
+        self._threads.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------- process-wide default pool ----------
+_pool: Optional[SimulationPool] = None
+_pool_lock = threading.Lock()
+
+
+def pool_from_env() -> SimulationPool:
+    return SimulationPool(
+        workers=int(os.getenv("RISKPORTAL_SIM_WORKERS", DEFAULT_WORKERS)),
+        queue_size=int(os.getenv("RISKPORTAL_SIM_QUEUE", DEFAULT_QUEUE_SIZE)),
+        timeout=float(os.getenv("RISKPORTAL_SIM_TIMEOUT", DEFAULT_TIMEOUT)),
+        retry_after=int(os.getenv("RISKPORTAL_SIM_RETRY_AFTER", DEFAULT_RETRY_AFTER)),
+    )
+
+
+def get_simulation_pool() -> SimulationPool:
+    """Shared pool, created lazily if the app lifespan hasn't started it."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = pool_from_env()
+        return _pool
+
+
+def current_simulation_pool() -> Optional[SimulationPool]:
+    """The shared pool if one exists; never creates or starts one (for probes)."""
+    with _pool_lock:
+        return _pool
+
+
+def shutdown_simulation_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
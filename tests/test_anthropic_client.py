@@ -0,0 +1,97 @@
+import asyncio
+import httpx
+import pytest
+from riskportalai.anthropic_client import ClaudeClient, ClaudeError, retry_after_seconds
+
+OK = {"content": [{"type": "text", "text": "hi"}]}
+
+
+def _client(handler, **kw):
+    slept = []
+
+    async def sleep(s):
+        slept.append(s)
+
+    kw.setdefault("backoff_base", 0.01)
+    client = ClaudeClient(url="http://mock/v1/messages", transport=httpx.MockTransport(handler),
+                          sleep=sleep, **kw)
+    return client, slept
+
+
+def test_retries_transient_statuses_and_honours_retry_after():
+    statuses = iter([529, 429, 200])
+    seen = []
+
+    def handler(request):
+        status = next(statuses)
+        headers = {"retry-after": "3"} if status == 429 else {}
+        return httpx.Response(status, json=OK if status == 200 else {"error": "busy"}, headers=headers)
+
+    async def go():
+        client, slept = _client(handler, on_attempt=seen.append)
+        assert await client.post({"x": 1}, {}) == OK
+        await client.aclose()
+        return client, slept
+
+    client, slept = asyncio.run(go())
+    assert [r["status"] for r in seen] == [529, 429, 200]
+    assert all(r["latency_ms"] >= 0 for r in seen)
+    assert slept[0] <= 0.01 and slept[1] == 3.0
+    assert client.stats()["retries"] == 2 and client.stats()["attempts"] == 3
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(400, json={"error": "bad"})
+
+    async def go():
+        client, _ = _client(handler)
+        with pytest.raises(ClaudeError) as err:
+            await client.post({}, {})
+        return err.value
+
+    exc = asyncio.run(go())
+    assert exc.status == 400 and len(calls) == 1 and len(exc.attempts) == 1
+
+
+def test_transport_errors_exhaust_retries():
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    async def go():
+        client, slept = _client(handler, max_retries=2)
+        with pytest.raises(ClaudeError, match="Network error") as err:
+            await client.post({}, {})
+        return err.value, slept
+
+    exc, slept = asyncio.run(go())
+    assert len(exc.attempts) == 3 and len(slept) == 2
+
+
+def test_concurrency_is_capped():
+    active = peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, json=OK)
+
+    async def go():
+        client, _ = _client(handler, max_concurrency=2)
+        await asyncio.gather(*(client.post({}, {}) for _ in range(6)))
+        await client.aclose()
+
+    asyncio.run(go())
+    assert peak == 2
+
+
+def test_retry_after_formats():
+    assert retry_after_seconds(httpx.Headers({"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(httpx.Headers({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert retry_after_seconds(httpx.Headers({})) is None
@@ -0,0 +1,72 @@
+import copy, json, pathlib
+import pytest
+from fastapi.testclient import TestClient
+from riskportalai.batch import (batch_block, batch_pilot_ranges, merge_batch_blocks,
+                                simulate_batch)
+from riskportalai.graph_simulate import shard_plan, simulate_graph
+from riskportalai.main import app
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+
+def _variant(price_mean):
+    scen = copy.deepcopy(FULL)
+    node = next(n for n in scen["nodes"] if n["id"] == "unit_price")
+    node["distribution"]["parameters"]["mean"] = price_mean
+    return scen
+
+
+def test_variants_share_random_streams():
+    out = simulate_batch([{"name": "base", "scenario": FULL},
+                          {"name": "same", "scenario": FULL},
+                          {"name": "pricier", "scenario": _variant(3.3)}],
+                         iterations=5000, seed=1, sample_encoding="full")
+    base, same = out["scenarios"]["base"], out["scenarios"]["same"]
+    assert base["results"] == same["results"]
+    assert same["differences"]["total_revenue"]["mean"] == 0.0
+    diff = out["scenarios"]["pricier"]["differences"]["total_revenue"]
+    assert diff["mean"] > 0 and diff["prob_increase"] > 0.95
+    assert diff["crn_variance_ratio"] > 10
+
+
+def test_batch_matches_standalone_run():
+    out = simulate_batch([{"name": "a", "scenario": FULL}], iterations=800, seed=4,
+                         sample_encoding="full")
+    alone = simulate_graph(FULL, iterations=800, seed=4)
+    assert out["scenarios"]["a"]["results"] == alone["results"]
+
+
+def test_blockwise_batch_matches_in_memory_differences():
+    scenarios = [{"name": "base", "scenario": FULL}, {"name": "pricier", "scenario": _variant(3.3)}]
+    whole = simulate_batch(scenarios, iterations=3000, seed=8, sample_encoding="none")
+    seq = shard_plan(3000, 8, 1)[0][1]
+    ranges = batch_pilot_ranges(scenarios, seq)
+    merged = merge_batch_blocks([batch_block(scenarios, 3000, seq, hist_ranges=ranges)], seed=8)
+    assert merged["metadata"]["baseline"] == "base" and merged["metadata"]["chunked"]
+    assert merged["scenarios"]["base"]["differences"] == {}
+    exact = whole["scenarios"]["pricier"]["differences"]["total_revenue"]
+    streamed = merged["scenarios"]["pricier"]["differences"]["total_revenue"]
+    assert streamed["paired_iterations"] == exact["paired_iterations"]
+    assert streamed["prob_increase"] == exact["prob_increase"]
+    assert streamed["mean"] == pytest.approx(exact["mean"])
+    assert streamed["crn_variance_ratio"] == pytest.approx(exact["crn_variance_ratio"])
+    assert streamed["p50"] == pytest.approx(exact["p50"], rel=0.02)
+
+    # blocks merge: two halves cover every iteration once
+    halves = [batch_block(scenarios, n, s, hist_ranges=ranges) for n, s in shard_plan(3000, 8, 2)]
+    two = merge_batch_blocks(halves, seed=8)
+    assert two["metadata"]["iterations"] == 3000 and two["metadata"]["blocks"] == 2
+    assert two["scenarios"]["pricier"]["differences"]["total_revenue"]["prob_increase"] > 0.95
+
+
+def test_batch_endpoint():
+    client = TestClient(app)
+    body = {"scenarios": [{"name": "base", "scenario": FULL},
+                          {"name": "cheap", "scenario": _variant(2.7)}],
+            "iterations": 2000, "seed": 3}
+    r = client.post("/graph_simulate/batch", json=body)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["metadata"]["baseline"] == "base"
+    assert data["scenarios"]["cheap"]["differences"]["total_revenue"]["mean"] < 0
+    assert data["scenarios"]["base"]["results"]["total_revenue"]["samples"] is None
@@ -0,0 +1,136 @@
+import asyncio, json
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from riskportalai import main
+from riskportalai.anthropic_client import ClaudeClient, ClaudeError
+from riskportalai.chat_stream import MessageAssembler
+
+SCENARIO = {"schemaVersion": "1.0", "edges": [], "nodes": [
+    {"id": "base", "type": "parameter", "distribution": {"type": "constant", "parameters": {"value": 5}}},
+    {"id": "total", "type": "result", "formula": "base", "is_result": True}]}
+
+
+def _events(scenario=SCENARIO, chunk=17):
+    raw = json.dumps(scenario)
+    yield {"type": "message_start", "message": {"id": "m", "content": []}}
+    yield {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+    for word in ("Building ", "your ", "model."):
+        yield {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}}
+    yield {"type": "content_block_stop", "index": 0}
+    yield {"type": "content_block_start", "index": 1,
+           "content_block": {"type": "tool_use", "id": "t", "name": "build_simulation_model", "input": {}}}
+    for i in range(0, len(raw), chunk):
+        yield {"type": "content_block_delta", "index": 1,
+               "delta": {"type": "input_json_delta", "partial_json": raw[i:i + chunk]}}
+    yield {"type": "content_block_stop", "index": 1}
+    yield {"type": "message_delta", "delta": {"stop_reason": "tool_use"}}
+    yield {"type": "message_stop"}
+
+
+def _sse_body(events):
+    return "".join(f"event: {e['type']}\ndata: {json.dumps(e)}\n\n" for e in events).encode()
+
+
+def _frames(text):
+    out = []
+    for frame in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_assembler_rebuilds_tool_input():
+    asm = MessageAssembler()
+    forwarded = [asm.feed(e) for e in _events()]
+    assert [f[1]["delta"] for f in forwarded if f and f[0] == "text"] == ["Building ", "your ", "model."]
+    content = asm.content()
+    assert content[0]["text"] == "Building your model." and content[1]["input"] == SCENARIO
+    assert asm.stop_reason == "tool_use"
+
+
+def test_assembler_rejects_truncated_tool_input():
+    asm = MessageAssembler()
+    for e in list(_events())[:-4]:  # stream ends inside the tool call
+        asm.feed(e)
+    with pytest.raises(ValueError, match="cut off"):
+        asm.content()
+
+
+def test_client_streams_after_retry():
+    statuses = iter([529, 200])
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        status = next(statuses)
+        if status != 200:
+            return httpx.Response(status, json={"error": "overloaded"})
+        return httpx.Response(200, content=_sse_body(_events()),
+                              headers={"content-type": "text/event-stream"})
+
+    async def sleep(_):
+        pass
+
+    async def go():
+        client = ClaudeClient(url="http://mock/v1/messages", sleep=sleep,
+                              transport=httpx.MockTransport(handler))
+        events = [e async for e in client.stream({}, {})]
+        await client.aclose()
+        return events, client.stats()
+
+    events, stats = asyncio.run(go())
+    assert [e["type"] for e in events] == [e["type"] for e in _events()]
+    assert stats["retries"] == 1
+
+
+def test_client_raises_on_stream_error_event():
+    body = _sse_body([{"type": "message_start", "message": {}},
+                      {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}])
+
+    async def go():
+        client = ClaudeClient(url="http://mock/v1/messages", transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=body)))
+        with pytest.raises(ClaudeError, match="Overloaded"):
+            async for _ in client.stream({}, {}):
+                pass
+
+    asyncio.run(go())
+
+
+def test_chat_stream_endpoint(monkeypatch):
+    async def fake_stream(history):
+        assert history[-1]["content"] == "model it"
+        for e in _events():
+            yield e
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(main, "stream_claude", fake_stream)
+    r = TestClient(main.app).post("/chat/stream", json={"history": [{"role": "user", "content": "model it"}]})
+    assert r.headers["content-type"].startswith("text/event-stream")
+    frames = _frames(r.text)
+    assert frames[0] == ("text", {"delta": "Building "})
+    assert ("tool_start", {"name": "build_simulation_model"}) in frames
+    assert frames[-1] == ("final", {"type": "json", "content": SCENARIO})
+
+
+def test_chat_stream_reports_invalid_graph(monkeypatch):
+    bad = dict(SCENARIO, edges=[{"id": "e", "target": "total", "probability": 0.5,
+                                 "impact_type": "absolute",
+                                 "distribution": {"type": "constant", "parameters": {"value": 1}}}])
+
+    async def fake_stream(history):
+        for e in _events(bad):
+            yield e
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(main, "stream_claude", fake_stream)
+    r = TestClient(main.app).post("/chat/stream", json={"history": [{"role": "user", "content": "x"}]})
+    event, body = _frames(r.text)[-1]
+    assert event == "final" and body["type"] == "text" and "Edges can only target" in body["content"]
+
+
+def test_chat_stream_stub(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    r = TestClient(main.app).post("/chat/stream", json={"history": [{"role": "user", "content": "Hi"}]})
+    frames = _frames(r.text)
+    assert frames[-1][0] == "final" and "(stub)" in frames[-1][1]["content"]
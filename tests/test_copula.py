@@ -0,0 +1,64 @@
+import copy, json, pathlib
+import numpy as np
+import pytest
+from riskportalai.copula import build_copula, correlation_errors
+from riskportalai.graph_simulate import simulate_graph
+from riskportalai.main import validate_scenario_enhanced
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+
+def _scenario(*pairs):
+    dists = {"a": {"type": "normal", "parameters": {"mean": 100, "stddev": 10}},
+             "b": {"type": "pert", "parameters": {"min": 1, "mode": 3, "max": 9}},
+             "c": {"type": "beta", "parameters": {"alpha": 2, "beta": 5}}}
+    nodes = [{"id": k, "type": "parameter", "distribution": d} for k, d in dists.items()]
+    nodes += [{"id": "y_" + k, "type": "expression", "formula": k, "is_result": True} for k in dists]
+    return {"schemaVersion": "1.0", "nodes": nodes, "edges": [],
+            "correlations": [{"between": [x, y], "coefficient": r} for x, y, r in pairs]}
+
+
+@pytest.mark.parametrize("mode,sampling", [("vectorized", "random"), ("vectorized", "lhs"),
+                                           ("vectorized", "sobol"), ("scalar", "random")])
+def test_copula_correlates_and_keeps_marginals(mode, sampling):
+    scen = _scenario(("a", "b", -0.7), ("b", "c", 0.5))
+    res = simulate_graph(scen, iterations=20_000, seed=1, mode=mode, sampling=sampling)["results"]
+    a, b, c = (np.asarray(res["y_" + k]["samples"]) for k in "abc")
+    assert abs(np.corrcoef(a, b)[0, 1] + 0.69) < 0.04
+    assert abs(np.corrcoef(b, c)[0, 1] - 0.49) < 0.04
+    assert abs(a.mean() - 100) < 0.3 and abs(b.mean() - 11 / 3) < 0.05 and abs(c.mean() - 2 / 7) < 0.01
+
+
+def test_inconsistent_correlations_are_rejected():
+    scen = _scenario(("a", "b", 0.9), ("b", "c", 0.9), ("a", "c", -0.9))
+    with pytest.raises(ValueError, match="positive semi-definite"):
+        simulate_graph(scen, iterations=10)
+    assert correlation_errors(_scenario(("a", "missing", 0.3)))
+    assert correlation_errors(_scenario(("a", "b", 1.5)))
+    ok, errors = validate_scenario_enhanced(scen)
+    assert not ok and "positive semi-definite" in errors[0]
+
+
+def test_perfect_correlation_is_factorised():
+    cop = build_copula(_scenario(("a", "b", 1.0)))
+    assert np.allclose(cop.factor @ cop.factor.T, cop.matrix, atol=1e-8)
+
+
+def test_pruned_member_keeps_other_draws():
+    scen = _scenario(("a", "b", -0.7), ("b", "c", 0.5))
+    scen["nodes"] = [n for n in scen["nodes"] if n["id"] != "y_b"]  # b is now dead
+    opt = simulate_graph(scen, iterations=500, seed=4, sampling="lhs")
+    assert opt["metadata"]["optimizer"]["pruned_nodes"] == ["b"]
+    full = simulate_graph(_scenario(("a", "b", -0.7), ("b", "c", 0.5)), iterations=500,
+                          seed=4, sampling="lhs")
+    for k in ("y_a", "y_c"):
+        assert opt["results"][k] == full["results"][k]
+
+
+def test_incremental_run_after_correlation_edit():
+    first = simulate_graph(FULL, iterations=2000, seed=6, keep_run=True)
+    edited = copy.deepcopy(FULL)
+    edited["correlations"] = [{"between": ["daily_sales", "unit_price"], "coefficient": -0.6}]
+    inc = simulate_graph(edited, iterations=2000, previous_run=first["metadata"]["run_id"])
+    assert inc["results"] == simulate_graph(edited, iterations=2000, seed=6)["results"]
+    assert inc["metadata"]["incremental"]["reused_nodes"] > 0
@@ -1,5 +1,8 @@
+import json, pathlib, zlib
 import numpy as np
-from riskportalai.graph_simulate import sample_distribution, _get_rng
+import pytest
+from riskportalai.graph_simulate import sample_distribution, _get_rng, simulate_graph
+from riskportalai.distributions import ppf_distribution, ppf_rows, sample_rows, BlockSampler
 
 rng = _get_rng(42)
 
@@ -44,3 +47,86 @@ def test_bernoulli_mean():
     dist = {"type": "bernoulli", "parameters": {"p": 0.3}}
     arr = sample_distribution(dist, 10_000, rng)
     assert 0.28 < arr.mean() < 0.32
+
+
+def test_pert_mean_and_bounds():
+    dist = {"type": "pert", "parameters": {"min": 0, "mode": 2, "max": 10}}
+    arr = sample_distribution(dist, 20_000, rng)
+    assert arr.min() >= 0 and arr.max() <= 10
+    assert abs(arr.mean() - (0 + 4 * 2 + 10) / 6) < 0.05
+
+
+@pytest.mark.parametrize("dist", [
+    {"type": "normal", "parameters": {"mean": 3, "stddev": 2}},
+    {"type": "uniform", "parameters": {"lower": -1, "upper": 4}},
+    {"type": "triangular", "parameters": {"min": 0, "mode": 2, "max": 7}},
+    {"type": "lognormal", "parameters": {"mean": 0, "sigma": 0.5}},
+    {"type": "discrete", "parameters": {"values": [1, 5, 9]}},
+    {"type": "bernoulli", "parameters": {"p": 0.3}},
+    {"type": "beta", "parameters": {"alpha": 2, "beta": 5}},
+    {"type": "poisson", "parameters": {"lambda": 3.5}},
+    {"type": "pert", "parameters": {"min": 1, "mode": 3, "max": 9}},
+])
+def test_ppf_matches_sampler(dist):
+    u = (np.arange(20_000) + 0.5) / 20_000
+    via_ppf = ppf_distribution(dist, u)
+    direct = sample_distribution(dist, 200_000, np.random.default_rng(1))
+    assert np.isclose(via_ppf.mean(), direct.mean(), rtol=0.02, atol=0.01)
+    assert np.isclose(np.median(via_ppf), np.median(direct), rtol=0.02, atol=0.01)
+
+
+def test_lhs_uniforms_are_stratified():
+    s = BlockSampler("lhs", np.random.SeedSequence(0), ["k"])
+    s.start_block(100)
+    u = s.uniform("k")
+    assert (np.sort(np.floor(u * 100)) == np.arange(100)).all()
+
+
+@pytest.mark.parametrize("strategy", ["lhs", "sobol"])
+def test_strategies_match_reference_median(strategy):
+    full = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+    ref = simulate_graph(full, iterations=200_000, seed=1)["results"]["total_revenue"]["p50"]
+    got = simulate_graph(full, iterations=4096, seed=2, sampling=strategy)
+    assert got["metadata"]["sampling"] == strategy
+    assert abs(got["results"]["total_revenue"]["p50"] - ref) / ref < 0.01
+
+
+@pytest.mark.parametrize("lanes", [200, 5000])
+def test_ppf_rows_matches_row_by_row(lanes):
+    dists = [{"type": "triangular", "parameters": {"min": 0, "mode": 1, "max": 4}},
+             {"type": "uniform", "parameters": {"lower": -1, "upper": 1}},
+             {"type": "triangular", "parameters": {"min": 2, "mode": 2, "max": 2}},
+             {"type": "normal", "parameters": {"mean": 5, "stddev": 2}},
+             {"type": "discrete", "parameters": {"values": [1, 2, 3]}}]
+    u = np.random.default_rng(3).random((len(dists), lanes))
+    rows = ppf_rows(dists, u)
+    for i, d in enumerate(dists):
+        np.testing.assert_array_equal(rows[i], ppf_distribution(d, u[i]))
+
+
+def test_sample_rows_follow_each_row_and_continue_across_blocks():
+    dists = [{"type": "triangular", "parameters": {"min": 0, "mode": 1, "max": 4}},
+             {"type": "triangular", "parameters": {"min": 2, "mode": 5, "max": 6}},
+             {"type": "triangular", "parameters": {"min": 3, "mode": 3, "max": 3}},
+             {"type": "discrete", "parameters": {"values": [1, 5, 9]}},
+             {"type": "discrete", "parameters": {"values": [2, 4, 6]}},
+             {"type": "beta", "parameters": {"alpha": 2, "beta": 5}},
+             {"type": "pert", "parameters": {"min": 1, "mode": 3, "max": 9}},
+             {"type": "pert", "parameters": {"min": 1, "mode": 3, "max": 9}},
+             {"type": "constant", "parameters": {"value": 4}}]
+    rows = sample_rows(dists, 100_000, lambda key: np.random.default_rng(zlib_key(key)))
+    u = (np.arange(20_000) + 0.5) / 20_000
+    for row, d in zip(rows, dists):
+        via_ppf = ppf_distribution(d, u)
+        assert np.isclose(row.mean(), via_ppf.mean(), rtol=0.02, atol=0.01)
+        assert np.isclose(np.median(row), np.median(via_ppf), rtol=0.02, atol=0.01)
+
+    streams = {}
+    split = lambda key: streams.setdefault(key, np.random.default_rng(zlib_key(key)))
+    blocks = np.hstack([sample_rows(dists, 300, split), sample_rows(dists, 700, split)])
+    np.testing.assert_array_equal(blocks, sample_rows(
+        dists, 1000, lambda key: np.random.default_rng(zlib_key(key))))
+
+
+def zlib_key(key):
+    return zlib.crc32(key.encode())
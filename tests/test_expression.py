@@ -1,6 +1,8 @@
 import numpy as np
 import pytest
-from riskportalai.expression_eval import SafeEvaluator, ExpressionEvaluationError
+from riskportalai.expression_eval import (SafeEvaluator, ExpressionEvaluationError,
+                                         compile_expression, compile_cache_info,
+                                         clear_compile_cache)
 
 def test_simple_math():
     ev = SafeEvaluator({"a": 2, "b": 3})
@@ -24,3 +26,34 @@ def test_disallowed_func():
     ev = SafeEvaluator({"x": 1})
     with pytest.raises(ExpressionEvaluationError):
         ev.evaluate("eval('2+2')")
+
+def test_compiled_expression_reusable():
+    fn = compile_expression("where(x > 1, x * 10, x) + y")
+    assert (fn({"x": np.array([1, 2]), "y": 1}) == np.array([2, 21])).all()
+    assert fn({"x": 3, "y": 0}) == 30
+
+def test_compile_rejects_disallowed_once():
+    with pytest.raises(ExpressionEvaluationError):
+        compile_expression("__import__('os')")
+
+def test_compile_cache_counters():
+    clear_compile_cache()
+    compile_expression("a * b")
+    SafeEvaluator({"a": 2, "b": 3}).evaluate("a * b")
+    info = compile_cache_info()
+    assert info["misses"] == 1 and info["hits"] == 1
+
+def test_evaluate_masked_reports_lane_reasons():
+    ev = SafeEvaluator({"x": np.array([1.0, -1.0, 0.0, 2.0, 800.0]), "d": np.array([1.0, 1, 1, 0, 1])})
+    value, valid, reasons = ev.evaluate_masked("exp(x) * log(x) / d")
+    assert valid.tolist() == [True, False, False, False, False]
+    assert reasons["log_domain"].tolist() == [False, True, True, False, False]
+    assert reasons["division_by_zero"].tolist() == [False, False, False, True, False]
+    assert reasons["overflow"].tolist() == [False, False, False, False, True]
+    assert np.isfinite(value[0])
+
+def test_evaluate_masked_where_blames_selected_branch():
+    ev = SafeEvaluator({"x": np.array([-1.0, 4.0])})
+    value, valid, reasons = ev.evaluate_masked("where(x > 0, log(x), 1 / (x + 1))")
+    assert valid.tolist() == [False, True]
+    assert set(reasons) == {"division_by_zero"}
@@ -0,0 +1,84 @@
+import json, pathlib, time
+import numpy as np
+import pytest
+from riskportalai.graph_plan import build_plan
+from riskportalai.graph_simulate import VectorEngine, shard_plan, simulate_graph
+from riskportalai.synthetic import synthetic_scenario
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+SCEN = {"nodes": [
+    {"id": "c", "type": "parameter", "distribution": {"type": "constant", "parameters": {"value": -2}}},
+    {"id": "k", "type": "parameter", "distribution": {"type": "constant", "parameters": {"value": 3}}},
+    {"id": "x", "type": "parameter",
+     "distribution": {"type": "normal", "parameters": {"mean": 1, "stddev": 1}}},
+    {"id": "unused", "type": "parameter",
+     "distribution": {"type": "normal", "parameters": {"mean": 1, "stddev": 1}}},
+    {"id": "kk", "type": "expression", "formula": "exp(k) * c ** 2 + log(k)"},
+    {"id": "dead", "type": "expression", "formula": "max(unused, 3)"},
+    {"id": "y", "type": "expression", "is_result": True,
+     "formula": "(x * kk + c) * 2 + where(x > 0, log(x), 0)"},
+    {"id": "z", "type": "result", "is_result": True, "formula": "(x * kk + c) - log(x) + abs(c - x)"}],
+    "edges": [
+        {"id": "gone", "target": "unused", "probability": 0.5, "impact_type": "absolute",
+         "distribution": {"type": "constant", "parameters": {"value": 1}}},
+        {"id": "bump", "target": "x", "probability": 0.5, "impact_type": "percentage",
+         "distribution": {"type": "uniform", "parameters": {"lower": 1, "upper": 5}}}]}
+
+
+def test_optimizer_report():
+    plan = build_plan(SCEN)
+    report = plan.optimization
+    assert report["folded_nodes"] == ["c", "k", "kk"]
+    assert set(report["pruned_nodes"]) == {"unused", "dead"}  # each node in one category
+    assert report["pruned_edges"] == ["gone"]
+    assert report["shared_subexpressions"] == 2
+    assert "exp" not in plan.nodes["y"]["formula"] + plan.nodes["z"]["formula"]
+
+
+@pytest.mark.parametrize("scen", [FULL, SCEN], ids=["whimsy", "synthetic"])
+@pytest.mark.parametrize("sampling", ["random", "lhs", "sobol"])
+def test_optimized_plan_gives_identical_lanes(scen, sampling):
+    raw, opt = build_plan(scen, optimize=False), build_plan(scen)
+    seq = shard_plan(4000, 21, 1)[0][1]
+    va, ok_a = VectorEngine(raw, seq, sampling).step(4000)
+    vb, ok_b = VectorEngine(opt, seq, sampling).step(4000)
+    assert np.array_equal(ok_a, ok_b)
+    for nid in raw.result_ids:
+        assert np.array_equal(va[nid][ok_a], vb[nid][ok_b])
+
+
+def test_simulation_reports_optimizer():
+    res = simulate_graph(FULL, iterations=200, seed=1)
+    assert res["metadata"]["optimizer"]["folded_nodes"] == ["season_duration"]
+
+
+def _uniform(lower, upper):
+    return {"type": "uniform", "parameters": {"lower": lower, "upper": upper}}
+
+
+@pytest.mark.parametrize("dead", [
+    {"id": "dead", "type": "expression", "formula": "exp(u)"},
+    {"id": "dead", "type": "expression", "formula": "u * 1e306"},
+    {"id": "dead", "type": "parameter",
+     "distribution": {"type": "lognormal", "parameters": {"mean": 709, "sigma": 1}}},
+], ids=["exp", "overflow", "lognormal"])
+def test_dead_nodes_that_can_overflow_are_kept(dead):
+    scen = {"nodes": [{"id": "u", "type": "parameter", "distribution": _uniform(0, 1000)},
+                      {"id": "out", "type": "result", "is_result": True, "formula": "u + 1"},
+                      dead], "edges": []}
+    raw, opt = build_plan(scen, optimize=False), build_plan(scen)
+    assert "dead" not in opt.optimization["pruned_nodes"]
+    seq = shard_plan(2000, 3, 1)[0][1]
+    a, b = VectorEngine(raw, seq), VectorEngine(opt, seq)
+    ok_a, ok_b = a.step(2000)[1], b.step(2000)[1]
+    assert not ok_a.all()
+    assert np.array_equal(ok_a, ok_b) and a.discards == b.discards
+
+
+def test_large_graph_plans_quickly():
+    scen = synthetic_scenario(1000, seed=0, max_edges=50)
+    start = time.perf_counter()
+    plan = build_plan(scen)
+    assert time.perf_counter() - start < 10  # was ~45 s with a re-scan per hoisted formula
+    assert plan.optimization["shared_subexpressions"] > 0
@@ -0,0 +1,70 @@
+import copy, uuid
+import json, pathlib
+import numpy as np
+from fastapi.testclient import TestClient
+from riskportalai.graph_plan import build_plan, get_plan, scenario_hash, clear_plan_cache, plan_cache_info
+from riskportalai.main import app
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+
+def test_hash_ignores_key_order():
+    shuffled = json.loads(json.dumps(FULL, sort_keys=True))
+    assert scenario_hash(shuffled) == scenario_hash(FULL)
+
+
+def test_plan_contents():
+    plan, _ = get_plan(FULL)
+    assert plan.order.index("available_days") < plan.order.index("total_revenue")
+    assert [e["id"] for e in plan.edges_by_target["days_lost"]][0] == "weather_risk"
+    assert plan.result_ids == ("total_revenue",)
+    assert set(plan.formulas) == set(plan.order)
+
+
+def test_plan_cache_hit_and_isolation():
+    clear_plan_cache()
+    scen = copy.deepcopy(FULL)
+    plan, hit = get_plan(scen)
+    assert not hit
+    scen["nodes"][2]["distribution"]["parameters"]["mean"] = 1
+    assert plan.nodes["daily_sales"]["distribution"]["parameters"]["mean"] == 100
+    _, hit = get_plan(FULL)
+    assert hit and plan_cache_info()["hits"] == 1
+
+
+def test_endpoint_reports_plan_cache_hit():
+    client = TestClient(app)
+    # unique scenario: worker processes keep their own plan caches
+    scen = dict(FULL, metadata={"title": "plan-cache-" + uuid.uuid4().hex})
+    first = client.post("/graph_simulate", json=scen).json()
+    second = client.post("/graph_simulate", json=scen).json()
+    assert first["metadata"]["plan_cached"] is False
+    assert second["metadata"]["plan_cached"] is True
+
+
+def test_edge_group_preserves_priority_semantics():
+    edges = [{"id": f"e{i}", "target": "x", "probability": 1.0, "priority": i,
+              "impact_type": kind, "distribution": {"type": "constant", "parameters": {"value": 0}}}
+             for i, kind in enumerate(["absolute", "absolute", "percentage", "percentage", "absolute"])]
+    plan = build_plan({"nodes": [{"id": "x", "type": "parameter", "is_result": True,
+                                  "distribution": {"type": "constant", "parameters": {"value": 1}}}],
+                       "edges": edges})
+    group = plan.edge_groups["x"]
+    assert group.tiers == (("absolute", 0, 2), ("percentage", 2, 4), ("absolute", 4, 5))
+    rng = np.random.default_rng(0)
+    v, impact = rng.normal(100, 10, 50), rng.normal(5, 2, (5, 50))
+    ref = v.copy()
+    for e, row in zip(edges, impact):  # the original one-edge-at-a-time loop
+        ref = ref + row if e["impact_type"] == "absolute" else ref + ref * (row / 100.0)
+    np.testing.assert_allclose(group.apply(v, impact), ref, rtol=1e-12)
+
+
+def test_id_less_edges_get_their_own_streams():
+    edge = {"target": "x", "probability": 0.5, "impact_type": "absolute",
+            "distribution": {"type": "constant", "parameters": {"value": 1}}}
+    plan = build_plan({"nodes": [{"id": "x", "type": "parameter", "is_result": True,
+                                  "distribution": {"type": "constant", "parameters": {"value": 0}}}],
+                       "edges": [dict(edge), dict(edge)]}, optimize=False)
+    keys = plan.stream_keys
+    assert len(set(keys)) == len(keys) == 5
+    assert plan.edge_groups["x"].ids == ("x#0", "x#1")
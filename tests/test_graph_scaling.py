@@ -0,0 +1,25 @@
+import json, pathlib
+from benchmarks import graph_scaling
+
+BASELINE = pathlib.Path(graph_scaling.__file__).with_name("baseline.json")
+
+
+def test_small_run_compares_against_itself_and_the_baseline():
+    out = graph_scaling.run([10], iterations=200, repeat=1, max_edges=3, seed=0)
+    assert [c["case"] for c in out["cases"]] == ["validate_scenario_enhanced", "topological_sort",
+                                                 "safe_evaluator", "simulate_graph"]
+    assert out["sla"] is None  # the 1000-node case is not part of this run
+    assert set(out["cases"][-1]["stages"]) >= {"sampling", "edges"}
+
+    same = graph_scaling.compare(out, out, tolerance=0.25)
+    assert len(same) == 4 and not any(r["regressed"] for r in same)
+    slower = json.loads(json.dumps(out))
+    for c in slower["cases"]:
+        c["seconds"] = c["seconds"] * 2 + 2 * graph_scaling.NOISE_FLOOR
+    assert all(r["regressed"] for r in graph_scaling.compare(slower, out, tolerance=0.25))
+
+    baseline = json.loads(BASELINE.read_text())
+    assert {c["nodes"] for c in baseline["cases"]} >= {10, 1000}
+    assert baseline["sla"] is not None
+    # other iteration counts never match baseline cases
+    assert graph_scaling.compare(out, baseline, tolerance=0.25) == []
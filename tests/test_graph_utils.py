@@ -0,0 +1,40 @@
+import pytest
+from riskportalai.graph_utils import topological_sort, topological_levels
+
+
+def _expr(nid, formula):
+    return {"id": nid, "type": "expression", "formula": formula}
+
+
+def test_no_substring_false_dependency():
+    nodes = {
+        "rev": _expr("rev", "revenue * 2"),
+        "revenue": {"id": "revenue", "type": "parameter"},
+        "x": _expr("x", "rev + 1"),
+    }
+    assert topological_sort(nodes) == ["rev", "x"]
+
+
+def test_levels_group_independent_nodes():
+    nodes = {
+        "a": {"id": "a", "type": "parameter"},
+        "b": _expr("b", "a + 1"),
+        "c": _expr("c", "log(a)"),
+        "d": _expr("d", "b * c"),
+    }
+    assert topological_levels(nodes) == [["b", "c"], ["d"]]
+
+
+def test_function_names_are_not_dependencies():
+    nodes = {"log": _expr("log", "1"), "y": _expr("y", "log(2)")}
+    assert topological_levels(nodes) == [["log", "y"]]
+
+
+def test_cycle_error_names_nodes():
+    nodes = {
+        "a": _expr("a", "b + 1"),
+        "b": _expr("b", "a + 1"),
+        "c": _expr("c", "a"),
+    }
+    with pytest.raises(ValueError, match="a -> b -> a"):
+        topological_sort(nodes)
@@ -0,0 +1,76 @@
+import copy, json, pathlib
+import pytest
+from fastapi.testclient import TestClient
+from riskportalai.graph_simulate import simulate_graph
+from riskportalai.incremental import clear_run_cache
+from riskportalai.main import app
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+
+def _edit(scen, node_id, **params):
+    scen = copy.deepcopy(scen)
+    node = next(n for n in scen["nodes"] if n["id"] == node_id)
+    node["distribution"]["parameters"].update(params)
+    return scen
+
+
+@pytest.mark.parametrize("sampling", ["random", "lhs", "sobol"])
+def test_incremental_matches_clean_run(sampling):
+    first = simulate_graph(FULL, iterations=3000, seed=8, sampling=sampling, keep_run=True)
+    edited = _edit(FULL, "unit_price", mean=3.3)
+    inc = simulate_graph(edited, iterations=3000, seed=8, sampling=sampling,
+                         previous_run=first["metadata"]["run_id"])
+    clean = simulate_graph(edited, iterations=3000, seed=8, sampling=sampling)
+    assert inc["results"] == clean["results"]
+    report = inc["metadata"]["incremental"]
+    assert report["reused"] and 0 < report["recomputed_nodes"] < len(FULL["nodes"])
+
+
+def test_incremental_chain_and_formula_edit():
+    a = simulate_graph(FULL, iterations=2000, seed=2, keep_run=True)
+    step = _edit(FULL, "unit_price", stddev=0.5)
+    b = simulate_graph(step, iterations=2000, previous_run=a["metadata"]["run_id"], keep_run=True)
+    assert b["metadata"]["seed"] == 2  # inherited
+    edited = copy.deepcopy(step)
+    res = next(n for n in edited["nodes"] if n.get("is_result"))
+    res["formula"] = "(" + res["formula"] + ") * 2"
+    c = simulate_graph(edited, iterations=2000, previous_run=b["metadata"]["run_id"])
+    assert c["results"] == simulate_graph(edited, iterations=2000, seed=2)["results"]
+    assert c["metadata"]["incremental"]["recomputed_nodes"] == 1
+
+
+def test_incremental_falls_back_when_run_unknown_or_incompatible():
+    clear_run_cache()
+    out = simulate_graph(FULL, iterations=500, seed=1, previous_run="missing")
+    assert out["metadata"]["incremental"]["reused"] is False
+    a = simulate_graph(FULL, iterations=500, seed=1, keep_run=True)
+    out = simulate_graph(FULL, iterations=600, seed=1, previous_run=a["metadata"]["run_id"])
+    assert out["metadata"]["incremental"]["reused"] is False
+
+
+def test_incremental_endpoint():
+    client = TestClient(app)
+    r = client.post("/graph_simulate?iterations=2000&seed=4&samples=none&keep_run=true", json=FULL)
+    assert r.status_code == 200
+    run_id = r.json()["metadata"]["run_id"]
+    edited = _edit(FULL, "unit_price", mean=3.1)
+    r = client.post(f"/graph_simulate?iterations=2000&seed=4&samples=none&previous_run={run_id}",
+                    json=edited)
+    assert r.status_code == 200
+    assert r.json()["metadata"]["incremental"]["reused"]
+    assert r.json()["results"] == simulate_graph(edited, iterations=2000, seed=4,
+                                                 sample_encoding="none")["results"]
+
+
+def test_run_cache_is_bounded_by_bytes(monkeypatch):
+    from riskportalai import graph_simulate, incremental
+    cache = incremental.RunCache(maxsize=8, maxbytes=1)
+    monkeypatch.setattr(incremental, "_run_cache", cache)
+    a = simulate_graph(FULL, iterations=300, seed=1, keep_run=True)
+    b = simulate_graph(FULL, iterations=300, seed=1, keep_run=True)
+    assert cache.get(a["metadata"]["run_id"]) is None      # evicted for the newest
+    assert cache.get(b["metadata"]["run_id"]) is not None
+    monkeypatch.setattr(graph_simulate, "RUN_CACHE_BYTES", 10_000)
+    with pytest.raises(ValueError, match="keep_run needs"):
+        simulate_graph(FULL, iterations=100_000, seed=1, keep_run=True)
@@ -0,0 +1,155 @@
+import copy, json, pathlib, threading, time
+import pytest
+from fastapi.testclient import TestClient
+from riskportalai import jobs
+from riskportalai.graph_simulate import merge_shards, pilot_ranges, run_shard, shard_plan
+from riskportalai.jobs import JobScheduler, JobStore
+from riskportalai.main import app
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+
+class InlinePool:
+    """Runs steps in the calling thread; ``gate`` pauses every step until set."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.calls = []
+        self.inputs = []                # first argument of every step, in run order
+
+    def run(self, fn, *args, **kwargs):
+        self.gate.wait(10)
+        self.calls.append(fn.__name__)
+        self.inputs.append(args[0])
+        return fn(*args, **kwargs)
+
+
+def _wait(scheduler, job_id, states=("done", "failed", "cancelled"), timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = scheduler.get(job_id, partial=False)
+        if job["state"] in states:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job stuck in {job['state']}")
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    pool = InlinePool()
+    s = JobScheduler(JobStore(str(tmp_path)), pool=lambda: pool, slots=1, block_size=1000)
+    s.test_pool = pool
+    yield s
+    pool.gate.set()
+    s.shutdown()
+
+
+def test_job_matches_sharded_run_and_is_persisted(scheduler, tmp_path):
+    job = scheduler.submit({"scenario": FULL, "iterations": 3500, "seed": 7, "sampling": "random"})
+    done = _wait(scheduler, job["id"])
+    assert done["progress"]["blocks"] == 4 and done["progress"]["fraction"] == 1.0
+
+    blocks = shard_plan(3500, 7, 4)
+    ranges = pilot_ranges(FULL, blocks[0][1])
+    expected = merge_shards([run_shard(FULL, n, seq, chunk_size=n, hist_ranges=ranges)
+                             for n, seq in blocks], seed=7)
+    assert done["result"]["results"] == json.loads(json.dumps(expected["results"]))
+
+    stored = json.loads((tmp_path / f"{job['id']}.json").read_text())
+    assert stored["request"]["scenario"] == FULL and stored["seed"] == 7
+    # a fresh scheduler (e.g. after a restart) serves it from disk, without running anything
+    again = JobScheduler(JobStore(str(tmp_path)), pool=lambda: pytest.fail("re-ran"))
+    assert again.get(job["id"])["result"] == done["result"]
+
+
+def test_missing_seed_is_drawn_and_recorded(scheduler):
+    job = scheduler.submit({"scenario": FULL, "iterations": 10, "seed": None, "sampling": "random"})
+    assert isinstance(job["seed"], int)
+    assert _wait(scheduler, job["id"])["result"]["metadata"]["seed"] == job["seed"]
+
+
+def test_cancel_between_blocks_keeps_partial_stats(scheduler):
+    pool = scheduler.test_pool
+    job = scheduler.submit({"scenario": FULL, "iterations": 5000, "seed": 1, "sampling": "random"})
+    while len(pool.calls) < 3:          # pilot + two blocks
+        time.sleep(0.001)
+    pool.gate.clear()
+    time.sleep(0.05)
+    scheduler.cancel(job["id"])
+    pool.gate.set()
+    out = _wait(scheduler, job["id"])
+    assert out["state"] == "cancelled"
+    assert 2 <= out["progress"]["blocks_done"] < 5
+    assert out["result"]["metadata"]["iterations"] == out["progress"]["iterations_done"]
+
+
+def test_interactive_jobs_overtake_bulk_at_block_boundaries(scheduler):
+    pool = scheduler.test_pool
+    pool.gate.clear()                   # hold the first step of the bulk job
+    bulk = scheduler.submit({"scenario": FULL, "iterations": 4000, "seed": 1,
+                             "sampling": "random"}, priority="bulk")
+    time.sleep(0.05)
+    other = copy.deepcopy(FULL)
+    quick = scheduler.submit({"scenario": other, "iterations": 1000, "seed": 2,
+                              "sampling": "random"}, priority="interactive")
+    pool.gate.set()
+    assert _wait(scheduler, quick["id"])["state"] == "done"
+    assert _wait(scheduler, bulk["id"])["state"] == "done"
+    # bulk pilot (already running), then all of the quick job, then the bulk blocks
+    order = ["quick" if x is other else "bulk" for x in pool.inputs]
+    assert order == ["bulk", "quick", "quick", "bulk", "bulk", "bulk", "bulk"]
+
+
+def test_batch_job_runs_block_by_block(scheduler):
+    pool = scheduler.test_pool
+    cheap = copy.deepcopy(FULL)
+    next(n for n in cheap["nodes"] if n["id"] == "unit_price")["distribution"]["parameters"]["mean"] = 2.7
+    request = {"scenarios": [{"name": "base", "scenario": FULL}, {"name": "cheap", "scenario": cheap}],
+               "baseline": None, "iterations": 4000, "seed": 5, "sampling": "random"}
+    with pytest.raises(ValueError, match="baseline"):
+        scheduler.submit({**request, "baseline": "missing"})
+
+    done = _wait(scheduler, scheduler.submit(request)["id"])
+    assert pool.calls == ["batch_pilot_ranges"] + ["batch_block"] * 4
+    assert done["progress"]["blocks"] == 4 and done["progress"]["fraction"] == 1.0
+    meta = done["result"]["metadata"]
+    assert meta["iterations"] == 4000 and meta["blocks"] == 4 and meta["baseline"] == "base"
+    diff = done["result"]["scenarios"]["cheap"]["differences"]["total_revenue"]
+    assert diff["mean"] < 0 and diff["paired_iterations"] > 0
+
+    job = scheduler.submit({**request, "iterations": 5000})
+    while len(pool.calls) < 5 + 3:     # pilot + two blocks
+        time.sleep(0.001)
+    pool.gate.clear()
+    time.sleep(0.05)
+    assert scheduler.get(job["id"])["partial"]["metadata"]["blocks"] >= 2
+    scheduler.cancel(job["id"])
+    pool.gate.set()
+    out = _wait(scheduler, job["id"])
+    assert out["state"] == "cancelled" and 2 <= out["progress"]["blocks_done"] < 5
+    assert out["result"]["scenarios"]["base"]["metadata"]["iterations"] == out["progress"]["iterations_done"]
+
+
+def test_jobs_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setenv("RISKPORTAL_JOB_DIR", str(tmp_path))
+    monkeypatch.setenv("RISKPORTAL_JOB_BLOCK", "500")
+    jobs.shutdown_job_scheduler()
+    client = TestClient(app)
+    try:
+        r = client.post("/jobs", json={"scenario": FULL, "iterations": 1500, "seed": 3,
+                                       "priority": "interactive"})
+        assert r.status_code == 202
+        job_id = r.json()["id"]
+        deadline = time.time() + 60
+        while (body := client.get(f"/jobs/{job_id}").json())["state"] not in ("done", "failed"):
+            assert time.time() < deadline
+            time.sleep(0.05)
+        assert body["state"] == "done" and body["result"]["metadata"]["iterations"] == 1500
+        assert client.delete(f"/jobs/{job_id}").status_code == 409
+        assert client.get("/jobs/0123abcd").status_code == 404
+        bad = {"scenario": {"schemaVersion": "1.0", "nodes": [], "edges": []}}
+        assert client.post("/jobs", json=bad).status_code == 400
+        assert client.post("/jobs", json={"iterations": 10}).status_code == 400
+    finally:
+        jobs.shutdown_job_scheduler()
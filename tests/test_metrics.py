@@ -0,0 +1,72 @@
+import json, logging, pathlib
+import pytest
+from fastapi.testclient import TestClient
+from riskportalai.graph_simulate import merge_shards, run_shard, shard_plan, simulate_graph
+from riskportalai.logging_config import JsonFormatter
+from riskportalai.main import app, _chat_reply
+from riskportalai.metrics import Histogram, SIMULATION_STAGE_SECONDS, observe_simulation
+
+whimsy = json.loads((pathlib.Path(__file__).parent / "test_mr_whimsy.json").read_text())
+STAGES = {"plan", "sampling", "edges", "expressions", "stats"}
+
+
+def test_histogram_exposition():
+    h = Histogram("t_seconds", "test", buckets=(0.1, 1.0))
+    h.observe(0.05, stage="a")
+    h.observe(0.5, stage="a")
+    h.observe(5.0, stage="a")  # beyond the last bucket: only +Inf
+    lines = h.lines()
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 't_seconds_count{stage="a"} 3' in lines
+    assert h.count(stage="a") == 3
+
+
+@pytest.mark.parametrize("opts", [{}, {"mode": "scalar"}, {"chunk_size": 500},
+                                  {"precision": 0.05, "max_iterations": 4000}])
+def test_simulation_reports_stage_timings(opts):
+    meta = simulate_graph(whimsy, iterations=1000, seed=1, **opts)["metadata"]
+    assert set(meta["timings"]) == STAGES
+    assert all(t >= 0 for t in meta["timings"].values())
+
+
+def test_shard_timings_are_summed():
+    parts = [run_shard(whimsy, n, seq) for n, seq in shard_plan(2000, 3, 2)]
+    meta = merge_shards(parts, seed=3)["metadata"]
+    assert meta["timings"]["sampling"] == pytest.approx(
+        sum(p["timings"]["sampling"] for p in parts))
+
+
+def test_observe_simulation_counts_stages():
+    before = SIMULATION_STAGE_SECONDS.count(stage="edges")
+    observe_simulation(simulate_graph(whimsy, iterations=200, seed=2))
+    assert SIMULATION_STAGE_SECONDS.count(stage="edges") == before + 1
+
+
+def test_chat_validation_is_timed():
+    timings = {}
+    _chat_reply([{"type": "tool_use", "name": "x", "input": whimsy}], timings)
+    assert "validation" in timings
+
+
+def test_metrics_endpoint():
+    client = TestClient(app)
+    assert client.post("/graph_simulate?iterations=200&seed=1", json=whimsy).status_code == 200
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert "# TYPE riskportal_simulation_stage_seconds histogram" in body
+    assert 'riskportal_simulation_stage_seconds_count{stage="expressions"}' in body
+    assert "riskportal_simulation_discarded_iterations_total" in body
+    assert 'riskportal_cache_lookups_total{cache="plan",result=' in body
+    assert 'riskportal_pool_jobs{state="queued"}' in body
+
+
+def test_json_log_lines_carry_extra_fields():
+    record = logging.LogRecord("riskportalai.main", logging.INFO, __file__, 1,
+                               "chat: %s", ("hello",), None)
+    record.errors = ["bad edge"]
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "chat: hello" and entry["level"] == "INFO"
+    assert entry["errors"] == ["bad edge"]
@@ -1,4 +1,5 @@
 import json, pathlib
+import numpy as np
 from riskportalai.graph_simulate import simulate_graph
 
 SCENARIO = pathlib.Path(__file__).with_suffix(".json").read_text()
@@ -9,3 +10,81 @@ def test_whimsy_runs():
     assert res["metadata"]["discarded"] == 0
     rev = res["results"]["total_revenue"]["mean"]
     assert rev > 0
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+def test_vectorized_matches_scalar():
+    vec = simulate_graph(FULL, iterations=4000, seed=7)["results"]["total_revenue"]
+    ref = simulate_graph(FULL, iterations=4000, seed=7, mode="scalar")["results"]["total_revenue"]
+    for key in ("p5", "p50", "p95", "mean"):
+        assert abs(vec[key] - ref[key]) / ref[key] < 0.05
+
+def test_vectorized_seed_reproducible():
+    a = simulate_graph(FULL, iterations=500, seed=11)
+    b = simulate_graph(FULL, iterations=500, seed=11)
+    assert a["results"] == b["results"]
+
+def test_vectorized_discards_nan_lanes():
+    scen = {"nodes": [
+        {"id": "x", "type": "parameter",
+         "distribution": {"type": "uniform", "parameters": {"lower": -1, "upper": 1}}},
+        {"id": "y", "type": "expression", "formula": "log(x)", "is_result": True}],
+        "edges": []}
+    res = simulate_graph(scen, iterations=1000, seed=3)
+    kept = len(res["results"]["y"]["samples"])
+    assert res["metadata"]["discarded"] == 1000 - kept
+    assert 350 < kept < 650
+    assert res["metadata"]["discard_reasons"] == {"y": {"log_domain": 1000 - kept}}
+
+def test_discard_reasons_per_node_and_scalar_packing():
+    scen = {"nodes": [
+        {"id": "x", "type": "parameter",
+         "distribution": {"type": "discrete", "parameters": {"values": [0, 1, 2, 3]}}},
+        {"id": "inv", "type": "expression", "formula": "1 / x"},
+        {"id": "y", "type": "expression", "formula": "inv + 1", "is_result": True}],
+        "edges": []}
+    for mode in ("vectorized", "scalar"):
+        res = simulate_graph(scen, iterations=800, seed=4, mode=mode)
+        meta = res["metadata"]
+        # blamed on the node that failed, not on everything downstream of it
+        assert meta["discard_reasons"] == {"inv": {"division_by_zero": meta["discarded"]}}
+        samples = np.asarray(res["results"]["y"]["samples"])
+        assert len(samples) == 800 - meta["discarded"]
+        assert np.isfinite(samples).all() and samples.min() > 1
+
+def test_unfired_edges_with_non_finite_impacts_discard_nothing():
+    scen = {"nodes": [
+        {"id": "x", "type": "parameter", "is_result": True,
+         "distribution": {"type": "constant", "parameters": {"value": 1}}}],
+        "edges": [{"id": "boom", "target": "x", "probability": 0.3, "impact_type": "absolute",
+                   "distribution": {"type": "lognormal", "parameters": {"mean": 800, "sigma": 0.1}}}]}
+    for sampling in ("random", "sobol"):
+        with np.errstate(over="ignore"):
+            res = simulate_graph(scen, iterations=2000, seed=5, sampling=sampling)
+        # only lanes where the (overflowing) edge fired are lost
+        assert 450 < res["metadata"]["discarded"] < 750
+        assert set(res["results"]["x"]["samples"]) == {1.0}
+
+def test_sharded_run_is_deterministic():
+    from concurrent.futures import ThreadPoolExecutor
+    serial = simulate_graph(FULL, iterations=1001, seed=5, shards=4)
+    with ThreadPoolExecutor(4) as ex:
+        parallel = simulate_graph(FULL, iterations=1001, seed=5, shards=4, executor=ex)
+    assert serial["results"] == parallel["results"]
+    assert len(serial["results"]["total_revenue"]["samples"]) == 1001
+    assert serial["metadata"]["shards"] == 4
+
+def test_adaptive_stops_at_precision():
+    res = simulate_graph(FULL, seed=8, precision=0.02, max_iterations=200_000, block_size=1000)
+    report = res["metadata"]["adaptive"]
+    assert report["stopped_by"] == "precision"
+    assert report["achieved_precision"] <= 0.02
+    assert res["metadata"]["iterations"] == report["iterations_used"] < 200_000
+    # the adaptive prefix is the same stream as a fixed-size run
+    fixed = simulate_graph(FULL, iterations=report["iterations_used"], seed=8)
+    assert res["results"]["total_revenue"]["p50"] == fixed["results"]["total_revenue"]["p50"]
+
+def test_adaptive_respects_budget():
+    res = simulate_graph(FULL, seed=8, precision=1e-6, max_iterations=3000, block_size=1000)
+    assert res["metadata"]["adaptive"]["stopped_by"] == "max_iterations"
+    assert res["metadata"]["iterations"] == 3000
@@ -0,0 +1,88 @@
+import asyncio, json
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from riskportalai import anthropic_client
+from riskportalai.anthropic_client import ClaudeClient, call_claude, stream_claude
+from riskportalai.chat_stream import MessageAssembler
+from riskportalai.main import app
+from riskportalai.response_cache import (ResponseCache, prompt_cache_stats, response_key,
+                                         set_response_cache)
+
+REPLY = {"content": [{"type": "text", "text": "Sure."},
+                     {"type": "tool_use", "id": "t", "name": "build_simulation_model",
+                      "input": {"schemaVersion": "1.0", "nodes": [], "edges": []}}],
+         "stop_reason": "tool_use",
+         "usage": {"input_tokens": 40, "cache_read_input_tokens": 1200, "cache_creation_input_tokens": 0}}
+HISTORY = [{"role": "user", "content": "demo"}]
+
+
+class Clock:
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_and_lru_eviction():
+    clock = Clock()
+    cache = ResponseCache(maxsize=2, ttl=10, clock=clock)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.put("c", {"v": 3})  # evicts b, the least recently used
+    assert cache.get("b") is None
+    clock.now += 11
+    assert cache.get("a") is None
+    info = cache.info()
+    assert info["hits"] == 1 and info["misses"] == 2 and info["size"] == 1
+
+
+def test_disk_backend_survives_restart(tmp_path):
+    ResponseCache(directory=str(tmp_path)).put("k", {"v": 1})
+    fresh = ResponseCache(directory=str(tmp_path))
+    assert fresh.get("k") == {"v": 1}
+    assert fresh.info()["backend"] == "disk"
+
+
+def test_key_ignores_transport_only_fields():
+    base = {"model": "m", "system": "s", "tools": [], "messages": HISTORY}
+    assert response_key(base) == response_key({**base, "stream": True, "max_tokens": 9})
+    assert response_key(base) != response_key({**base, "messages": HISTORY * 2})
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    calls = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        calls.append(body)
+        assert body["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert body["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+        return httpx.Response(200, json=REPLY)
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(anthropic_client, "get_claude_client", lambda: ClaudeClient(
+        url="http://mock/v1/messages", transport=httpx.MockTransport(handler)))
+    set_response_cache(ResponseCache())
+    yield calls
+    set_response_cache(None)
+
+
+def test_repeated_history_is_served_from_cache(mock_api):
+    before = prompt_cache_stats.info()["cache_read_input_tokens"]
+    first = asyncio.run(call_claude(HISTORY))
+    second = asyncio.run(call_claude(HISTORY))
+    assert first == second == REPLY and len(mock_api) == 1
+    assert prompt_cache_stats.info()["cache_read_input_tokens"] == before + 1200
+
+    async def replay():
+        asm = MessageAssembler()
+        async for e in stream_claude(HISTORY):
+            asm.feed(e)
+        return asm.content()
+
+    assert asyncio.run(replay()) == REPLY["content"] and len(mock_api) == 1
+    stats = TestClient(app).get("/chat/cache").json()
+    assert stats["responses"]["hits"] == 2 and stats["responses"]["hit_rate"] == pytest.approx(2 / 3)
@@ -0,0 +1,139 @@
+import csv, io, json, pathlib
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from riskportalai import run_store
+from riskportalai.graph_simulate import simulate_graph
+from riskportalai.main import app
+from riskportalai.run_store import RunStore
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+
+@pytest.fixture
+def stored(tmp_path):
+    store = RunStore(str(tmp_path))
+    result = simulate_graph(FULL, iterations=5000, seed=11, run_store=store)
+    return store, result
+
+
+def test_stored_run_records_scenario_seed_and_samples(stored):
+    store, result = stored
+    run_id = result["metadata"]["stored_run"]
+    record = store.get(run_id)
+    assert record["scenario"] == FULL and record["seed"] == 11 and record["iterations"] == 5000
+    assert record["arrays"]["total_revenue"] == "result"
+    assert record["arrays"]["daily_sales"] == "parameter"
+    assert record["summary"]["results"]["total_revenue"]["p5"] == result["results"]["total_revenue"]["p5"]
+    mm = store.array(run_id, "total_revenue")
+    assert isinstance(mm, np.memmap)
+    assert mm.tolist() == result["results"]["total_revenue"]["samples"]
+    # archiving does not change the run
+    plain = simulate_graph(FULL, iterations=5000, seed=11)
+    assert plain["results"]["total_revenue"]["samples"] == result["results"]["total_revenue"]["samples"]
+    assert store.list()[0]["id"] == run_id
+
+
+def test_stored_run_keeps_every_scenario_parameter(tmp_path):
+    # a constant (folded) and an unused parameter (pruned) by the optimiser
+    scenario = {**FULL, "nodes": FULL["nodes"] + [
+        {"id": "unused_cost", "type": "parameter",
+         "distribution": {"type": "normal", "parameters": {"mean": 5, "stddev": 1}}}]}
+    store = RunStore(str(tmp_path))
+    result = simulate_graph(scenario, iterations=500, seed=3, run_store=store)
+    record = store.get(result["metadata"]["stored_run"])
+    declared = [n["id"] for n in scenario["nodes"] if n["type"] == "parameter"]
+    assert sorted(nid for nid, kind in record["arrays"].items() if kind == "parameter") \
+        == sorted(declared)
+    constant = next(n for n in FULL["nodes"] if n["type"] == "parameter"
+                    and n["distribution"]["type"] == "constant")
+    column = store.array(record["id"], constant["id"])
+    assert len(column) == record["kept"]
+    assert (column == constant["distribution"]["parameters"]["value"]).all()
+    assert len(store.array(record["id"], "unused_cost")) == record["kept"]
+    plain = simulate_graph(scenario, iterations=500, seed=3)
+    assert plain["metadata"]["optimizer"]["pruned_nodes"]
+    assert plain["results"]["total_revenue"]["samples"] == result["results"]["total_revenue"]["samples"]
+
+
+def test_missing_seed_is_drawn(tmp_path):
+    store = RunStore(str(tmp_path))
+    result = simulate_graph(FULL, iterations=100, run_store=store)
+    seed = store.get(result["metadata"]["stored_run"])["seed"]
+    assert isinstance(seed, int) and result["metadata"]["seed"] == seed
+    again = simulate_graph(FULL, iterations=100, seed=seed)
+    assert again["results"]["total_revenue"]["p50"] == result["results"]["total_revenue"]["p50"]
+
+
+def test_filter_and_quantiles_match_numpy(stored, monkeypatch):
+    monkeypatch.setattr(run_store, "BLOCK_ROWS", 700)  # several blocks per scan
+    store, result = stored
+    run_id = result["metadata"]["stored_run"]
+    revenue = np.asarray(store.array(run_id, "total_revenue"))
+    sales = np.asarray(store.array(run_id, "daily_sales"))
+    p5 = result["results"]["total_revenue"]["p5"]
+
+    out = store.filter(run_id, "total_revenue", "lt", "p5", columns=["total_revenue", "daily_sales"],
+                       offset=10, limit=100)
+    expected = np.flatnonzero(revenue < p5)
+    assert out["threshold"] == p5 and out["matched"] == len(expected)
+    assert out["rows"] == expected[10:110].tolist()
+    assert out["columns"]["daily_sales"] == sales[expected[10:110]].tolist()
+
+    q = store.quantiles(run_id, "daily_sales", [0.1, 0.9], where=("total_revenue", "lt", "p5"))
+    assert q["rows"] == len(expected)
+    assert q["quantiles"]["0.1"] == pytest.approx(np.quantile(sales[revenue < p5], 0.1))
+    full = store.quantiles(run_id, "total_revenue", [0.05])
+    assert full["quantiles"]["0.05"] == pytest.approx(p5)
+
+    with pytest.raises(ValueError):
+        store.filter(run_id, "total_revenue", "lt", "lots")
+    with pytest.raises(KeyError):
+        store.array(run_id, "nope")
+
+
+def test_csv_streams_rows(stored, monkeypatch):
+    monkeypatch.setattr(run_store, "BLOCK_ROWS", 300)
+    store, result = stored
+    run_id = result["metadata"]["stored_run"]
+    rows = list(csv.reader(io.StringIO("".join(
+        store.csv(run_id, ["total_revenue", "unit_price"], start=100, stop=1100)))))
+    assert rows[0] == ["row", "total_revenue", "unit_price"] and len(rows) == 1001
+    assert rows[1][0] == "100"
+    assert float(rows[-1][1]) == store.array(run_id, "total_revenue")[1099]
+
+
+def test_runs_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setenv("RISKPORTAL_RUN_DIR", str(tmp_path))
+    run_store.reset_run_store()
+    client = TestClient(app)
+    try:
+        r = client.post("/graph_simulate?iterations=2000&seed=5&samples=none&store=true", json=FULL)
+        assert r.status_code == 200
+        run_id = r.json()["metadata"]["stored_run"]
+        assert client.get(f"/runs/{run_id}").json()["seed"] == 5
+        assert client.get("/runs").json()[0]["id"] == run_id
+
+        page = client.get(f"/runs/{run_id}/samples",
+                          params={"nodes": "total_revenue", "start": 10, "limit": 5}).json()
+        assert page["rows"] == 5 and list(page["columns"]) == ["total_revenue"]
+
+        hits = client.get(f"/runs/{run_id}/filter", params={"node": "total_revenue", "op": "lt",
+                                                           "value": "p5", "limit": 3}).json()
+        assert hits["matched"] == 100 and len(hits["rows"]) == 3
+        q = client.get(f"/runs/{run_id}/quantiles",
+                       params={"node": "total_revenue", "q": [0.05, 0.95]}).json()
+        assert q["quantiles"]["0.05"] == pytest.approx(r.json()["results"]["total_revenue"]["p5"])
+
+        body = client.get(f"/runs/{run_id}/csv", params={"nodes": "total_revenue"})
+        assert body.headers["content-type"].startswith("text/csv")
+        assert len(body.text.splitlines()) == 2001
+
+        assert client.get("/runs/0123abcd").status_code == 404
+        assert client.get(f"/runs/{run_id}/csv", params={"nodes": "nope"}).status_code == 404
+        assert client.get(f"/runs/{run_id}/filter", params={"node": "total_revenue", "op": "lt",
+                                                           "value": "x"}).status_code == 400
+        assert client.post("/graph_simulate?iterations=100&store=true&shards=2",
+                           json=FULL).status_code == 400
+    finally:
+        run_store.reset_run_store()
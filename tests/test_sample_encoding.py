@@ -0,0 +1,52 @@
+import json
+import numpy as np
+from fastapi.testclient import TestClient
+from riskportalai.main import app
+from riskportalai.graph_simulate import simulate_graph
+from riskportalai.sample_encoding import decode_npy, unpack_binary
+
+client = TestClient(app)
+
+PAYLOAD = {
+    "schemaVersion": "1.0",
+    "nodes": [
+        {"id": "x", "type": "parameter", "distribution": {"type": "normal", "parameters": {"mean": 10, "stddev": 2}}},
+        {"id": "y", "type": "result", "formula": "x * 2", "is_result": True}
+    ],
+    "edges": []
+}
+
+
+def test_encodings_shrink_payload():
+    full = client.post("/graph_simulate?seed=1", json=PAYLOAD)
+    hist = client.post("/graph_simulate?seed=1&samples=histogram&bins=20", json=PAYLOAD)
+    res = client.post("/graph_simulate?seed=1&samples=reservoir&reservoir=500", json=PAYLOAD)
+    assert len(hist.content) * 10 < len(full.content)
+    assert len(res.content) * 10 < len(full.content)
+    assert sum(hist.json()["results"]["y"]["samples"]["counts"]) == 10000
+    assert len(res.json()["results"]["y"]["samples"]) == 500
+    assert hist.json()["results"]["y"]["p50"] == full.json()["results"]["y"]["p50"]
+
+
+def test_npy_roundtrip():
+    out = simulate_graph(PAYLOAD, iterations=100, seed=2, sample_encoding="npy")
+    ref = simulate_graph(PAYLOAD, iterations=100, seed=2)
+    arr = decode_npy(out["results"]["y"]["samples"])
+    assert arr.dtype == np.float32
+    assert np.allclose(arr, ref["results"]["y"]["samples"], rtol=1e-6)
+
+
+def test_binary_response():
+    r = client.post("/graph_simulate?iterations=300&seed=3&samples=binary&sensitivity=true",
+                    json=PAYLOAD)
+    assert r.headers["content-type"] == "application/octet-stream"
+    assert "x-simulation-summary" not in r.headers
+    layout = json.loads(r.headers["x-sample-layout"])
+    assert layout == [{"id": "y", "offset": 0, "count": 300}]
+    arr = np.frombuffer(r.content, dtype="<f4", offset=int(r.headers["x-samples-offset"]))
+    summary, samples = unpack_binary(r.content)
+    ref = simulate_graph(PAYLOAD, 300, 3)
+    assert summary["results"]["y"]["p50"] == ref["results"]["y"]["p50"]
+    assert "sensitivity" in summary and summary["layout"] == layout
+    np.testing.assert_array_equal(samples["y"], arr)
+    assert np.allclose(arr, ref["results"]["y"]["samples"], rtol=1e-6)
@@ -0,0 +1,45 @@
+import pytest
+from fastapi.testclient import TestClient
+from riskportalai.graph_simulate import simulate_graph
+from riskportalai.main import app
+
+SCEN = {"schemaVersion": "1.0", "nodes": [
+    {"id": "big", "type": "parameter",
+     "distribution": {"type": "normal", "parameters": {"mean": 100, "stddev": 20}}},
+    {"id": "small", "type": "parameter",
+     "distribution": {"type": "normal", "parameters": {"mean": 10, "stddev": 1}}},
+    {"id": "fixed", "type": "parameter",
+     "distribution": {"type": "constant", "parameters": {"value": 5}}},
+    {"id": "total", "type": "result", "formula": "big + small - fixed", "is_result": True}],
+    "edges": [{"id": "outage", "target": "small", "probability": 0.3, "impact_type": "absolute",
+               "distribution": {"type": "constant", "parameters": {"value": -50}}}]}
+
+
+def test_sensitivity_ranks_drivers_without_changing_results():
+    plain = simulate_graph(SCEN, iterations=5000, seed=4)
+    res = simulate_graph(SCEN, iterations=5000, seed=4, sensitivity=True)
+    assert res["results"] == plain["results"]
+
+    ranking = res["sensitivity"]["total"]
+    assert [d["driver"] for d in ranking[:2]] == ["outage", "big"]
+    by_id = {d["driver"]: d for d in ranking}
+    assert "fixed" not in by_id  # folded away by the optimizer
+    assert by_id["big"]["rank_correlation"] > 0.4
+    assert abs(sum(d["contribution_to_variance"] for d in ranking) - 1) < 1e-9
+    outage = by_id["outage"]
+    assert outage["kind"] == "edge" and outage["target"] == "small"
+    assert abs(outage["fire_rate"] - 0.3) < 0.03
+    assert abs(outage["conditional_mean_shift"] + 50) < 3
+
+
+def test_sensitivity_rejects_sharded_runs():
+    with pytest.raises(ValueError):
+        simulate_graph(SCEN, iterations=100, seed=1, shards=2, sensitivity=True)
+
+
+def test_sensitivity_endpoint_top():
+    client = TestClient(app)
+    r = client.post("/graph_simulate?iterations=2000&seed=1&samples=none"
+                    "&sensitivity=true&sensitivity_top=2", json=SCEN)
+    assert r.status_code == 200
+    assert len(r.json()["sensitivity"]["total"]) == 2
@@ -23,4 +23,33 @@ def test_graph_endpoint_runs():
     # Check that the request was successful and the response has the correct structure
     assert r.status_code == 200
     assert "results" in r.json()
-    assert "metadata" in r.json()
\ No newline at end of file
+    assert "metadata" in r.json()
+def test_graph_endpoint_sharded():
+    payload = {
+        "schemaVersion": "1.0",
+        "nodes": [
+            {"id": "x", "type": "parameter", "distribution": {"type": "normal", "parameters": {"mean": 0, "stddev": 1}}},
+            {"id": "y", "type": "result", "formula": "x * 2", "is_result": True}
+        ],
+        "edges": []
+    }
+    r = client.post("/graph_simulate?iterations=2000&seed=9&shards=2", json=payload)
+    assert r.status_code == 200
+    again = client.post("/graph_simulate?iterations=2000&seed=9&shards=2", json=payload)
+    assert r.json()["results"] == again.json()["results"]
+    assert r.json()["metadata"]["shards"] == 2
+
+def test_graph_endpoint_chunked_matches_library():
+    from riskportalai.graph_simulate import simulate_graph
+    payload = {
+        "schemaVersion": "1.0",
+        "nodes": [
+            {"id": "x", "type": "parameter", "distribution": {"type": "uniform", "parameters": {"lower": 1, "upper": 2}}},
+            {"id": "y", "type": "result", "formula": "x * 3", "is_result": True}
+        ],
+        "edges": []
+    }
+    r = client.post("/graph_simulate?iterations=5000&seed=3&shards=2&chunk_size=1000", json=payload)
+    assert r.status_code == 200
+    local = simulate_graph(payload, iterations=5000, seed=3, shards=2, chunk_size=1000)
+    assert r.json()["results"] == local["results"]
@@ -0,0 +1,75 @@
+import json, pathlib, tracemalloc
+import numpy as np
+import pytest
+from riskportalai.graph_simulate import simulate_graph
+from riskportalai.streaming_stats import RunningMoments, QuantileSketch, FixedHistogram
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+rng = np.random.default_rng(0)
+
+
+def test_moments_merge_matches_numpy():
+    x = rng.normal(5, 2, 10_000)
+    a, b = RunningMoments(), RunningMoments()
+    a.update(x[:3000]); b.update(x[3000:7000]); b.update(x[7000:])
+    a.merge(b)
+    assert np.isclose(a.mean, x.mean()) and np.isclose(a.variance, x.var(ddof=1))
+    assert a.min == x.min() and a.max == x.max()
+
+
+def test_sketch_relative_error_bound():
+    x = np.concatenate([rng.lognormal(0, 2, 50_000), -rng.exponential(3, 5_000)])
+    left, right = QuantileSketch(0.01), QuantileSketch(0.01)
+    left.update(x[:20_000]); right.update(x[20_000:])
+    left.merge(right)
+    for q in (0.01, 0.05, 0.5, 0.95, 0.99):
+        exact = np.quantile(x, q, method="lower")
+        assert abs(left.quantile(q) - exact) <= 0.01 * abs(exact) + 1e-12
+
+
+def test_histogram_under_overflow():
+    h = FixedHistogram(0, 10, bins=5)
+    h.update(np.array([-1.0, 0.5, 9.9, 11.0]))
+    assert h.underflow == 1 and h.overflow == 1 and h.counts.sum() == 2
+
+
+def test_chunked_matches_full_run():
+    full = simulate_graph(FULL, iterations=20_000, seed=4)["results"]["total_revenue"]
+    chunked = simulate_graph(FULL, iterations=20_000, seed=4, chunk_size=3_000)
+    res = chunked["results"]["total_revenue"]
+    assert "samples" not in res and chunked["metadata"]["chunked"]
+    assert np.isclose(res["mean"], full["mean"])
+    for key in ("p5", "p50", "p95"):
+        assert abs(res[key] - full[key]) <= 0.01 * abs(full[key])
+    assert sum(res["histogram"]["counts"]) + res["histogram"]["underflow"] \
+        + res["histogram"]["overflow"] == 20_000
+
+
+def test_chunked_sharded_deterministic():
+    a = simulate_graph(FULL, iterations=9_000, seed=2, shards=3, chunk_size=1_000)
+    b = simulate_graph(FULL, iterations=9_000, seed=2, shards=3, chunk_size=1_000)
+    assert a["results"] == b["results"]
+
+
+def test_chunked_peak_memory_flat():
+    def peak(n):
+        tracemalloc.start()
+        simulate_graph(FULL, iterations=n, seed=1, chunk_size=5_000)
+        _, top = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return top
+    assert peak(200_000) < 1.5 * peak(20_000)
+
+
+def test_streaming_halfwidths_track_exact_ones():
+    from riskportalai.convergence import relative_halfwidths, streaming_halfwidths
+    x = np.random.default_rng(3).lognormal(3, 0.5, 40_000)
+    moments, sketch = RunningMoments(), QuantileSketch(0.001)
+    for block in np.array_split(x, 20):
+        moments.update(block)
+        sketch.update(block)
+    exact, streamed = relative_halfwidths(x), streaming_halfwidths(moments, sketch)
+    assert streamed["mean"] == pytest.approx(exact["mean"], rel=1e-9)
+    for key in ("p5", "p50", "p95"):
+        # never narrower than the exact interval, and within the sketch's error
+        assert exact[key] - 1e-12 <= streamed[key] <= exact[key] + 0.005
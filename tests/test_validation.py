@@ -0,0 +1,70 @@
+import copy, json, pathlib
+import pytest
+from fastapi.testclient import TestClient
+from riskportalai.main import app
+from riskportalai.synthetic import synthetic_scenario
+from riskportalai.validation import ScenarioValidator, compile_schema, get_validator
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+
+def _errors(mutate):
+    scen = copy.deepcopy(FULL)
+    mutate(scen)
+    return ScenarioValidator.from_file().errors(scen)
+
+
+def test_valid_scenarios_pass():
+    v = ScenarioValidator.from_file()
+    assert v.errors(FULL) == []
+    assert v.errors(synthetic_scenario(200, seed=5)) == []
+
+
+@pytest.mark.parametrize("mutate,expected", [
+    (lambda s: s.pop("schemaVersion"), "missing required field 'schemaVersion'"),
+    (lambda s: s["nodes"][0].update(type="widget"), "'widget' is not one of"),
+    (lambda s: s["nodes"][2]["distribution"].update(type="gamma"), "'gamma' is not one of"),
+    (lambda s: s["edges"][0].update(probability=1.5), "above the maximum"),
+    (lambda s: s["edges"][0].pop("impact_type"), "missing required field 'impact_type'"),
+    (lambda s: s["nodes"][2]["distribution"]["parameters"].pop("stddev"), "needs parameter(s) stddev"),
+    (lambda s: s["nodes"][2]["distribution"]["parameters"].update(sd=1), "does not take sd"),
+    (lambda s: s["nodes"][2]["distribution"]["parameters"].update(mean="high"), "finite number"),
+    (lambda s: s["nodes"][4].update(formula="season_duration - days_gone"), "unknown id(s): days_gone"),
+    (lambda s: s["nodes"][4].update(formula="season_duration -"), "is invalid"),
+    (lambda s: s["nodes"][4].update(formula="__import__('os')"), "is invalid"),
+    (lambda s: s["edges"][0].update(target="available_days"), "Edges can only target parameter nodes"),
+    (lambda s: s["edges"][0].update(target="nowhere"), "non-existent node 'nowhere'"),
+    (lambda s: s["nodes"].append(copy.deepcopy(s["nodes"][0])), "Duplicate node id"),
+    (lambda s: s["edges"].append(copy.deepcopy(s["edges"][0])), "Duplicate edge id"),
+    (lambda s: [n.pop("is_result", None) for n in s["nodes"]], "no result"),
+])
+def test_semantic_and_schema_errors(mutate, expected):
+    errors = _errors(mutate)
+    assert errors and any(expected in e for e in errors), errors
+
+
+def test_outcomes_are_memoised_by_hash():
+    v = ScenarioValidator.from_file()
+    bad = copy.deepcopy(FULL)
+    bad["edges"][0]["target"] = "available_days"
+    first = v.validate(bad)
+    assert v.validate(copy.deepcopy(bad)) == first and not first[0]
+    assert v.info()["hits"] == 1 and v.info()["misses"] == 1
+
+
+def test_unsupported_schema_keyword_fails_at_build_time():
+    with pytest.raises(ValueError, match="patternProperties"):
+        compile_schema({"type": "object", "patternProperties": {}})
+
+
+def test_graph_simulate_rejects_bad_graphs_before_running():
+    bad = copy.deepcopy(FULL)
+    del bad["nodes"][2]["distribution"]["parameters"]["mean"]
+    client = TestClient(app)
+    r = client.post("/graph_simulate?iterations=100", json=bad)
+    assert r.status_code == 400
+    assert any("needs parameter(s) mean" in e for e in r.json()["detail"]["errors"])
+    body = {"scenarios": [{"name": "base", "scenario": FULL}, {"name": "broken", "scenario": bad}]}
+    r = client.post("/graph_simulate/batch", json=body)
+    assert r.status_code == 400 and "'broken'" in r.json()["detail"]["message"]
+    assert get_validator().info()["hits"] >= 1
@@ -0,0 +1,56 @@
+import asyncio, json, pathlib, time
+import pytest
+from riskportalai.graph_simulate import simulate_graph
+from riskportalai.worker_pool import SimulationPool, PoolSaturated, SimulationTimeout
+
+FULL = json.loads(pathlib.Path(__file__).with_name("mr_whimsy_full.json").read_text())
+
+
+@pytest.fixture(scope="module")
+def pool():
+    p = SimulationPool(workers=1, queue_size=0, timeout=10).start()
+    yield p
+    p.shutdown()
+
+
+def test_pool_runs_simulation(pool):
+    res = asyncio.run(pool.submit(simulate_graph, FULL, iterations=200, seed=1))
+    assert res["results"] == simulate_graph(FULL, iterations=200, seed=1)["results"]
+
+
+def test_pool_rejects_when_saturated(pool):
+    async def go():
+        first = asyncio.ensure_future(pool.submit(time.sleep, 0.5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturated):
+            await pool.submit(time.sleep, 0)
+        await first
+    asyncio.run(go())
+
+
+def test_pool_kills_runaway_job(pool):
+    with pytest.raises(SimulationTimeout):
+        asyncio.run(pool.submit(time.sleep, 30, timeout=0.5))
+    # the replacement worker serves the next job
+    assert asyncio.run(pool.submit(abs, -3)) == 3
+
+
+def test_submit_many_runs_more_calls_than_capacity(pool):
+    # capacity is 1: each call admitted on its own would get a 429
+    out = asyncio.run(pool.submit_many(abs, [((-i,), {}) for i in range(5)]))
+    assert out == [0, 1, 2, 3, 4]
+    assert pool.stats()["in_flight"] == 0
+
+
+def test_submit_many_cancels_siblings_on_failure():
+    pool = SimulationPool(workers=2, queue_size=0, timeout=30).start()
+    try:
+        started = time.perf_counter()
+        with pytest.raises(ValueError):
+            asyncio.run(pool.submit_many(eval, [(("__import__('time').sleep(20)",), {}),
+                                                (("int('x')",), {}),
+                                                (("__import__('time').sleep(20)",), {})]))
+        assert time.perf_counter() - started < 10  # the sleeper was killed, the third never ran
+        assert asyncio.run(pool.submit(abs, -3)) == 3
+    finally:
+        pool.shutdown()